@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+自适应流（视频、音频分离）的并行下载与合并
+视频流和音频流同时下载，通过命名管道边下载边交给 ffmpeg 合并，不写中间文件；网络中断时从已写入
+管道的位置用 Range 请求继续，ffmpeg 收到的数据是连续的。不支持命名管道或 ffmpeg 合并失败时，
+改为并行下载到可续传的 .part 文件，再直接合并到最终文件
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from bandwidth import bind_limit
+from capabilities import get_capabilities
+from proxy_session import bind_route
+from resumable import (DownloadInterrupted, download_stream, iter_content, part_paths,
+                       SEGMENT_SIZE, REQUEST_TIMEOUT)
+from retry import EXTRACTOR, RetryState
+
+# 等待 ffmpeg 打开管道的最长时间（秒）
+PIPE_OPEN_TIMEOUT = 60
+
+
+def can_pipe():
+    """当前系统是否支持命名管道合并"""
+    return hasattr(os, "mkfifo") and get_capabilities().ffmpeg
+
+
+def pick_audio_stream(yt, video_stream):
+    """选择与视频容器相同的最佳音频流，这样合并时可以直接复制音频"""
+    audio_streams = yt.streams.filter(only_audio=True)
+    same_container = audio_streams.filter(subtype=video_stream.subtype).order_by("abr").desc().first()
+    return same_container or audio_streams.order_by("abr").desc().first()
+
+
+def _mux_command(video_input, audio_input, video_stream, audio_stream, output_file):
+    """ffmpeg 合并命令：视频直接复制，音频容器不一致时转为 AAC"""
+    audio_codec = "copy" if audio_stream.subtype == video_stream.subtype else "aac"
+    return ['ffmpeg', '-y', '-loglevel', 'error',
+            '-i', video_input, '-i', audio_input,
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy', '-c:a', audio_codec,
+            output_file]
+
+
+def _temp_output(output_file):
+    """合并过程中写入的临时文件，完成后改名，避免留下不完整的视频"""
+    root, ext = os.path.splitext(output_file)
+    return f"{root}.muxing{ext}"
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _has_partial(video_stream, audio_stream, output_path):
+    """上次中断是否留下了可以续传的 .part 文件"""
+    for stream in (video_stream, audio_stream):
+        part_path, _ = part_paths(stream.get_file_path(filename=_part_name(stream, video_stream),
+                                                       output_path=output_path))
+        if os.path.exists(part_path):
+            return True
+    return False
+
+
+def _part_name(stream, video_stream):
+    """并行下载时两个流使用的文件名"""
+    base = os.path.splitext(video_stream.default_filename)[0]
+    kind = "video" if stream is video_stream else "audio"
+    return f"{base}.{kind}.{stream.subtype}"
+
+
+class _Progress:
+    """汇总两个流的下载进度"""
+
+    def __init__(self, total, on_progress):
+        self.total = total
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+        self._done = {}
+
+    def reset(self):
+        with self._lock:
+            self._done.clear()
+
+    def update(self, key, downloaded):
+        with self._lock:
+            self._done[key] = downloaded
+            downloaded = sum(self._done.values())
+        if self.on_progress:
+            self.on_progress(downloaded, self.total)
+
+
+def _open_fifo_for_write(fifo_path, stop_event):
+    """等待 ffmpeg 打开管道的读取端；ffmpeg 提前退出时不会永久阻塞"""
+    deadline = time.monotonic() + PIPE_OPEN_TIMEOUT
+    while True:
+        try:
+            fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError:
+            # 读取端还没有打开
+            if stop_event.is_set() or time.monotonic() > deadline:
+                return None
+            time.sleep(0.05)
+            continue
+        os.set_blocking(fd, True)
+        return os.fdopen(fd, "wb", buffering=0)
+
+
+def _feed(stream, fifo_path, key, progress, stop_event, errors, segment_size, timeout):
+    """把一个流边下载边写入管道
+
+    网络中断时按 retry 的策略等待后，从已写入管道的位置继续下载；
+    重试用尽或地址失效时把 DownloadInterrupted 交给调用方。
+    """
+    state = RetryState()
+    offset = 0
+    try:
+        pipe = _open_fifo_for_write(fifo_path, stop_event)
+        if pipe is None:
+            if not stop_event.is_set():
+                errors.append(Exception("ffmpeg 没有打开输入管道"))
+                stop_event.set()
+            return
+        with pipe:
+            while offset < stream.filesize:
+                try:
+                    for chunk in iter_content(stream.url, offset, stream.filesize, segment_size, timeout):
+                        if stop_event.is_set():
+                            return
+                        pipe.write(chunk)
+                        offset += len(chunk)
+                        progress.update(key, offset)
+                except DownloadInterrupted as e:
+                    delay = state.next_delay(e, offset)
+                    if delay is None or state.last_kind == EXTRACTOR:
+                        # 流地址过期需要重新提取，原地重试不会成功
+                        raise
+                    if stop_event.wait(delay):
+                        return
+    except BrokenPipeError:
+        if not stop_event.is_set():
+            errors.append(Exception("ffmpeg 提前关闭了输入管道"))
+        stop_event.set()
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+
+
+def _pipe_mux(video_stream, audio_stream, output_file, progress, segment_size, timeout):
+    """两个流同时下载，通过命名管道边下载边合并"""
+    temp_dir = tempfile.mkdtemp(prefix="downtube-mux-")
+    temp_output = _temp_output(output_file)
+    try:
+        video_fifo = os.path.join(temp_dir, "video")
+        audio_fifo = os.path.join(temp_dir, "audio")
+        os.mkfifo(video_fifo)
+        os.mkfifo(audio_fifo)
+
+        process = subprocess.Popen(
+            _mux_command(video_fifo, audio_fifo, video_stream, audio_stream, temp_output),
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        stop_event = threading.Event()
+        errors = []
+        feeders = [
+            threading.Thread(target=bind_limit(bind_route(_feed)), name="mux-video", daemon=True,
+                             args=(video_stream, video_fifo, "video", progress, stop_event, errors,
+                                   segment_size, timeout)),
+            threading.Thread(target=bind_limit(bind_route(_feed)), name="mux-audio", daemon=True,
+                             args=(audio_stream, audio_fifo, "audio", progress, stop_event, errors,
+                                   segment_size, timeout)),
+        ]
+        for feeder in feeders:
+            feeder.start()
+
+        # 任何一个流下载失败时立即结束 ffmpeg
+        while process.poll() is None:
+            if stop_event.wait(0.2):
+                process.kill()
+                break
+        _, stderr = process.communicate()
+        stop_event.set()
+        for feeder in feeders:
+            feeder.join()
+
+        if errors:
+            # 网络错误优先上报，交给调用方的重试循环
+            raise next((e for e in errors if isinstance(e, DownloadInterrupted)), errors[0])
+        if process.returncode != 0:
+            message = stderr.decode("utf-8", "replace").strip()
+            raise Exception(f"ffmpeg 合并失败: {message}")
+
+        os.replace(temp_output, output_file)
+        return output_file
+    finally:
+        _remove(temp_output)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _parallel_mux(video_stream, audio_stream, output_path, output_file, progress, segment_size, timeout):
+    """两个流并行下载到可续传的 .part 文件，再直接合并到最终文件"""
+    results = {}
+    errors = []
+
+    def fetch(stream, key):
+        try:
+            results[key] = download_stream(
+                stream, output_path, filename=_part_name(stream, video_stream),
+                on_progress=lambda s, chunk, remaining: progress.update(key, s.filesize - remaining),
+                segment_size=segment_size, timeout=timeout
+            )
+        except Exception as e:
+            errors.append(e)
+
+    # 下载线程沿用当前任务的代理线路和限速
+    fetch = bind_limit(bind_route(fetch))
+    fetchers = [threading.Thread(target=fetch, args=(video_stream, "video"), daemon=True),
+                threading.Thread(target=fetch, args=(audio_stream, "audio"), daemon=True)]
+    for fetcher in fetchers:
+        fetcher.start()
+    for fetcher in fetchers:
+        fetcher.join()
+    if errors:
+        # 已下载的部分保留在 .part 文件中，下次调用时续传
+        raise errors[0]
+
+    temp_output = _temp_output(output_file)
+    try:
+        result = subprocess.run(
+            _mux_command(results["video"], results["audio"], video_stream, audio_stream, temp_output),
+            capture_output=True
+        )
+        if result.returncode != 0:
+            message = result.stderr.decode("utf-8", "replace").strip()
+            raise Exception(f"ffmpeg 合并失败: {message}")
+        os.replace(temp_output, output_file)
+    finally:
+        _remove(temp_output)
+    _remove(results["video"])
+    _remove(results["audio"])
+    return output_file
+
+
+def download_and_mux(video_stream, audio_stream, output_path, on_progress=None,
+                     segment_size=SEGMENT_SIZE, timeout=REQUEST_TIMEOUT):
+    """并行下载视频流和音频流并合并，返回最终文件路径
+
+    on_progress(已下载字节数, 总字节数) 汇报两个流合计的进度。
+    """
+    output_file = video_stream.get_file_path(output_path=output_path)
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    progress = _Progress(video_stream.filesize + audio_stream.filesize, on_progress)
+
+    # 上次并行下载中断留下了 .part 文件时继续续传，不再从头走管道
+    if can_pipe() and not _has_partial(video_stream, audio_stream, output_path):
+        try:
+            return _pipe_mux(video_stream, audio_stream, output_file, progress, segment_size, timeout)
+        except DownloadInterrupted:
+            # 管道中已经从中断处重试过，仍然失败时交给调用方的重试循环（可以换线路）
+            raise
+        except Exception:
+            # 建立管道或 ffmpeg 合并失败：改为下载 .part 文件，之后的重试可以从中断处继续
+            progress.reset()
+
+    return _parallel_mux(video_stream, audio_stream, output_path, output_file, progress,
+                         segment_size, timeout)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载参数自动调优
+在任务开始后的几秒内测量实际吞吐量，按代理线路对并发片段数和分块大小做爬山搜索，
+较好的参数保存到 ~/.downtube/tuning.json，下一个任务直接沿用
+"""
+
+import json
+import os
+import threading
+import time
+
+from bandwidth import current_limit, get_limiter
+
+# 默认保存位置
+DEFAULT_TUNING_PATH = os.path.join(os.path.expanduser("~/.downtube"), "tuning.json")
+
+# 并发片段数的范围（同一线路上所有任务合计的连接数）
+MIN_FRAGMENTS = 1
+MAX_FRAGMENTS = 16
+
+# 可选的分块大小
+CHUNK_SIZES = [1 << 20, 2 << 20, 5 << 20, 10 << 20, 20 << 20, 40 << 20]
+
+# 读取缓冲区上限；yt-dlp 只把它作为初始读取大小，之后会自动调整
+MAX_BUFFER_SIZE = 16 * 1024 * 1024
+
+# 没有历史记录时的参数（与原先各入口的固定值一致）
+DEFAULT_FRAGMENTS = 5
+DEFAULT_CHUNK_INDEX = 3  # 10MB
+
+# 测量窗口（秒）：开始下载后这段时间内的平均速度作为本次的吞吐量
+PROBE_SECONDS = 5.0
+
+# 文件在测量窗口内就下载完时，至少需要的测量时间（秒）
+MIN_PROBE_SECONDS = 1.0
+
+# 新参数至少要快这么多才会被采用，避免网络抖动导致来回切换
+IMPROVEMENT = 0.05
+
+# 当前最佳参数的吞吐量平滑系数
+ALPHA = 0.3
+
+# 两个方向都试过没有提升后，每隔多少个任务再试探一次
+EXPLORE_EVERY = 5
+
+
+
+class Tuning:
+    """一组下载参数"""
+    __slots__ = ("fragments", "chunk_index")
+
+    def __init__(self, fragments=DEFAULT_FRAGMENTS, chunk_index=DEFAULT_CHUNK_INDEX):
+        self.fragments = min(MAX_FRAGMENTS, max(MIN_FRAGMENTS, int(fragments)))
+        self.chunk_index = min(len(CHUNK_SIZES) - 1, max(0, int(chunk_index)))
+
+    @property
+    def chunk_size(self):
+        return CHUNK_SIZES[self.chunk_index]
+
+    def step(self, dim, direction):
+        """沿一个维度移动一步，已到边界时返回 None"""
+        if dim == "fragments":
+            moved = Tuning(self.fragments + direction, self.chunk_index)
+        else:
+            moved = Tuning(self.fragments, self.chunk_index + direction)
+        return None if moved == self else moved
+
+    def ytdlp_opts(self, active_jobs=1):
+        """yt-dlp 选项；同一线路上有多个任务时平分并发片段数"""
+        fragments = max(MIN_FRAGMENTS, -(-self.fragments // max(1, active_jobs)))
+        return {
+            'concurrent_fragment_downloads': fragments,
+            'http_chunk_size': self.chunk_size,
+            'buffersize': min(self.chunk_size, MAX_BUFFER_SIZE),
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, Tuning) and \
+            (self.fragments, self.chunk_index) == (other.fragments, other.chunk_index)
+
+    def __hash__(self):
+        return hash((self.fragments, self.chunk_index))
+
+    def __repr__(self):
+        return f"Tuning(fragments={self.fragments}, chunk={self.chunk_size >> 20}MB)"
+
+
+class _RouteState:
+    """一条线路的搜索状态"""
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.best = Tuning(data.get("fragments", DEFAULT_FRAGMENTS),
+                           data.get("chunk_index", DEFAULT_CHUNK_INDEX))
+        self.throughput = data.get("throughput")  # 字节/秒，按单任务折算为整条线路
+        self.dim = data.get("dim", "fragments")
+        self.direction = data.get("direction", 1)
+        self.failures = data.get("failures", 0)
+        self.jobs = data.get("jobs", 0)
+
+    def to_dict(self):
+        return {
+            "fragments": self.best.fragments,
+            "chunk_index": self.best.chunk_index,
+            "throughput": self.throughput,
+            "dim": self.dim,
+            "direction": self.direction,
+            "failures": self.failures,
+            "jobs": self.jobs,
+        }
+
+    def candidate(self):
+        """下一个任务要试的参数"""
+        if self.throughput is None:
+            # 还没有测过当前参数，先测基准
+            return self.best
+        if self.failures >= 4 and self.jobs % EXPLORE_EVERY:
+            # 附近的参数都试过了，大部分任务直接使用最佳参数
+            return self.best
+        for _ in range(4):
+            trial = self.best.step(self.dim, self.direction)
+            if trial is not None:
+                return trial
+            self._turn()
+        return self.best
+
+    def record(self, tuning, throughput):
+        """记录一次测量结果，返回之后应使用的参数"""
+        self.jobs += 1
+        if tuning == self.best or self.throughput is None:
+            self.best = tuning
+            if self.throughput is None:
+                self.throughput = throughput
+            else:
+                self.throughput = ALPHA * throughput + (1 - ALPHA) * self.throughput
+        elif throughput > self.throughput * (1 + IMPROVEMENT):
+            # 有提升，沿同一方向继续
+            self.best = tuning
+            self.throughput = throughput
+            self.failures = 0
+        else:
+            self._turn()
+        return self.best
+
+    def _turn(self):
+        """当前方向没有提升：先反向，两个方向都不行时换一个维度"""
+        self.failures += 1
+        if self.direction > 0:
+            self.direction = -1
+        else:
+            self.direction = 1
+            self.dim = "chunk" if self.dim == "fragments" else "fragments"
+
+
+def _throttled(limit=None):
+    """下载是否受全局限速或任务限速（limit，默认为当前线程的任务）约束"""
+    limit = limit or current_limit()
+    return bool(get_limiter().rate or (limit is not None and limit.effective_rate))
+
+
+class TuningSession:
+    """单个任务的调优会话
+
+    把 ytdlp_opts() 合并进下载选项，把 progress_hook 加入 progress_hooks，
+    借出 YoutubeDL 后调用 attach(ydl)。测量窗口结束后结果写回调优器；
+    如果试探的参数更慢，本任务之后的文件（例如视频之后的音频）改回最佳参数。
+    测量期间受限速约束时不记录结果（limit 为任务的 JobLimit）。
+    """
+
+    def __init__(self, tuner, route, tuning, active_jobs, limit=None):
+        self.tuner = tuner
+        self.route = route
+        self.tuning = tuning
+        self.active_jobs = active_jobs
+        self.limit = limit
+        self._ydl = None
+        self._filename = None
+        self._started_at = None
+        self._start_bytes = 0
+        self._throttled = False
+        self._done = False
+
+    def ytdlp_opts(self):
+        return self.tuning.ytdlp_opts(self.active_jobs)
+
+    def attach(self, ydl):
+        """关联本任务使用的 YoutubeDL，用于在任务中途切换参数"""
+        self._ydl = ydl
+
+    def progress_hook(self, d):
+        if self._done:
+            return
+        status = d.get('status')
+        downloaded = d.get('downloaded_bytes') or 0
+        if status == 'downloading':
+            now = time.monotonic()
+            if self._started_at is None or d.get('filename') != self._filename:
+                # 只测量第一个文件；换了文件说明第一个文件太小，重新计时
+                self._filename = d.get('filename')
+                self._started_at = now
+                self._start_bytes = downloaded
+                self._throttled = _throttled(self.limit)
+                return
+            if now - self._started_at >= PROBE_SECONDS:
+                self._finish(downloaded, now)
+        elif status == 'finished' and self._started_at is not None:
+            now = time.monotonic()
+            if now - self._started_at >= MIN_PROBE_SECONDS:
+                self._finish(d.get('total_bytes') or downloaded, now)
+
+    def _finish(self, downloaded, now):
+        self._done = True
+        if self._throttled or _throttled(self.limit):
+            # 限速器才是瓶颈，测得的速度不代表线路的能力，不计入搜索
+            return
+        elapsed = now - self._started_at
+        throughput = (downloaded - self._start_bytes) / elapsed if elapsed > 0 else 0
+        if throughput <= 0:
+            return
+        best = self.tuner.record(self.route, self.tuning, throughput * self.active_jobs)
+        if best != self.tuning and self._ydl is not None:
+            # yt-dlp 每开始一个文件时读取这些选项
+            self._ydl.params.update(best.ytdlp_opts(self.active_jobs))
+            self.tuning = best
+
+
+class AutoTuner:
+    """按线路保存和搜索下载参数"""
+
+    def __init__(self, path=DEFAULT_TUNING_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._routes = {}  # 线路 -> _RouteState
+        self._load()
+
+    def start(self, route=None, active_jobs=1, limit=None):
+        """开始一个任务的调优会话；route 为代理地址，直连时为 None，limit 为任务的 JobLimit"""
+        key = route or "direct"
+        with self._lock:
+            tuning = self._state(key).candidate()
+        return TuningSession(self, key, tuning, max(1, int(active_jobs)), limit)
+
+    def best(self, route=None):
+        """线路当前的最佳参数"""
+        with self._lock:
+            return self._state(route or "direct").best
+
+    def record(self, route, tuning, throughput):
+        """记录测量结果并保存，返回线路当前的最佳参数"""
+        with self._lock:
+            best = self._state(route).record(tuning, throughput)
+            data = {key: state.to_dict() for key, state in self._routes.items()}
+        self._save(data)
+        return best
+
+    def _state(self, key):
+        state = self._routes.get(key)
+        if state is None:
+            state = self._routes[key] = _RouteState()
+        return state
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+        for key, value in data.items():
+            if isinstance(value, dict):
+                self._routes[key] = _RouteState(value)
+
+    def _save(self, data):
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_tuner = None
+_default_tuner_lock = threading.Lock()
+
+
+def get_autotuner():
+    """返回进程内共享的调优器"""
+    global _default_tuner
+    with _default_tuner_lock:
+        if _default_tuner is None:
+            _default_tuner = AutoTuner()
+        return _default_tuner
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+全局带宽限制
+进程内所有下载共用一个令牌桶；每个任务另有自己的令牌桶，速率为全局速率按权重分到的份额
+（再受任务自己的上限约束）。yt-dlp 通过进度回调、断点续传下载按读取的数据块、
+aria2c 通过启动参数从这里取得限速，速率可以在运行中调整
+"""
+
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# 0 表示不限速
+UNLIMITED = 0
+
+# 令牌桶允许的突发时长（秒），突发量 = 速率 × BURST_SECONDS
+BURST_SECONDS = 0.5
+
+# 任务超过这个时间没有消耗流量就不再参与分配（秒）
+IDLE_SECONDS = 2.0
+
+# 重新分配各任务份额的最短间隔（秒）
+REBALANCE_SECONDS = 0.5
+
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+_RATE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:I?B)?(?:/S)?\s*$')
+
+
+def parse_rate(text):
+    """把 '500K'、'2M'、'1.5MB/s' 之类的写法转换为字节/秒，'0' 或空值表示不限速"""
+    if text is None or str(text).strip() == '':
+        return UNLIMITED
+    match = _RATE_RE.match(str(text).upper())
+    if not match:
+        raise ValueError(f"无效的速率: {text}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+
+def format_rate(rate):
+    """把字节/秒格式化为便于阅读的文字"""
+    if not rate:
+        return "不限速"
+    if rate >= 1024 ** 2:
+        return f"{rate / 1024 ** 2:.1f} MB/s"
+    return f"{rate / 1024:.0f} KB/s"
+
+
+class TokenBucket:
+    """令牌桶，速率为 0 时不限速
+
+    reserve(size) 立即扣除令牌并返回需要等待的秒数，令牌可以透支，
+    多个线程同时取用时按先后顺序排队。
+    """
+
+    def __init__(self, rate=UNLIMITED, burst_seconds=BURST_SECONDS):
+        self._lock = threading.Lock()
+        self._rate = max(0, int(rate or 0))
+        self._burst_seconds = burst_seconds
+        self._tokens = self._capacity()
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def _capacity(self):
+        return self._rate * self._burst_seconds
+
+    def _refill(self, now):
+        if self._rate:
+            self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = max(0, int(rate or 0))
+            self._tokens = min(self._tokens, self._capacity())
+
+    def reserve(self, size):
+        with self._lock:
+            if not self._rate:
+                return 0.0
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= size
+            return -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+
+class JobLimit:
+    """一个下载任务的限速
+
+    rate 为任务自己的上限（0 为不设上限），weight 为分配全局带宽时的权重。
+    """
+
+    def __init__(self, limiter, key, weight=1.0, rate=UNLIMITED):
+        self.limiter = limiter
+        self.key = key
+        self.weight = max(0.01, float(weight))
+        self.rate = max(0, int(rate or 0))
+        self.bucket = TokenBucket()
+        self.last_active = 0.0
+        self._lock = threading.Lock()
+        self._seen = {}   # yt-dlp 文件名 -> 已计入的字节数
+
+    @property
+    def effective_rate(self):
+        """当前实际生效的速率（0 为不限速）"""
+        return self.bucket.rate
+
+    def consume(self, size):
+        """消耗 size 字节的流量，超过速率时阻塞"""
+        self.limiter.consume(size, self)
+
+    def progress_hook(self, d):
+        """yt-dlp 进度回调：按新增的已下载字节数限速（在下载线程中阻塞）"""
+        if d.get('status') != 'downloading':
+            return
+        name = d.get('tmpfilename') or d.get('filename') or ''
+        downloaded = d.get('downloaded_bytes') or 0
+        with self._lock:
+            seen = self._seen.get(name, 0)
+            # 重新开始下载同一个文件时已下载字节数会变小
+            delta = downloaded - seen if downloaded >= seen else downloaded
+            self._seen[name] = downloaded
+        if delta > 0:
+            self.consume(delta)
+
+    def close(self):
+        self.limiter.unregister(self.key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BandwidthLimiter:
+    """进程内的全局限速器"""
+
+    def __init__(self, rate=UNLIMITED):
+        self._lock = threading.Lock()
+        self._global = TokenBucket(rate)
+        self._jobs = {}            # 任务键 -> JobLimit
+        self._rebalanced_at = 0.0
+
+    @property
+    def rate(self):
+        return self._global.rate
+
+    def set_rate(self, rate):
+        """调整全局速率（字节/秒，0 为不限速），立即生效"""
+        self._global.set_rate(rate)
+        with self._lock:
+            self._rebalance(time.monotonic())
+
+    def register(self, key, weight=1.0, rate=UNLIMITED):
+        """登记一个任务，返回 JobLimit；同一个键重复登记时替换原来的"""
+        job = JobLimit(self, key, weight, rate)
+        with self._lock:
+            self._jobs[key] = job
+            self._rebalance(time.monotonic())
+        return job
+
+    def unregister(self, key):
+        with self._lock:
+            if self._jobs.pop(key, None) is not None:
+                self._rebalance(time.monotonic())
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def set_job_rate(self, key, rate):
+        """调整单个任务的速率上限，返回任务是否存在"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return False
+            job.rate = max(0, int(rate or 0))
+            self._rebalance(time.monotonic())
+            return True
+
+    def set_job_weight(self, key, weight):
+        """调整单个任务的权重，返回任务是否存在"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return False
+            job.weight = max(0.01, float(weight))
+            self._rebalance(time.monotonic())
+            return True
+
+    def consume(self, size, job=None):
+        """消耗 size 字节的流量；job 为 None 时只受全局速率限制"""
+        if size <= 0:
+            return
+        now = time.monotonic()
+        if job is not None:
+            with self._lock:
+                idle = now - job.last_active > IDLE_SECONDS
+                job.last_active = now
+                # 空闲的任务重新开始下载时立即重新分配，其余情况定期分配
+                if idle or now - self._rebalanced_at >= REBALANCE_SECONDS:
+                    self._rebalance(now)
+            delay = max(self._global.reserve(size), job.bucket.reserve(size))
+        else:
+            delay = self._global.reserve(size)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _rebalance(self, now):
+        """按权重把全局速率分给正在下载的任务（需持有锁）"""
+        self._rebalanced_at = now
+        rate = self._global.rate
+        active = [job for job in self._jobs.values() if now - job.last_active <= IDLE_SECONDS]
+        shares = _fair_shares(active, rate) if rate else {}
+        for job in self._jobs.values():
+            if not rate:
+                effective = job.rate
+            elif job in shares:
+                effective = shares[job]
+            else:
+                # 空闲任务按重新加入时的份额预先计算
+                effective = _fair_shares(active + [job], rate)[job]
+            job.bucket.set_rate(effective)
+
+
+def _fair_shares(jobs, rate):
+    """按权重把 rate 分给 jobs，返回 {任务: 速率}
+
+    份额超过自身上限的任务只分到上限，用不完的部分再按权重分给其余任务。
+    """
+    shares = {}
+    remaining = list(jobs)
+    while remaining:
+        total_weight = sum(job.weight for job in remaining)
+        capped = [job for job in remaining if job.rate and job.rate < rate * job.weight / total_weight]
+        if not capped:
+            for job in remaining:
+                shares[job] = int(rate * job.weight / total_weight)
+            break
+        for job in capped:
+            shares[job] = job.rate
+            rate -= job.rate
+            remaining.remove(job)
+    return shares
+
+
+_local = threading.local()
+
+
+def current_limit():
+    """当前线程正在执行的任务的 JobLimit，没有时返回 None"""
+    return getattr(_local, "job", None)
+
+
+@contextmanager
+def limited(job):
+    """在 with 块内，当前线程的流量计入 job"""
+    previous = getattr(_local, "job", None)
+    _local.job = job
+    try:
+        yield job
+    finally:
+        _local.job = previous
+
+
+def bind_limit(func):
+    """让 func 在其他线程中执行时沿用当前线程的任务限速"""
+    job = current_limit()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with limited(job):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def throttle(size):
+    """按当前线程的任务（没有时按全局）限速消耗 size 字节"""
+    get_limiter().consume(size, current_limit())
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """返回进程内共享的限速器"""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = BandwidthLimiter()
+        return _default_limiter
@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载吞吐量基准测试
+用本地媒体服务器代替 YouTube 和代理，在相同的带宽和延迟下比较各个下载入口：
+    python -m bench.runner
+"""
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基准测试用的本地媒体服务器
+提供合成的完整文件（支持 Range）和 DASH 分片两种媒体，可以限制带宽、增加每个请求的延迟，
+并记录发出的字节数和第一个媒体字节的发送时间
+"""
+
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 合成媒体的默认大小
+DEFAULT_MEDIA_SIZE = 64 * 1024 * 1024
+
+# DASH 每个分片的大小
+DEFAULT_SEGMENT_SIZE = 2 * 1024 * 1024
+
+# DASH 初始化分片的大小
+INIT_SEGMENT_SIZE = 4096
+
+# 每次写入连接的字节数，也是限速的粒度
+WRITE_SIZE = 64 * 1024
+
+# 合成数据的随机种子，保证每次运行内容相同
+SEED = 20240601
+
+PROGRESSIVE_PATH = "/progressive.mp4"
+MANIFEST_PATH = "/dash/manifest.mpd"
+
+# 每个分片对应的时长（秒），只用于生成清单
+_SEGMENT_SECONDS = 4
+
+
+class _Link:
+    """所有连接共享的限速链路"""
+
+    def __init__(self, bandwidth=None):
+        self.bandwidth = bandwidth  # 字节/秒，None 表示不限速
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def consume(self, size):
+        if not self.bandwidth:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + size / self.bandwidth
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Payload:
+    """按偏移量生成确定的合成数据"""
+
+    def __init__(self, seed=SEED, block_size=1024 * 1024):
+        self.block = random.Random(seed).randbytes(block_size)
+
+    def read(self, offset, size):
+        block_size = len(self.block)
+        parts = []
+        while size > 0:
+            start = offset % block_size
+            part = self.block[start:start + size]
+            parts.append(part)
+            offset += len(part)
+            size -= len(part)
+        return b"".join(parts)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "BenchMedia/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head):
+        media = self.server.media
+        media.count_request()
+        if media.latency:
+            time.sleep(media.latency)
+
+        path = self.path.split("?", 1)[0]
+        if path == MANIFEST_PATH:
+            body = media.manifest().encode("utf-8")
+            self._send_simple(200, "application/dash+xml", body, head)
+            return
+
+        resource = media.resource(path)
+        if resource is None:
+            self._send_simple(404, "text/plain", b"not found", head)
+            return
+        offset, size, content_type = resource
+
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            first, _, last = range_header[6:].split(",")[0].partition("-")
+            try:
+                start = int(first) if first else max(0, size - int(last))
+                end = min(int(last), size - 1) if first and last else size - 1
+            except ValueError:
+                start, end = 0, size - 1
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+
+        position = start
+        try:
+            while position <= end:
+                size_now = min(WRITE_SIZE, end - position + 1)
+                media.link.consume(size_now)
+                self.wfile.write(media.payload.read(offset + position, size_now))
+                media.count_bytes(size_now)
+                position += size_now
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端只读取了开头（例如提取信息时的探测请求）
+            self.close_connection = True
+
+    def _send_simple(self, status, content_type, body, head):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+
+class MediaServer:
+    """在后台线程运行的合成媒体服务器
+
+    bandwidth 为所有连接共享的带宽（字节/秒），latency 为每个请求响应前的等待（秒），
+    用来模拟不同的网络和代理线路。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, bandwidth=None, latency=0.0,
+                 media_size=DEFAULT_MEDIA_SIZE, segment_size=DEFAULT_SEGMENT_SIZE):
+        self.latency = latency
+        self.media_size = media_size
+        self.segment_size = segment_size
+        self.segment_count = max(1, -(-media_size // segment_size))
+        self.link = _Link(bandwidth)
+        self.payload = _Payload()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.media = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, kind):
+        """媒体地址，kind 为 progressive 或 dash"""
+        return self.base_url + (PROGRESSIVE_PATH if kind == "progressive" else MANIFEST_PATH)
+
+    def set_network(self, bandwidth=None, latency=0.0):
+        """调整带宽和延迟"""
+        self.link = _Link(bandwidth)
+        self.latency = latency
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="bench-media", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._requests = 0
+            self._bytes_sent = 0
+            self._first_byte_at = None
+
+    def stats(self):
+        """返回 {'requests', 'bytes_sent', 'first_byte_at'}，first_byte_at 为 time.time() 时间"""
+        with self._stats_lock:
+            return {
+                "requests": self._requests,
+                "bytes_sent": self._bytes_sent,
+                "first_byte_at": self._first_byte_at,
+            }
+
+    def count_request(self):
+        with self._stats_lock:
+            self._requests += 1
+
+    def count_bytes(self, size):
+        with self._stats_lock:
+            if self._first_byte_at is None:
+                self._first_byte_at = time.time()
+            self._bytes_sent += size
+
+    def resource(self, path):
+        """返回 (数据偏移, 大小, Content-Type)，不存在时返回 None"""
+        if path == PROGRESSIVE_PATH:
+            return 0, self.media_size, "video/mp4"
+        if path == "/dash/init.mp4":
+            return 0, INIT_SEGMENT_SIZE, "video/mp4"
+        if path.startswith("/dash/seg-") and path.endswith(".m4s"):
+            try:
+                index = int(path[len("/dash/seg-"):-len(".m4s")])
+            except ValueError:
+                return None
+            if not 0 <= index < self.segment_count:
+                return None
+            offset = index * self.segment_size
+            return offset, min(self.segment_size, self.media_size - offset), "video/iso.segment"
+        return None
+
+    def manifest(self):
+        """单一视频表示的静态 DASH 清单，分片地址相对于清单"""
+        duration = self.segment_count * _SEGMENT_SECONDS
+        bandwidth = int(self.segment_size * 8 / _SEGMENT_SECONDS)
+        segments = "\n".join(
+            f'          <SegmentURL media="seg-{index}.m4s"/>' for index in range(self.segment_count)
+        )
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S"
+     mediaPresentationDuration="PT{duration}S" profiles="urn:mpeg:dash:profile:isoff-main:2011">
+  <Period id="0" start="PT0S">
+    <AdaptationSet id="0" contentType="video" mimeType="video/mp4">
+      <Representation id="bench" codecs="avc1.4d401f" width="1280" height="720" bandwidth="{bandwidth}">
+        <SegmentList timescale="1" duration="{_SEGMENT_SECONDS}">
+          <Initialization sourceURL="init.mp4"/>
+{segments}
+        </SegmentList>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载吞吐量基准测试
+启动本地媒体服务器，在每种网络条件下用子进程逐个运行下载入口，
+报告 MB/s、首字节时间、CPU 时间和峰值内存，并与保存的基线比较
+
+    python -m bench.runner                       # 运行全部组合并与基线比较
+    python -m bench.runner -e fast,gui -m dash   # 只运行部分入口和媒体
+    python -m bench.runner --save-baseline       # 把本次结果保存为基线
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from bench.media_server import MediaServer
+from bench.worker import ENTRY_POINTS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认基线文件
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "bench", "baselines.json")
+
+# 网络条件: 名称 -> (带宽 字节/秒，None 为不限速; 每个请求的延迟 秒)
+PROFILES = {
+    "lan": (None, 0.0),
+    "broadband": (8 * 1024 * 1024, 0.02),
+    "slow-proxy": (2 * 1024 * 1024, 0.12),
+}
+
+MEDIA_KINDS = ("progressive", "dash")
+
+# 合成媒体的默认大小（MB）
+DEFAULT_SIZE_MB = 64
+
+# 单次下载的超时时间（秒）
+RUN_TIMEOUT = 600
+
+# 与基线相比吞吐量下降超过这个比例时标记为退化
+DEFAULT_TOLERANCE = 0.10
+
+_MB = 1024 * 1024
+
+
+def _worker_env(home):
+    """子进程环境：独立的 HOME（缓存和调优记录不跨次运行），ffmpeg 不可用"""
+    shim_dir = os.path.join(home, "bin")
+    os.makedirs(shim_dir, exist_ok=True)
+    for tool in ("ffmpeg", "ffprobe"):
+        path = os.path.join(shim_dir, tool)
+        with open(path, "w") as f:
+            f.write("#!/bin/sh\nexit 127\n")
+        os.chmod(path, 0o755)
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["PATH"] = shim_dir + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    # 测速时不能经过系统代理
+    for name in ("http_proxy", "https_proxy", "all_proxy", "HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY"):
+        env.pop(name, None)
+    env["no_proxy"] = env["NO_PROXY"] = "127.0.0.1,localhost"
+    return env
+
+
+def run_once(server, entry, kind):
+    """运行一次下载，返回测量结果字典"""
+    work_dir = tempfile.mkdtemp(prefix="downtube-bench-")
+    try:
+        output_path = os.path.join(work_dir, "out")
+        server.reset_stats()
+        process = subprocess.run(
+            [sys.executable, "-m", "bench.worker", entry, server.url(kind), output_path],
+            cwd=REPO_ROOT, env=_worker_env(os.path.join(work_dir, "home")),
+            capture_output=True, text=True, timeout=RUN_TIMEOUT
+        )
+        lines = process.stdout.strip().splitlines()
+        if process.returncode != 0 or not lines:
+            message = process.stderr.strip().splitlines()
+            return {"ok": False, "error": message[-1] if message else f"退出码 {process.returncode}"}
+        result = json.loads(lines[-1])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    stats = server.stats()
+    if result["ok"] and result["bytes"] < server.media_size:
+        result["ok"] = False
+        result["error"] = f"文件不完整: {result['bytes']}/{server.media_size} 字节"
+    result["mbps"] = result["bytes"] / _MB / result["wall"] if result["wall"] > 0 else 0.0
+    first_byte_at = stats["first_byte_at"]
+    result["ttfb"] = first_byte_at - result["started_at"] if first_byte_at else None
+    result["requests"] = stats["requests"]
+    result["bytes_sent"] = stats["bytes_sent"]
+    return result
+
+
+def summarize(results):
+    """多次运行取中位数"""
+    ok = [r for r in results if r.get("ok")]
+    if not ok:
+        return {"ok": False, "error": results[-1].get("error")}
+    ttfbs = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+    return {
+        "ok": True,
+        "runs": len(ok),
+        "mbps": round(statistics.median(r["mbps"] for r in ok), 2),
+        "ttfb": round(statistics.median(ttfbs), 3) if ttfbs else None,
+        "cpu": round(statistics.median(r["cpu"] for r in ok), 3),
+        "peak_rss_mb": round(statistics.median(r["peak_rss"] for r in ok) / _MB, 1),
+        "requests": int(statistics.median(r["requests"] for r in ok)),
+        # 发出的字节数多于文件大小说明有重复下载
+        "overhead": round(statistics.median(r["bytes_sent"] for r in ok) / max(1, ok[0]["bytes"]) - 1, 3),
+    }
+
+
+def load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(path, summaries, meta):
+    baseline = load_baseline(path)
+    baseline.setdefault("results", {}).update(
+        {key: summary for key, summary in summaries.items() if summary["ok"]}
+    )
+    baseline["meta"] = meta
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def _format_row(key, summary, base, tolerance):
+    if not summary["ok"]:
+        return f"{key:<32} 失败: {summary.get('error')}"
+    ttfb = f"{summary['ttfb']:.3f}s" if summary["ttfb"] is not None else "-"
+    row = (f"{key:<32} {summary['mbps']:>8.2f} {ttfb:>9} {summary['cpu']:>8.2f}s "
+           f"{summary['peak_rss_mb']:>8.1f} {summary['requests']:>6}")
+    if base and base.get("mbps"):
+        change = summary["mbps"] / base["mbps"] - 1
+        flag = "  退化" if change < -tolerance else ""
+        row += f"  {change:+.1%}{flag}"
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载吞吐量基准测试")
+    parser.add_argument("-e", "--entries", default=",".join(ENTRY_POINTS),
+                        help=f"要测试的入口，逗号分隔 (默认 {','.join(ENTRY_POINTS)})")
+    parser.add_argument("-m", "--media", default=",".join(MEDIA_KINDS),
+                        help="媒体类型: progressive, dash")
+    parser.add_argument("-p", "--profiles", default=",".join(PROFILES),
+                        help=f"网络条件，逗号分隔 ({', '.join(PROFILES)})")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="每个组合运行的次数 (默认 3)")
+    parser.add_argument("-s", "--size", type=int, default=DEFAULT_SIZE_MB,
+                        help=f"合成媒体大小，单位 MB (默认 {DEFAULT_SIZE_MB})")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="吞吐量下降超过该比例时视为退化 (默认 0.10)")
+    args = parser.parse_args()
+
+    entries = [name for name in args.entries.split(",") if name]
+    kinds = [name for name in args.media.split(",") if name]
+    profiles = [name for name in args.profiles.split(",") if name]
+    for name in entries:
+        if name not in ENTRY_POINTS:
+            parser.error(f"未知入口: {name}")
+    for name in kinds:
+        if name not in MEDIA_KINDS:
+            parser.error(f"未知媒体类型: {name}")
+    for name in profiles:
+        if name not in PROFILES:
+            parser.error(f"未知网络条件: {name}")
+
+    baseline = load_baseline(args.baseline).get("results", {})
+    server = MediaServer(media_size=args.size * _MB).start()
+    summaries = {}
+    regressions = 0
+    print(f"{'组合':<32} {'MB/s':>8} {'首字节':>9} {'CPU':>9} {'内存MB':>8} {'请求':>6}  对比基线")
+    try:
+        for profile in profiles:
+            bandwidth, latency = PROFILES[profile]
+            server.set_network(bandwidth, latency)
+            for kind in kinds:
+                for entry in entries:
+                    key = f"{profile}/{kind}/{entry}"
+                    summary = summarize([run_once(server, entry, kind) for _ in range(args.repeat)])
+                    summaries[key] = summary
+                    base = baseline.get(key)
+                    if summary["ok"] and base and base.get("mbps") and \
+                            summary["mbps"] < base["mbps"] * (1 - args.tolerance):
+                        regressions += 1
+                    print(_format_row(key, summary, base, args.tolerance), flush=True)
+    finally:
+        server.stop()
+
+    if args.save_baseline:
+        save_baseline(args.baseline, summaries, {
+            "size_mb": args.size,
+            "repeat": args.repeat,
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+        })
+        print(f"基线已保存到 {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
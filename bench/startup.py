@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时基准测试
+测量命令行工具 `--help` 的耗时和图形界面从启动到窗口可见的耗时，并与保存的基线比较。
+每个入口先在空的 HOME 中运行一次（冷启动，没有工具检测缓存），之后多次运行取中位数（热启动）
+
+    python -m bench.startup                    # 测量全部入口并与基线比较
+    python -m bench.startup -e fast,gui        # 只测量部分入口
+    python -m bench.startup --save-baseline    # 把本次结果保存为基线
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.runner import REPO_ROOT, load_baseline, save_baseline
+
+# 默认基线文件
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "bench", "startup_baselines.json")
+
+# 入口名 -> 命令行参数
+COMMANDS = {
+    "fast": ["fast_downloader.py", "--help"],
+    "dark": ["dark_downloader.py", "--help"],
+    "simple": ["simple_downloader.py", "--help"],
+    "progress": ["progress_downloader.py", "--help"],
+    "yt": ["yt_downloader.py", "--help"],
+    "cli": ["cli_downloader.py", "--help"],
+    # 窗口显示后输出启动耗时并退出
+    "gui": ["main.py", "--startup-report"],
+}
+
+# 单次运行的超时时间（秒）
+RUN_TIMEOUT = 60
+
+# 与基线相比耗时增加超过这个比例时标记为退化
+DEFAULT_TOLERANCE = 0.20
+
+
+def _env(home):
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def run_once(name, home):
+    """运行一次，返回耗时（毫秒），失败时抛出异常"""
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable] + COMMANDS[name], cwd=REPO_ROOT, env=_env(home),
+        stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=RUN_TIMEOUT
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        message = process.stderr.strip().splitlines()
+        raise RuntimeError(message[-1] if message else f"退出码 {process.returncode}")
+    return elapsed
+
+
+def measure(name, repeat):
+    home = tempfile.mkdtemp(prefix="downtube-startup-")
+    try:
+        cold = run_once(name, home)
+        warm = [run_once(name, home) for _ in range(repeat)]
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        return {"ok": False, "error": str(e)}
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    return {
+        "ok": True,
+        "cold_ms": round(cold, 1),
+        "warm_ms": round(statistics.median(warm), 1),
+        "min_ms": round(min(warm), 1),
+    }
+
+
+def _format_row(name, summary, base, tolerance):
+    if not summary["ok"]:
+        return f"{name:<10} 失败: {summary.get('error')}"
+    row = f"{name:<10} {summary['cold_ms']:>10.1f} {summary['warm_ms']:>10.1f} {summary['min_ms']:>10.1f}"
+    if base and base.get("warm_ms"):
+        change = summary["warm_ms"] / base["warm_ms"] - 1
+        flag = "  退化" if change > tolerance else ""
+        row += f"  {change:+.1%}{flag}"
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("-e", "--entries", default=",".join(COMMANDS),
+                        help=f"要测量的入口，逗号分隔 (默认 {','.join(COMMANDS)})")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="热启动运行的次数 (默认 5)")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="热启动耗时增加超过该比例时视为退化 (默认 0.20)")
+    args = parser.parse_args()
+
+    entries = [name for name in args.entries.split(",") if name]
+    for name in entries:
+        if name not in COMMANDS:
+            parser.error(f"未知入口: {name}")
+
+    baseline = load_baseline(args.baseline).get("results", {})
+    summaries = {}
+    regressions = 0
+    print(f"{'入口':<10} {'冷启动ms':>10} {'热启动ms':>10} {'最快ms':>10}  对比基线")
+    for name in entries:
+        summary = measure(name, args.repeat)
+        summaries[name] = summary
+        base = baseline.get(name)
+        if summary["ok"] and base and base.get("warm_ms") and \
+                summary["warm_ms"] > base["warm_ms"] * (1 + args.tolerance):
+            regressions += 1
+        print(_format_row(name, summary, base, args.tolerance), flush=True)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, summaries, {
+            "repeat": args.repeat,
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+        })
+        print(f"基线已保存到 {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
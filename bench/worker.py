@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基准测试的子进程：调用一个下载入口下载一次，最后一行输出 JSON 结果
+    python -m bench.worker <入口> <媒体地址> <输出目录>
+
+每次测量都在新进程中进行，CPU 时间和峰值内存只包含这一次下载。
+合成媒体无法交给 ffmpeg 合并或修复，因此各入口都按没有 ffmpeg 的路径运行，测的是传输本身。
+"""
+
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+
+
+def _without_ffmpeg(module):
+    module.FFMPEG_AVAILABLE = False
+    return module
+
+
+def load_fast():
+    fast_downloader = _without_ffmpeg(__import__("fast_downloader"))
+    return lambda url, output_path: fast_downloader.download_video(url, output_path=output_path)
+
+
+def load_dark():
+    dark_downloader = _without_ffmpeg(__import__("dark_downloader"))
+    return lambda url, output_path: dark_downloader.download_video(url, output_path=output_path)
+
+
+def load_simple():
+    simple_downloader = _without_ffmpeg(__import__("simple_downloader"))
+    return lambda url, output_path: simple_downloader.download_with_ytdlp(url, download_path=output_path)
+
+
+def load_gui():
+    from PyQt6.QtCore import QCoreApplication
+    main = _without_ffmpeg(__import__("main"))
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+
+    def run(url, output_path):
+        video = main.VideoItem("bench", "bench", url, "最高质量", job_id=1)
+        thread = main.DownloadThread(1, video, output_path)
+        thread.retry_delay = 0
+        result = {}
+        thread.finished_signal.connect(lambda job_id, path: result.update(path=path))
+        thread.error_signal.connect(lambda job_id, error: result.update(error=error))
+        thread.run()
+        app.processEvents()
+        if "error" in result:
+            raise Exception(result["error"])
+        return "path" in result
+    return run
+
+
+# 入口名 -> 导入模块并返回 run(url, output_path) 的函数
+ENTRY_POINTS = {
+    "fast": load_fast,
+    "dark": load_dark,
+    "simple": load_simple,
+    "gui": load_gui,
+}
+
+
+def _peak_rss_bytes(usage):
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def _output_bytes(output_path):
+    total = 0
+    for root, _, files in os.walk(output_path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def main():
+    entry, url, output_path = sys.argv[1:4]
+    os.makedirs(output_path, exist_ok=True)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # 导入放在计时之外，启动耗时不计入下载
+        run = ENTRY_POINTS[entry]()
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        started_at = time.time()
+        start = time.monotonic()
+        try:
+            ok = bool(run(url, output_path))
+            error = None if ok else "下载入口返回失败"
+        except Exception as e:
+            ok = False
+            error = str(e)
+        wall = time.monotonic() - start
+        after = resource.getrusage(resource.RUSAGE_SELF)
+
+    print(json.dumps({
+        "ok": ok,
+        "error": error,
+        "started_at": started_at,
+        "wall": wall,
+        "cpu": (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime),
+        "peak_rss": _peak_rss_bytes(after),
+        "bytes": _output_bytes(output_path),
+    }))
+
+
+if __name__ == "__main__":
+    main()
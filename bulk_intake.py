@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量添加视频
+支持粘贴的链接列表、文本文件和播放列表/频道链接：播放列表用 yt-dlp 的平铺提取展开，
+缺少标题等信息的条目由有限数量的工作线程并发获取，结果逐条返回
+"""
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, parse_qs
+
+from urls import cache_key
+from ydl_pool import pooled_ydl
+
+# 并发获取视频信息的线程数
+DEFAULT_WORKERS = 8
+
+# 频道链接展开时最多进入的层数（频道 -> 视频/Shorts 标签页 -> 视频）
+MAX_EXPAND_DEPTH = 2
+
+_URL_RE = re.compile(r'https?://[^\s,;"\'<>]+')
+_BARE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_COLLECTION_PATH_RE = re.compile(r'^/(?:playlist|@[^/]+|channel/|c/|user/)')
+
+
+def parse_urls(text):
+    """从文本中提取视频链接（按出现顺序去重），支持每行一个视频ID，# 开头的行为注释"""
+    urls = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        found = _URL_RE.findall(line)
+        if not found and _BARE_ID_RE.match(line):
+            found = [f"https://www.youtube.com/watch?v={line}"]
+        for url in found:
+            key = url if is_collection_url(url) else cache_key(url)
+            if key not in seen:
+                seen.add(key)
+                urls.append(url)
+    return urls
+
+
+def read_url_file(path):
+    """从文本文件读取视频链接"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return parse_urls(f.read())
+
+
+def is_collection_url(url):
+    """是否为播放列表或频道链接（单个视频链接带 list 参数时按单个视频处理）"""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return False
+    host = (parsed.hostname or "").lower()
+    if not (host.endswith("youtube.com") or host == "youtu.be"):
+        return False
+    if parsed.path == "/watch" or host == "youtu.be":
+        return False
+    if "list" in parse_qs(parsed.query):
+        return True
+    return bool(_COLLECTION_PATH_RE.match(parsed.path))
+
+
+def _entry_url(entry):
+    url = entry.get("url") or entry.get("webpage_url")
+    if url and url.startswith("http"):
+        return url
+    video_id = entry.get("id")
+    if video_id and _BARE_ID_RE.match(video_id):
+        return f"https://www.youtube.com/watch?v={video_id}"
+    return url
+
+
+def expand_collection(url, proxy_opts=None, depth=0):
+    """用平铺提取展开播放列表/频道，返回条目列表 [{'url', 'title', 'author'}]
+
+    平铺提取只请求列表页，不逐个解析视频
+    """
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'no_check_certificate': True,
+        'extract_flat': 'in_playlist',
+        'skip_download': True,
+        **(proxy_opts or {})
+    }
+    with pooled_ydl(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    entries = []
+    default_author = info.get('uploader') or info.get('channel')
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        entry_url = _entry_url(entry)
+        if not entry_url:
+            continue
+        if entry.get('_type') == 'playlist' or (
+                entry.get('ie_key') == 'YoutubeTab' and is_collection_url(entry_url)):
+            # 频道的标签页，再展开一层
+            if depth + 1 < MAX_EXPAND_DEPTH:
+                entries.extend(expand_collection(entry_url, proxy_opts, depth + 1))
+            continue
+        entries.append({
+            'url': entry_url,
+            'title': entry.get('title'),
+            'author': entry.get('uploader') or entry.get('channel') or default_author,
+        })
+    return entries
+
+
+class BulkIntake:
+    """批量解析视频链接
+
+    resolve(url) 返回包含 title、author 的视频信息字典，会在工作线程中调用。
+    每解析出一个视频调用 on_item(info)，失败时调用 on_error(url, 错误信息)，
+    on_progress(已完成数, 已知总数) 报告进度。
+    skip(url) 返回 True 的视频（例如已经下载过的）不解析也不添加，改为调用 on_skip(url)。
+    """
+
+    def __init__(self, resolve, max_workers=DEFAULT_WORKERS, proxy_opts=None, skip=None):
+        self.resolve = resolve
+        self.skip = skip
+        self.max_workers = max_workers
+        self.proxy_opts = proxy_opts or {}
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """停止提交新的解析任务"""
+        self._cancelled.set()
+
+    def run(self, urls, on_item, on_error=None, on_progress=None, on_skip=None):
+        """解析所有链接，返回成功添加的视频数"""
+        seen = set()
+        lock = threading.Lock()
+        state = {"done": 0, "total": 0, "added": 0}
+
+        def progress(done=0, total=0):
+            with lock:
+                state["done"] += done
+                state["total"] += total
+                counts = (state["done"], state["total"])
+            if on_progress:
+                on_progress(*counts)
+
+        def claim(url):
+            """同一视频只添加一次，跳过的视频不添加"""
+            key = cache_key(url)
+            with lock:
+                if key in seen:
+                    return False
+                seen.add(key)
+            if self.skip is not None and self.skip(url):
+                if on_skip:
+                    on_skip(url)
+                return False
+            return True
+
+        def emit(info):
+            with lock:
+                state["added"] += 1
+            on_item(info)
+
+        def fail(url, error):
+            if on_error:
+                on_error(url, str(error))
+
+        def resolve(url):
+            try:
+                info = self.resolve(url)
+                info.setdefault('url', url)
+                emit(info)
+            except Exception as e:
+                fail(url, e)
+            finally:
+                progress(done=1)
+
+        def expand(url):
+            try:
+                entries = expand_collection(url, self.proxy_opts)
+            except Exception as e:
+                fail(url, e)
+                return []
+            finally:
+                progress(done=1)
+            return entries
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bulk-intake") as executor:
+            collections = [url for url in urls if is_collection_url(url)]
+            videos = [url for url in urls if not is_collection_url(url)]
+            progress(total=len(urls))
+
+            futures = []
+            expansions = [executor.submit(expand, url) for url in collections]
+            for url in videos:
+                if self._cancelled.is_set():
+                    break
+                if claim(url):
+                    futures.append(executor.submit(resolve, url))
+                else:
+                    progress(done=1)
+
+            # 播放列表展开后，平铺信息完整的条目直接添加，其余的再并发获取
+            for expansion in as_completed(expansions):
+                entries = expansion.result()
+                progress(total=len(entries))
+                for entry in entries:
+                    if self._cancelled.is_set():
+                        break
+                    if not claim(entry['url']):
+                        progress(done=1)
+                    elif entry.get('title'):
+                        emit(entry)
+                        progress(done=1)
+                    else:
+                        futures.append(executor.submit(resolve, entry['url']))
+
+            if self._cancelled.is_set():
+                for future in futures:
+                    future.cancel()
+
+        return state["added"]
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+外部工具检测
+检测 ffmpeg、ffprobe、aria2c 和 yt-dlp（含版本号），结果缓存到磁盘；
+PATH、PATH 中各目录、Python 包目录和工具文件本身都没有变化时直接使用缓存，
+启动时不再逐个搜索 PATH、导入 yt-dlp 或运行 `ffmpeg -version`
+"""
+
+import importlib.util
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+# 缓存文件
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~/.downtube"), "capabilities.json")
+
+# 检测的命令行工具
+TOOLS = ('ffmpeg', 'ffprobe', 'aria2c')
+
+# 缓存格式版本，检测内容变化时递增
+CACHE_VERSION = 1
+
+_VERSION_RE = re.compile(r"""__version__\s*=\s*['"]([^'"]+)['"]""")
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _search_dirs():
+    """可执行文件和 Python 包的搜索目录（安装或删除工具时这些目录的修改时间会变）"""
+    dirs = [d for d in os.environ.get('PATH', '').split(os.pathsep) if d]
+    # sys.path[0] 是启动脚本所在目录，不同入口不同，不参与比较
+    dirs.extend(p for p in sys.path[1:] if p and os.path.isdir(p))
+    return dirs
+
+
+def _fingerprint(found):
+    """缓存键：PATH、Python 解释器、各搜索目录和已找到的工具文件的修改时间"""
+    return {
+        'version': CACHE_VERSION,
+        'path': os.environ.get('PATH', ''),
+        'python': sys.executable,
+        'dirs': [[d, _mtime(d)] for d in _search_dirs()],
+        'files': [[p, _mtime(p)] for p in sorted(p for p in found if p)],
+    }
+
+
+def _ytdlp_location():
+    """返回 yt_dlp 包所在目录，未安装时返回 None（不导入 yt_dlp）"""
+    spec = importlib.util.find_spec('yt_dlp')
+    if spec is None:
+        return None
+    if spec.submodule_search_locations:
+        return list(spec.submodule_search_locations)[0]
+    return os.path.dirname(spec.origin) if spec.origin else None
+
+
+def _ytdlp_version(location):
+    """从 yt_dlp/version.py 读取版本号"""
+    try:
+        with open(os.path.join(location, 'version.py'), 'r', encoding='utf-8') as f:
+            match = _VERSION_RE.search(f.read())
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+
+class Capabilities:
+    """一次检测的结果"""
+
+    def __init__(self, tools, ytdlp_path=None, ytdlp_version=None, detected_at=None, cached=False):
+        self.tools = tools                  # 工具名 -> 可执行文件路径（None 表示未安装）
+        self.ytdlp_path = ytdlp_path        # yt_dlp 包目录
+        self.ytdlp_version = ytdlp_version
+        self.detected_at = detected_at or time.time()
+        self.cached = cached                # 是否来自磁盘缓存
+
+    def has(self, name):
+        """工具是否可用，name 为 TOOLS 中的工具名或 'yt_dlp'"""
+        if name == 'yt_dlp':
+            return self.ytdlp_path is not None
+        return self.tools.get(name) is not None
+
+    def path(self, name):
+        return self.ytdlp_path if name == 'yt_dlp' else self.tools.get(name)
+
+    @property
+    def ffmpeg(self):
+        return self.has('ffmpeg')
+
+    @property
+    def ytdlp(self):
+        return self.has('yt_dlp')
+
+    def to_dict(self):
+        return {
+            'tools': self.tools,
+            'ytdlp_path': self.ytdlp_path,
+            'ytdlp_version': self.ytdlp_version,
+            'detected_at': self.detected_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(dict(data['tools']), data.get('ytdlp_path'), data.get('ytdlp_version'),
+                   data.get('detected_at'), cached=True)
+
+
+def detect():
+    """重新检测所有工具（不读写缓存）"""
+    tools = {name: shutil.which(name) for name in TOOLS}
+    location = _ytdlp_location()
+    version = _ytdlp_version(location) if location else None
+    return Capabilities(tools, location, version)
+
+
+class CapabilityCache:
+    """磁盘上的检测结果缓存"""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        self.path = path
+
+    def load(self):
+        """缓存键仍然匹配时返回缓存的结果，否则返回 None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            capabilities = Capabilities.from_dict(data['result'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        found = list(capabilities.tools.values()) + [capabilities.ytdlp_path]
+        if data.get('key') != _fingerprint(found):
+            return None
+        return capabilities
+
+    def save(self, capabilities):
+        found = list(capabilities.tools.values()) + [capabilities.ytdlp_path]
+        data = {'key': _fingerprint(found), 'result': capabilities.to_dict()}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # 缓存写入失败不影响使用
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_capabilities = None
+_capabilities_lock = threading.Lock()
+
+
+def get_capabilities(refresh=False):
+    """返回进程内共享的检测结果；refresh 为 True 时重新检测（例如安装工具之后）"""
+    global _capabilities
+    with _capabilities_lock:
+        if _capabilities is None or refresh:
+            cache = CapabilityCache()
+            capabilities = None if refresh else cache.load()
+            if capabilities is None:
+                capabilities = detect()
+                cache.save(capabilities)
+            _capabilities = capabilities
+        return _capabilities
@@ -5,44 +5,30 @@ import ssl
 import time
 import urllib.request
 import socket
-import http.client
 import json
 import argparse
-from pytubefix import YouTube, exceptions
+
+from bandwidth import get_limiter, parse_rate
+from download_archive import get_archive
+from info_cache import get_info_cache
+from proxy_session import ProxyConfig, set_default_route
+from resumable import download_stream
+from retry import EXTRACTOR, RetryPolicy, RetryState
+from tls_cache import client_context, compatible_context, get_session_cache, prewarm
+from youtube_cache import forget_youtube, get_youtube, is_expired_error
 
 # 默认下载路径
 DEFAULT_DOWNLOAD_PATH = os.path.expanduser("~/Downloads")
 
 # 配置超时时间（单位：秒）
 socket.setdefaulttimeout(15)  # 设置默认Socket超时（减少等待时间）
-http.client.HTTPConnection._http_vsn = 10  # 使用HTTP/1.0而非HTTP/1.1
-http.client.HTTPConnection._http_vsn_str = 'HTTP/1.0'
-
-# 创建一个默认的SSL上下文
-ssl_context = ssl.create_default_context()
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
-ssl_context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1  # 仅使用TLS 1.2+
+# urllib 的请求（pytubefix、断点续传）通过 http_pool 使用 HTTP/1.1 长连接，由 set_default_route 安装
 
-# 尝试不同的SSL配置
-try:
-    # 设置更宽松的SSL选项
-    ssl_context.options &= ~ssl.OP_NO_TLSv1
-    ssl_context.options &= ~ssl.OP_NO_TLSv1_1
-    # 尝试使用更兼容的密码套件配置
-    try:
-        # 尝试设置更宽松的密码套件
-        ssl_context.set_ciphers('HIGH:!aNULL:!eNULL:!EXPORT:!DES:!RC4:!MD5:!PSK')
-    except ssl.SSLError:
-        # 如果失败，不设置特定的密码套件
-        pass
-except AttributeError:
-    # 某些旧版本Python可能不支持这些选项
-    pass
+# 进程内共用的SSL上下文（不校验证书，TLS 1.2+），TLS 会话按主机缓存，新连接恢复会话
+ssl_context = client_context()
 
 # 重写urllib的opener，使用我们的SSL上下文
-opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-urllib.request.install_opener(opener)
+set_default_route(ssl_context=ssl_context)
 
 # 代理支持
 USE_PROXY = False
@@ -50,66 +36,29 @@ PROXY_URL = None
 PROXY_TYPE = "http"  # "http" 或 "socks5"
 
 def set_proxy(url=None, proxy_type="http"):
-    """设置HTTP/HTTPS或SOCKS5代理"""
+    """设置HTTP/HTTPS或SOCKS5代理（只替换 urllib 的默认线路，不修改全局 socket）"""
     global USE_PROXY, PROXY_URL, PROXY_TYPE
     
     if url:
-        if proxy_type == "http":
-            proxy_handler = urllib.request.ProxyHandler({
-                'http': url,
-                'https': url
-            })
-            opener = urllib.request.build_opener(
-                proxy_handler,
-                urllib.request.HTTPSHandler(context=ssl_context)
-            )
-        elif proxy_type == "socks5":
-            try:
-                import socks
-                # 解析主机名和端口
-                if ":" in url:
-                    host, port = url.split(":")
-                    port = int(port)
-                else:
-                    host = url
-                    port = 1080  # 默认SOCKS5端口
-                    
-                # 设置默认的SOCKS5代理
-                socks.set_default_proxy(socks.PROXY_TYPE_SOCKS5, host, port)
-                socket.socket = socks.socksocket
-                
-                # 为urllib建立opener
-                opener = urllib.request.build_opener(
-                    urllib.request.HTTPSHandler(context=ssl_context)
-                )
-            except ImportError:
-                raise ImportError("使用SOCKS5代理需要安装PySocks库: pip install PySocks")
-        else:
-            raise ValueError(f"不支持的代理类型: {proxy_type}, 支持的类型有: http, socks5")
-            
-        urllib.request.install_opener(opener)
+        proxy = ProxyConfig.parse(url, proxy_type)
+        set_default_route(proxy, ssl_context)
         USE_PROXY = True
         PROXY_URL = url
-        PROXY_TYPE = proxy_type
+        PROXY_TYPE = proxy.proxy_type
         print(f"已设置{proxy_type}代理: {url}")
     else:
-        # 如果之前设置了SOCKS5代理，需要恢复默认socket
-        if PROXY_TYPE == "socks5" and USE_PROXY:
-            try:
-                # 恢复默认socket
-                socket.socket = socket._socketobject
-            except:
-                # 如果失败，尝试其他方法恢复
-                import socket as socket_module
-                socket.socket = socket_module.socket
-            
         # 重置为无代理状态
-        opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-        urllib.request.install_opener(opener)
+        set_default_route(ssl_context=ssl_context)
         USE_PROXY = False
         PROXY_URL = None
         print("已清除代理设置")
 
+def current_proxy():
+    """返回当前设置的代理线路，未设置时返回 None"""
+    if USE_PROXY and PROXY_URL:
+        return ProxyConfig.parse(PROXY_URL, PROXY_TYPE)
+    return None
+
 def set_clash_verge_proxy():
     """设置 Clash Verge 代理"""
     proxy_url = "127.0.0.1:7897"
@@ -125,32 +74,35 @@ def progress_callback(stream, chunk, bytes_remaining):
     sys.stdout.write(f"\r下载进度: {percentage}%")
     sys.stdout.flush()
 
-def download_video(url, resolution="720p", download_path=DEFAULT_DOWNLOAD_PATH, max_retries=5):
-    """下载视频"""
-    retry_count = 0
-    retry_delay = 3
+def download_video(url, resolution="720p", download_path=DEFAULT_DOWNLOAD_PATH, max_retries=5, force=False):
+    """下载视频（force 为 True 时忽略下载存档）"""
+    from download_engine import archive_format
+    
+    # 下载存档中已有的视频不再提取信息和下载
+    fmt = archive_format(resolution)
+    entry = None if force else get_archive().find(url, fmt)
+    if entry is not None:
+        print(f"已下载过，跳过: {entry.path} (使用 --force 重新下载)")
+        return True
+    
+    # pytubefix 只在真正下载时导入
+    from pytubefix import exceptions
+    
+    # 按错误类型重试：网络错误指数退避后续传，提取失败重新获取信息，视频不可用时不再重试
+    retry = RetryState(RetryPolicy(max_attempts=max_retries))
     last_error = None
     
     print(f"正在下载: {url}")
     print(f"分辨率: {resolution}")
     print(f"保存到: {download_path}")
     
-    while retry_count < max_retries:
+    while True:
         try:
-            # 每次重试前重新设置代理，确保代理连接是新的
-            if USE_PROXY and PROXY_URL:
-                set_proxy(PROXY_URL, PROXY_TYPE)
-            
-            # 创建 YouTube 对象
-            yt = YouTube(
+            # 同一视频的 YouTube 对象（播放器信息和流清单）在重试之间复用，重试只重新传输
+            yt = get_youtube(
                 url,
                 use_oauth=True,
-                allow_oauth_cache=True,
-                on_progress_callback=progress_callback,
-                proxies=None if not USE_PROXY else {
-                    'http': PROXY_URL if PROXY_TYPE == 'http' else None,
-                    'https': PROXY_URL if PROXY_TYPE == 'http' else None
-                }
+                allow_oauth_cache=True
             )
             
             print(f"视频标题: {yt.title}")
@@ -172,51 +124,43 @@ def download_video(url, resolution="720p", download_path=DEFAULT_DOWNLOAD_PATH,
                 print(f"无法找到可用的视频流")
                 return False
             
-            # 下载视频
-            file_path = stream.download(output_path=download_path)
+            # 下载视频（支持断点续传，重试时从中断处继续）
+            file_path = download_stream(stream, download_path, on_progress=progress_callback)
             print(f"\n下载完成: {file_path}")
+            get_archive().record(url, fmt, file_path, title=yt.title)
             return True
             
         except (ssl.SSLError, urllib.error.URLError, ConnectionError, TimeoutError) as e:
-            retry_count += 1
+            delay = retry.next_delay(e)
             last_error = e
             
+            if is_expired_error(e):
+                # 流地址已失效，下次重试重新获取播放器信息
+                forget_youtube(url)
+            
             # 对于SSL错误，尝试更改SSL上下文
             if isinstance(e, ssl.SSLError) or (isinstance(e, urllib.error.URLError) and "EOF occurred in violation of protocol" in str(e)):
-                # 尝试重置SSL上下文
+                # 改用兼容性更好的SSL上下文（同样进程内共用，之后的连接仍然恢复缓存的会话）
                 global ssl_context
-                try:
-                    # 创建新的SSL上下文，尝试不同的设置
-                    new_context = ssl.create_default_context()
-                    new_context.check_hostname = False
-                    new_context.verify_mode = ssl.CERT_NONE
-                    # 尝试允许所有TLS版本
-                    new_context.options = 0
-                    ssl_context = new_context
-                    
-                    # 重新创建opener
-                    opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-                    urllib.request.install_opener(opener)
-                    
-                    # 如果使用代理，重新应用代理
-                    if USE_PROXY and PROXY_URL:
-                        set_proxy(PROXY_URL, PROXY_TYPE)
-                except Exception:
-                    pass
+                if ssl_context is not compatible_context():
+                    ssl_context = compatible_context()
+                    set_default_route(current_proxy(), ssl_context)
             
-            if retry_count < max_retries:
-                print(f"\n遇到错误，正在重试 ({retry_count}/{max_retries}): {str(e)}")
-                time.sleep(retry_delay * retry_count)  # 指数退避
+            if delay is not None:
+                # 已下载的部分保留在 .part 文件中，重试时从中断处继续
+                print(f"\n遇到错误，{delay:.1f} 秒后重试 (第 {retry.attempts} 次): {str(e)}")
+                time.sleep(delay)
                 continue
             
             if isinstance(e, ssl.SSLError):
-                print(f"\nSSL错误 (尝试 {retry_count}/{max_retries}): {str(e)}")
+                print(f"\nSSL错误 (尝试 {retry.attempts} 次): {str(e)}")
             elif isinstance(e, urllib.error.URLError):
-                print(f"\n网络错误 (尝试 {retry_count}/{max_retries}): {str(e)}")
+                print(f"\n网络错误 (尝试 {retry.attempts} 次): {str(e)}")
             elif isinstance(e, ConnectionError):
-                print(f"\n连接错误 (尝试 {retry_count}/{max_retries}): {str(e)}")
+                print(f"\n连接错误 (尝试 {retry.attempts} 次): {str(e)}")
             else:
-                print(f"\n超时错误 (尝试 {retry_count}/{max_retries}): 连接超时")
+                print(f"\n超时错误 (尝试 {retry.attempts} 次): 连接超时")
+            break
                 
         except exceptions.RegexMatchError:
             print("\n无效的YouTube链接")
@@ -227,11 +171,14 @@ def download_video(url, resolution="720p", download_path=DEFAULT_DOWNLOAD_PATH,
             return False
             
         except Exception as e:
-            retry_count += 1
+            delay = retry.next_delay(e)
             last_error = e
-            if retry_count < max_retries:
-                print(f"\n遇到错误，正在重试 ({retry_count}/{max_retries}): {str(e)}")
-                time.sleep(retry_delay)
+            if retry.last_kind == EXTRACTOR:
+                # 提取失败，下次重试重新获取播放器信息
+                forget_youtube(url)
+            if delay is not None:
+                print(f"\n遇到错误，{delay:.1f} 秒后重试 (第 {retry.attempts} 次): {str(e)}")
+                time.sleep(delay)
                 continue
             print(f"\n下载错误: {str(e)}")
             return False
@@ -239,7 +186,7 @@ def download_video(url, resolution="720p", download_path=DEFAULT_DOWNLOAD_PATH,
     # 如果所有重试都失败
     if last_error:
         error_type = type(last_error).__name__
-        print(f"\n在 {max_retries} 次尝试后仍然失败 ({error_type}): {str(last_error)}")
+        print(f"\n在 {retry.attempts} 次尝试后仍然失败 ({error_type}): {str(last_error)}")
         
         # 提供更多具体的解决建议
         if "EOF occurred in violation of protocol" in str(last_error):
@@ -256,27 +203,32 @@ def download_video(url, resolution="720p", download_path=DEFAULT_DOWNLOAD_PATH,
 
 def list_available_resolutions(url, max_retries=5):
     """列出可用的分辨率"""
-    retry_count = 0
-    retry_delay = 3
+    from pytubefix import exceptions
+    
+    retry = RetryState(RetryPolicy(max_attempts=max_retries))
     last_error = None
     
     print(f"正在获取视频信息: {url}")
     
-    while retry_count < max_retries:
+    # 分辨率列表不含流地址，按默认时间缓存
+    info_cache = get_info_cache()
+    cached = info_cache.get(url, namespace="pytubefix")
+    if cached:
+        print(f"视频标题: {cached['title']}")
+        print(f"作者: {cached['author']}")
+        print("\n可用分辨率:")
+        for res in cached['resolutions']:
+            print(f"- {res}")
+        print("- audio (仅音频)")
+        return cached['resolutions']
+    
+    while True:
         try:
-            # 每次重试前重新设置代理，确保代理连接是新的
-            if USE_PROXY and PROXY_URL:
-                set_proxy(PROXY_URL, PROXY_TYPE)
-            
-            # 创建 YouTube 对象
-            yt = YouTube(
+            # 与下载共用缓存的 YouTube 对象，列出分辨率后下载不再重复握手
+            yt = get_youtube(
                 url,
                 use_oauth=True,
-                allow_oauth_cache=True,
-                proxies=None if not USE_PROXY else {
-                    'http': PROXY_URL if PROXY_TYPE == 'http' else None,
-                    'https': PROXY_URL if PROXY_TYPE == 'http' else None
-                }
+                allow_oauth_cache=True
             )
             
             print(f"视频标题: {yt.title}")
@@ -305,48 +257,44 @@ def list_available_resolutions(url, max_retries=5):
                 print(f"- {res}")
             print("- audio (仅音频)")
             
+            info_cache.put(url, {
+                'title': yt.title,
+                'author': yt.author,
+                'resolutions': resolutions
+            }, namespace="pytubefix")
+            
             return resolutions
             
         except (ssl.SSLError, urllib.error.URLError, ConnectionError, TimeoutError) as e:
-            retry_count += 1
+            delay = retry.next_delay(e)
             last_error = e
             
+            if is_expired_error(e):
+                # 流地址已失效，下次重试重新获取播放器信息
+                forget_youtube(url)
+            
             # 对于SSL错误，尝试更改SSL上下文
             if isinstance(e, ssl.SSLError) or (isinstance(e, urllib.error.URLError) and "EOF occurred in violation of protocol" in str(e)):
-                # 尝试重置SSL上下文
+                # 改用兼容性更好的SSL上下文（同样进程内共用，之后的连接仍然恢复缓存的会话）
                 global ssl_context
-                try:
-                    # 创建新的SSL上下文，尝试不同的设置
-                    new_context = ssl.create_default_context()
-                    new_context.check_hostname = False
-                    new_context.verify_mode = ssl.CERT_NONE
-                    # 尝试允许所有TLS版本
-                    new_context.options = 0
-                    ssl_context = new_context
-                    
-                    # 重新创建opener
-                    opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-                    urllib.request.install_opener(opener)
-                    
-                    # 如果使用代理，重新应用代理
-                    if USE_PROXY and PROXY_URL:
-                        set_proxy(PROXY_URL, PROXY_TYPE)
-                except Exception:
-                    pass
+                if ssl_context is not compatible_context():
+                    ssl_context = compatible_context()
+                    set_default_route(current_proxy(), ssl_context)
             
-            if retry_count < max_retries:
-                print(f"遇到错误，正在重试 ({retry_count}/{max_retries}): {str(e)}")
-                time.sleep(retry_delay * retry_count)  # 指数退避
+            if delay is not None:
+                print(f"遇到错误，{delay:.1f} 秒后重试 (第 {retry.attempts} 次): {str(e)}")
+                time.sleep(delay)
                 continue
             
             if isinstance(e, ssl.SSLError):
-                print(f"SSL连接错误 (尝试 {retry_count}/{max_retries}): {str(e)}")
+                print(f"SSL连接错误 (尝试 {retry.attempts} 次): {str(e)}")
             elif isinstance(e, urllib.error.URLError):
-                print(f"网络连接错误 (尝试 {retry_count}/{max_retries}): {str(e)}")
+                print(f"网络连接错误 (尝试 {retry.attempts} 次): {str(e)}")
             elif isinstance(e, ConnectionError):
-                print(f"连接错误 (尝试 {retry_count}/{max_retries}): {str(e)}")
+                print(f"连接错误 (尝试 {retry.attempts} 次): {str(e)}")
             else:
-                print(f"连接超时 (尝试 {retry_count}/{max_retries})")
+                print(f"连接超时 (尝试 {retry.attempts} 次)")
+            break
                 
         except exceptions.RegexMatchError:
             print("无效的YouTube链接")
@@ -357,11 +305,14 @@ def list_available_resolutions(url, max_retries=5):
             return []
             
         except Exception as e:
-            retry_count += 1
+            delay = retry.next_delay(e)
             last_error = e
-            if retry_count < max_retries:
-                print(f"遇到错误，正在重试 ({retry_count}/{max_retries}): {str(e)}")
-                time.sleep(retry_delay)
+            if retry.last_kind == EXTRACTOR:
+                # 提取失败，下次重试重新获取播放器信息
+                forget_youtube(url)
+            if delay is not None:
+                print(f"遇到错误，{delay:.1f} 秒后重试 (第 {retry.attempts} 次): {str(e)}")
+                time.sleep(delay)
                 continue
             print(f"获取视频信息错误: {str(e)}")
             return []
@@ -369,7 +320,7 @@ def list_available_resolutions(url, max_retries=5):
     # 如果所有重试都失败
     if last_error:
         error_type = type(last_error).__name__
-        print(f"在 {max_retries} 次尝试后仍然失败 ({error_type}): {str(last_error)}")
+        print(f"在 {retry.attempts} 次尝试后仍然失败 ({error_type}): {str(last_error)}")
         
         # 提供更多具体的解决建议
         if "EOF occurred in violation of protocol" in str(last_error):
@@ -393,20 +344,29 @@ def main():
     parser.add_argument('-t', '--proxy-type', default='http', choices=['http', 'socks5'], help='代理类型 (默认: http)')
     parser.add_argument('-c', '--clash-verge', action='store_true', help='使用 Clash Verge 代理 (127.0.0.1:7897)')
     parser.add_argument('-l', '--list', action='store_true', help='仅列出可用分辨率，不下载')
+    parser.add_argument('--limit-rate', type=parse_rate, default=0, help='总下载限速，例如 500K、2M (默认不限速)')
+    parser.add_argument('--force', action='store_true', help='忽略下载存档，重新下载已下载过的视频')
     
     args = parser.parse_args()
     
+    # 全局限速
+    get_limiter().set_rate(args.limit_rate)
+    
     # 设置代理
     if args.clash_verge:
         set_clash_verge_proxy()
     elif args.proxy:
         set_proxy(args.proxy, args.proxy_type)
     
+    # 获取视频信息的同时，在后台与最常连接的主机预先握手
+    prewarm()
+    
     # 列出可用分辨率或下载视频
     if args.list:
         list_available_resolutions(args.url)
     else:
-        download_video(args.url, args.resolution, args.output)
+        download_video(args.url, args.resolution, args.output, force=args.force)
+    get_session_cache().save_hosts()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
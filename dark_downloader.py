@@ -14,22 +14,13 @@ import subprocess
 import re
 from datetime import datetime
 
-# 检查 yt-dlp 是否已安装
-try:
-    import yt_dlp
-    YTDLP_AVAILABLE = True
-except ImportError:
-    YTDLP_AVAILABLE = False
+from bandwidth import get_limiter, parse_rate
+from capabilities import get_capabilities
+from download_engine import DownloadRequest, get_engine
 
-# 检查 ffmpeg 是否已安装
-def check_ffmpeg():
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        return False
-
-FFMPEG_AVAILABLE = check_ffmpeg()
+# 检查 yt-dlp 和 ffmpeg 是否已安装（使用缓存的检测结果，yt-dlp 在下载时才导入）
+YTDLP_AVAILABLE = get_capabilities().ytdlp
+FFMPEG_AVAILABLE = get_capabilities().ffmpeg
 
 # ANSI 颜色代码
 class Colors:
@@ -164,26 +155,16 @@ def list_formats(url, proxy=None):
         print(f"{Colors.RED}请先安装 yt-dlp{Colors.ENDC}")
         return False
     
-    ydl_opts = {
-        'listformats': True,
-        'quiet': False,
-        'no_warnings': True
-    }
-    
-    if proxy:
-        ydl_opts['proxy'] = proxy
-    
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            print(f"{Colors.CYAN}正在获取视频格式信息...{Colors.ENDC}")
-            ydl.extract_info(url, download=False)
+        print(f"{Colors.CYAN}正在获取视频格式信息...{Colors.ENDC}")
+        get_engine().list_formats(url, proxy)
         return True
     except Exception as e:
         print(f"{Colors.RED}获取视频格式失败: {str(e)}{Colors.ENDC}")
         return False
 
 # 下载视频
-def download_video(url, resolution=None, output_path=None, proxy=None):
+def download_video(url, resolution=None, output_path=None, proxy=None, force=False):
     if not YTDLP_AVAILABLE:
         print(f"{Colors.RED}请先安装 yt-dlp{Colors.ENDC}")
         return False
@@ -191,55 +172,29 @@ def download_video(url, resolution=None, output_path=None, proxy=None):
     if not output_path:
         output_path = os.path.expanduser("~/Downloads")
     
-    if not os.path.exists(output_path):
-        try:
-            os.makedirs(output_path)
-        except Exception as e:
-            print(f"{Colors.RED}创建下载目录失败: {str(e)}{Colors.ENDC}")
-            return False
-    
-    # 设置格式
-    format_spec = 'bestvideo[height<=1080]+bestaudio/best'
-    if resolution and resolution.isdigit():
-        height = int(resolution)
-        format_spec = f'bestvideo[height<={height}]+bestaudio/best[height<={height}]'
-    
-    # 如果 ffmpeg 不可用，使用单一格式
     if not FFMPEG_AVAILABLE:
-        if resolution and resolution.isdigit():
-            format_spec = f'best[height<={resolution}]/best'
-        else:
-            format_spec = 'best'
         print(f"{Colors.YELLOW}警告: 未安装 ffmpeg，将下载单一格式视频。质量可能不是最佳。{Colors.ENDC}")
     
-    # 设置输出模板
-    output_template = os.path.join(output_path, '%(title)s.%(ext)s')
+    # 默认最高 1080p
+    request = DownloadRequest(
+        url,
+        resolution=resolution if resolution and resolution.isdigit() else "1080",
+        output_path=output_path,
+        proxy=proxy,
+        ffmpeg=FFMPEG_AVAILABLE,
+        skip_archived=not force,
+        extra_opts={
+            'quiet': False,
+            'no_warnings': True,
+            'color': 'always',
+        }
+    )
     
-    # 设置 yt-dlp 选项 - 优化下载速度
-    ydl_opts = {
-        'format': format_spec,
-        'outtmpl': output_template,
-        'progress_hooks': [progress_hook],
-        'no_check_certificate': True,
-        'quiet': False,
-        'no_warnings': True,
-        'color': 'always',
-        # 优化下载速度的参数
-        'concurrent_fragments': 5,  # 并发下载片段数，提高到5个
-        'retries': 10,              # 重试次数增加到10次
-        'fragment_retries': 10,     # 片段重试次数
-        'buffersize': 1024*1024*16, # 增加缓冲区到16MB
-        'http_chunk_size': 10485760, # 10MB的块大小，提高吞吐量
-        'socket_timeout': 30,       # 增加超时时间
-        'extractor_retries': 5,     # 提取器重试次数
-        'file_access_retries': 5,   # 文件访问重试
-        'postprocessor_args': {     # FFmpeg后处理参数
-            'ffmpeg': ['-threads', '4']  # 使用4个线程进行处理
-        },
-    }
-    
-    if proxy:
-        ydl_opts['proxy'] = proxy
+    # 下载存档中已有的视频不再提取信息和下载
+    entry = get_engine().archived(request)
+    if entry is not None:
+        print(f"{Colors.GREEN}已下载过，跳过: {entry.path} (使用 --force 重新下载){Colors.ENDC}")
+        return True
     
     try:
         print(f"{Colors.CYAN}正在下载视频: {url}{Colors.ENDC}")
@@ -248,10 +203,9 @@ def download_video(url, resolution=None, output_path=None, proxy=None):
         if proxy:
             print(f"{Colors.CYAN}使用代理: {proxy}{Colors.ENDC}")
         
-        print(f"{Colors.YELLOW}已启用多线程下载优化 (并发片段: 5){Colors.ENDC}")
+        print(f"{Colors.YELLOW}已启用多线程下载优化 (并发片段自动调优){Colors.ENDC}")
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        get_engine().run(request, on_progress=progress_hook)
         
         print(f"{Colors.GREEN}下载完成！{Colors.ENDC}")
         return True
@@ -278,9 +232,14 @@ def main():
     parser.add_argument("-l", "--list-formats", action="store_true", help="列出可用格式而不下载")
     parser.add_argument("-i", "--install", action="store_true", help="安装 yt-dlp")
     parser.add_argument("-f", "--install-ffmpeg", action="store_true", help="安装 ffmpeg")
+    parser.add_argument("--limit-rate", type=parse_rate, default=0, help="总下载限速，例如 500K、2M (默认不限速)")
+    parser.add_argument("--force", action="store_true", help="忽略下载存档，重新下载已下载过的视频")
     
     args = parser.parse_args()
     
+    # 全局限速
+    get_limiter().set_rate(args.limit_rate)
+    
     # 安装 yt-dlp
     if args.install:
         install_ytdlp()
@@ -298,11 +257,9 @@ def main():
             print(f"{Colors.RED}请手动安装 yt-dlp: pip install yt-dlp{Colors.ENDC}")
             return
         
-        # 重新导入 yt-dlp
-        try:
-            import yt_dlp
-            YTDLP_AVAILABLE = True
-        except ImportError:
+        # 重新检测 yt-dlp
+        YTDLP_AVAILABLE = get_capabilities(refresh=True).ytdlp
+        if not YTDLP_AVAILABLE:
             print(f"{Colors.RED}安装 yt-dlp 失败，请手动安装{Colors.ENDC}")
             return
     
@@ -329,7 +286,7 @@ def main():
     if args.list_formats:
         list_formats(args.url, proxy)
     else:
-        download_video(args.url, resolution, output_path, proxy)
+        download_video(args.url, resolution, output_path, proxy, force=args.force)
 
 if __name__ == "__main__":
     try:
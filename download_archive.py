@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载存档
+记录已经下载完成的视频（视频ID、格式、文件路径、大小、摘要），所有入口在提取视频信息之前查询，
+已下载过且文件仍然存在的视频直接跳过。记录保存在 SQLite 中，启动时载入内存，查询不访问数据库；
+存档丢失时可以从已有的下载目录重建
+
+    python download_archive.py --rebuild ~/Downloads    # 从下载目录重建
+    python download_archive.py --list                   # 列出存档记录
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from urls import cache_key
+
+# 默认数据库位置
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~/.downtube"), "archive.db")
+
+# 格式未知（从目录重建的记录），可以满足任何格式的请求
+ANY_FORMAT = "*"
+
+# 计算快速摘要时读取的文件头尾大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 重建时识别的文件名中的视频ID：yt-dlp 默认模板 "标题 [ID].扩展名"
+_FILENAME_ID_RE = re.compile(r'\[([A-Za-z0-9_-]{11})\]')
+
+# 重建时忽略的文件（字幕、未完成的下载等）
+_SKIP_EXTENSIONS = ('.part', '.ytdl', '.tmp', '.srt', '.vtt', '.json', '.jpg', '.webp', '.png')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    video_id TEXT NOT NULL,
+    format TEXT NOT NULL,
+    path TEXT,
+    size INTEGER,
+    hash TEXT,
+    title TEXT,
+    completed_at REAL,
+    PRIMARY KEY (video_id, format)
+);
+"""
+
+
+def quick_hash(path, chunk_size=HASH_CHUNK_SIZE):
+    """文件大小加头尾各一块数据的 SHA-1，大文件也只读取两块"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        digest.update(f.read(chunk_size))
+        if size > chunk_size * 2:
+            f.seek(-chunk_size, os.SEEK_END)
+            digest.update(f.read(chunk_size))
+        elif size > chunk_size:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ArchiveEntry:
+    """一条存档记录"""
+
+    def __init__(self, video_id, format, path=None, size=None, hash=None, title=None, completed_at=None):
+        self.video_id = video_id
+        self.format = format
+        self.path = path
+        self.size = size
+        self.hash = hash
+        self.title = title
+        self.completed_at = completed_at
+
+    def exists(self):
+        """文件是否仍然存在且大小没有变化（没有路径的记录视为存在）"""
+        if not self.path:
+            return True
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        return self.size is None or size == self.size
+
+
+class DownloadArchive:
+    """下载存档
+
+    所有记录在内存中按 (视频ID, 格式) 索引，find() 不访问数据库；
+    视频ID 使用 urls.cache_key()，非 YouTube 链接按 URL 摘要记录。
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._entries = {}   # (视频ID, 格式) -> ArchiveEntry
+        self._formats = {}   # 视频ID -> 已下载的格式集合
+        for row in self._conn.execute("SELECT * FROM archive"):
+            self._index(ArchiveEntry(**dict(row)))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _index(self, entry):
+        self._entries[(entry.video_id, entry.format)] = entry
+        self._formats.setdefault(entry.video_id, set()).add(entry.format)
+
+    def _unindex(self, video_id, format):
+        self._entries.pop((video_id, format), None)
+        formats = self._formats.get(video_id)
+        if formats is not None:
+            formats.discard(format)
+            if not formats:
+                del self._formats[video_id]
+
+    def find(self, url, format=None):
+        """查找已下载的记录，没有或文件已不存在时返回 None
+
+        url 可以是链接或视频ID；format 为 None 时任何格式都算，
+        否则只匹配该格式和格式未知的记录。
+        """
+        video_id = cache_key(url)
+        with self._lock:
+            formats = self._formats.get(video_id)
+            if not formats:
+                return None
+            if format is None:
+                candidates = [self._entries[(video_id, f)] for f in formats]
+            else:
+                candidates = [self._entries[(video_id, f)] for f in (format, ANY_FORMAT) if f in formats]
+        for entry in candidates:
+            if entry.exists():
+                return entry
+        return None
+
+    def contains(self, url, format=None):
+        return self.find(url, format) is not None
+
+    def record(self, url, format, path, title=None):
+        """记录一次完成的下载，返回 ArchiveEntry
+
+        同一文件已经记录过（路径和大小都没变）时不重新计算摘要。
+        """
+        video_id = cache_key(url)
+        format = str(format or ANY_FORMAT)
+        size = hash = None
+        if path and os.path.isfile(path):
+            size = os.path.getsize(path)
+            with self._lock:
+                previous = self._entries.get((video_id, format))
+            if previous is not None and previous.path == path and previous.size == size and previous.hash:
+                return previous
+            hash = quick_hash(path)
+        entry = ArchiveEntry(video_id, format, path, size, hash, title, time.time())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO archive (video_id, format, path, size, hash, title, completed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry.video_id, entry.format, entry.path, entry.size, entry.hash, entry.title, entry.completed_at)
+            )
+            self._conn.commit()
+            self._index(entry)
+        return entry
+
+    def forget(self, url, format=None):
+        """删除记录（format 为 None 时删除该视频的所有记录）"""
+        video_id = cache_key(url)
+        with self._lock:
+            formats = [format] if format is not None else list(self._formats.get(video_id, ()))
+            for f in formats:
+                self._conn.execute("DELETE FROM archive WHERE video_id = ? AND format = ?", (video_id, f))
+                self._unindex(video_id, f)
+            self._conn.commit()
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def prune(self):
+        """删除文件已经不存在的记录，返回删除的数量"""
+        missing = [entry for entry in self.entries() if not entry.exists()]
+        with self._lock:
+            for entry in missing:
+                self._conn.execute("DELETE FROM archive WHERE video_id = ? AND format = ?",
+                                   (entry.video_id, entry.format))
+                self._unindex(entry.video_id, entry.format)
+            self._conn.commit()
+        return len(missing)
+
+    def import_jobs(self, jobs, format_of=None):
+        """从任务存储中已完成的任务导入记录，返回导入的数量
+
+        format_of(job) 返回任务对应的格式键，不提供时记为格式未知。
+        """
+        count = 0
+        for job in jobs:
+            path = job.get('file_path')
+            if not path or not os.path.isfile(path):
+                continue
+            format = format_of(job) if format_of else ANY_FORMAT
+            self.record(job['url'], format, path, title=job.get('title'))
+            count += 1
+        return count
+
+    def rebuild(self, directory, jobs=None, format_of=None):
+        """从下载目录重建存档，返回新增的记录数
+
+        文件名中带 [视频ID] 的文件直接识别；jobs 为任务存储中已完成的任务，
+        用于识别按标题命名的文件。已有的记录保留，文件已不存在的记录被删除。
+        """
+        self.prune()
+        by_path = {}
+        for job in jobs or []:
+            if job.get('file_path'):
+                by_path[os.path.abspath(job['file_path'])] = job
+
+        before = len(self)
+        for root, _dirs, files in os.walk(directory):
+            for name in files:
+                if name.startswith('.') or name.lower().endswith(_SKIP_EXTENSIONS):
+                    continue
+                path = os.path.abspath(os.path.join(root, name))
+                job = by_path.get(path)
+                if job is not None:
+                    format = format_of(job) if format_of else ANY_FORMAT
+                    self.record(job['url'], format, path, title=job.get('title'))
+                    continue
+                match = _FILENAME_ID_RE.search(name)
+                if match and not self.contains(match.group(1)):
+                    self.record(match.group(1), ANY_FORMAT, path,
+                                title=os.path.splitext(name)[0].replace(match.group(0), '').strip())
+        return len(self) - before
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """返回进程内共享的下载存档"""
+    global _default_archive
+    with _default_archive_lock:
+        if _default_archive is None:
+            _default_archive = DownloadArchive()
+        return _default_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载存档维护")
+    parser.add_argument("--rebuild", metavar="DIR", help="从下载目录重建存档")
+    parser.add_argument("--prune", action="store_true", help="删除文件已不存在的记录")
+    parser.add_argument("--list", action="store_true", help="列出存档记录")
+    args = parser.parse_args()
+
+    archive = get_archive()
+    if args.rebuild:
+        from job_store import JobStore, STATE_COMPLETED
+        from download_engine import archive_format
+
+        store = JobStore()
+        jobs = store.jobs(STATE_COMPLETED)
+        store.close()
+        added = archive.rebuild(os.path.expanduser(args.rebuild), jobs,
+                                lambda job: archive_format(job.get('resolution')))
+        print(f"已从 {args.rebuild} 重建存档，新增 {added} 条记录，共 {len(archive)} 条")
+    if args.prune:
+        print(f"已删除 {archive.prune()} 条失效记录")
+    if args.list:
+        for entry in sorted(archive.entries(), key=lambda e: e.completed_at or 0):
+            print(f"{entry.video_id}  {entry.format:<6}  {entry.path or '-'}")
+    if not (args.rebuild or args.prune or args.list):
+        print(f"存档共 {len(archive)} 条记录: {archive.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载引擎
+图形界面和各个命令行下载器共用的 yt-dlp 下载核心：格式选择、下载选项、视频信息缓存、
+实例池和参数调优都在这里，前端只负责提交任务、显示进度和结果
+"""
+
+import itertools
+import os
+import queue
+import sqlite3
+import threading
+
+from autotune import get_autotuner
+from bandwidth import current_limit, get_limiter
+from capabilities import get_capabilities
+from download_archive import ANY_FORMAT, get_archive
+from info_cache import get_info_cache
+from postprocess import ffmpeg_thread_args
+from scheduler import DownloadScheduler
+from ydl_pool import pooled_ydl
+
+# 默认下载路径
+DEFAULT_DOWNLOAD_PATH = os.path.expanduser("~/Downloads")
+
+# 默认文件名模板
+DEFAULT_OUTTMPL = '%(title)s.%(ext)s'
+
+# submit() 提交的任务同时运行的数量
+DEFAULT_MAX_CONCURRENT = 3
+
+# 所有下载共用的 yt-dlp 选项
+BASE_OPTS = {
+    'no_check_certificate': True,  # 避免SSL证书问题
+    'noplaylist': True,            # 只下载单个视频
+    'retries': 10,                 # 重试次数
+    'fragment_retries': 10,        # 片段重试次数
+    'socket_timeout': 30,          # 超时时间
+    'extractor_retries': 5,        # 提取器重试次数
+    'file_access_retries': 5,      # 文件访问重试
+}
+
+# 下载字幕时的选项
+SUBTITLE_OPTS = {
+    'writesubtitles': True,        # 下载字幕
+    'writeautomaticsub': True,     # 下载自动生成的字幕
+    'subtitleslangs': ['zh-CN', 'zh-TW', 'en'],  # 优先下载中文和英文字幕
+    'subtitlesformat': 'srt',      # 使用SRT格式字幕
+}
+
+# 提取视频信息时的选项
+EXTRACT_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'no_check_certificate': True,
+}
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+class DownloadCancelled(Exception):
+    """任务被取消"""
+
+
+def ffmpeg_available():
+    """系统中是否有 ffmpeg"""
+    return get_capabilities().ffmpeg
+
+
+def normalize_resolution(resolution):
+    """统一各前端的分辨率写法，返回 'best'、'audio' 或高度（int）"""
+    if resolution is None:
+        return 'best'
+    value = str(resolution).strip().lower()
+    if value in ('', 'best', '最高质量', '最佳'):
+        return 'best'
+    if value in ('audio', '仅音频'):
+        return 'audio'
+    value = value.rstrip('p')
+    if value.isdigit():
+        return int(value)
+    raise ValueError(f"无效的分辨率: {resolution}")
+
+
+def format_spec(resolution, ffmpeg=True):
+    """根据分辨率生成 yt-dlp 格式；没有 ffmpeg 时只选不需要合并的单一格式"""
+    resolution = normalize_resolution(resolution)
+    if resolution == 'audio':
+        return 'bestaudio/best' if ffmpeg else 'bestaudio[ext=m4a]/bestaudio/best'
+    if resolution == 'best':
+        return 'bestvideo+bestaudio/best' if ffmpeg else 'best'
+    if ffmpeg:
+        return f'bestvideo[height<={resolution}]+bestaudio/best[height<={resolution}]'
+    return f'best[height<={resolution}]/best'
+
+
+def archive_format(resolution=None, format_id=None):
+    """下载存档中使用的格式键：'best'、'audio'、高度，或 'id:' 加格式ID"""
+    if format_id:
+        return f"id:{format_id}"
+    try:
+        return str(normalize_resolution(resolution))
+    except ValueError:
+        return ANY_FORMAT
+
+
+class DownloadRequest:
+    """一次下载的参数
+
+    resolution 可以是 None/'best'/'最高质量'、'audio'/'仅音频'、'720' 或 '720p'；
+    format_id 指定时忽略 resolution。ffmpeg 为 None 时自动检测。
+    fallback_format 为第一次下载失败、重新提取信息后改用的格式。
+    rate_limit 为任务自己的速率上限（字节/秒），weight 为分配全局限速时的权重。
+    skip_archived 为 True 时，下载存档中已有的视频不再提取和下载，直接返回已有的文件。
+    extra_opts 是前端自己的显示类选项（quiet、color、logger 等），最后合并。
+    """
+
+    def __init__(self, url, resolution=None, output_path=None, proxy=None, format_id=None,
+                 outtmpl=None, subtitles=False, ffmpeg=None, external_downloader=False,
+                 fallback_format=None, rate_limit=None, weight=1.0, skip_archived=True, extra_opts=None):
+        self.url = url
+        self.resolution = resolution
+        self.output_path = output_path or DEFAULT_DOWNLOAD_PATH
+        self.proxy = proxy
+        self.format_id = format_id
+        self.outtmpl = outtmpl
+        self.subtitles = subtitles
+        self.ffmpeg = ffmpeg_available() if ffmpeg is None else ffmpeg
+        self.external_downloader = external_downloader
+        self.fallback_format = fallback_format
+        self.rate_limit = rate_limit
+        self.weight = weight
+        self.skip_archived = skip_archived
+        self.extra_opts = extra_opts or {}
+
+    @property
+    def archive_format(self):
+        return archive_format(self.resolution, self.format_id)
+
+    def ydl_opts(self, progress_hooks, tuning_opts=None, postprocessor_hooks=(), parties=DEFAULT_MAX_CONCURRENT):
+        """生成 yt-dlp 下载选项（parties 为可能同时进行的下载数，用于分配 ffmpeg 线程）"""
+        opts = dict(BASE_OPTS)
+        opts['format'] = self.format_id or format_spec(self.resolution, self.ffmpeg)
+        opts['outtmpl'] = self.outtmpl or os.path.join(self.output_path, DEFAULT_OUTTMPL)
+        opts['progress_hooks'] = list(progress_hooks)
+        opts['postprocessor_hooks'] = list(postprocessor_hooks)
+        opts.update(tuning_opts or {})
+        if self.ffmpeg:
+            # yt-dlp 调用的 ffmpeg 按可能同时进行的下载数分配全局线程预算
+            opts['postprocessor_args'] = {'ffmpeg': ffmpeg_thread_args(parties)}
+        if self.proxy:
+            opts['proxy'] = self.proxy
+        if self.subtitles:
+            opts.update(SUBTITLE_OPTS)
+        if self.external_downloader and get_capabilities().has('aria2c'):
+            # 使用外部下载器加速
+            opts['external_downloader'] = 'aria2c'
+            opts['external_downloader_args'] = {
+                'aria2c': ['--min-split-size=1M', '--max-connection-per-server=16', '--max-concurrent-downloads=8']
+            }
+        opts.update(self.extra_opts)
+        return opts
+
+
+class DownloadJob:
+    """下载任务
+
+    on_progress 收到 yt-dlp 原样的进度字典；on_warning 收到可以继续下载的问题描述。
+    最终文件路径和字幕文件路径取自 yt-dlp 的下载结果和后处理回调，不扫描下载目录。
+    """
+
+    def __init__(self, job_id, request, on_progress=None, on_warning=None):
+        self.job_id = job_id
+        self.request = request
+        self.state = JOB_QUEUED
+        self.downloaded = 0
+        self.total = 0
+        self.filepath = None
+        self.subtitle_files = []   # 同时下载的字幕文件路径
+        self.error = None
+        self.skipped = False   # 下载存档中已有，没有重新下载
+        self._reported_path = None   # 进度回调报告的下载文件（后处理之前）
+        self._final_path = None      # 后处理回调报告的最终文件
+        self._on_progress = on_progress
+        self._streams = []   # progress() 的队列
+        self._on_warning = on_warning
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """取消任务；正在下载时在下一次进度回调处停止"""
+        self._cancelled.set()
+
+    def done(self):
+        return self._finished.is_set()
+
+    def result(self, timeout=None):
+        """等待任务结束，返回最终文件路径；失败或取消时抛出对应的异常"""
+        if not self._finished.wait(timeout):
+            raise TimeoutError(f"任务 {self.job_id} 尚未完成")
+        if self.error is not None:
+            raise self.error
+        return self.filepath
+
+    def progress(self):
+        """进度流：逐个产出 yt-dlp 进度字典，任务结束时停止
+
+        只包含调用之后的进度。
+        """
+        events = queue.Queue()
+        with self._lock:
+            if self._finished.is_set():
+                return
+            self._streams.append(events)
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield event
+
+    def _hook(self, d):
+        if self._cancelled.is_set():
+            raise DownloadCancelled("下载已取消")
+        if d.get('status') == 'downloading':
+            self.downloaded = d.get('downloaded_bytes') or 0
+            self.total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        elif d.get('status') == 'finished' and d.get('filename'):
+            self._reported_path = d['filename']
+        if self._on_progress:
+            self._on_progress(d)
+        for events in list(self._streams):
+            events.put(d)
+
+    def _pp_hook(self, d):
+        """yt-dlp 后处理回调：每一步后处理（合并、转码、移动文件）完成后记录当前的文件路径"""
+        if d.get('status') == 'finished':
+            self._record_outputs(d.get('info_dict') or {})
+
+    def _record_outputs(self, info):
+        """从 yt-dlp 的视频信息中记录最终文件和字幕文件的路径"""
+        if info.get('filepath'):
+            self._final_path = info['filepath']
+        subtitles = [sub['filepath'] for sub in (info.get('requested_subtitles') or {}).values()
+                     if sub and sub.get('filepath')]
+        if subtitles:
+            self.subtitle_files = subtitles
+
+    def _reset_outputs(self):
+        self._reported_path = self._final_path = None
+        self.subtitle_files = []
+
+    def _warn(self, message):
+        if self._on_warning:
+            self._on_warning(message)
+
+    def _finish(self, state, filepath=None, error=None):
+        with self._lock:
+            if self._finished.is_set():
+                return
+            self.state = state
+            self.filepath = filepath
+            self.error = error
+            self._finished.set()
+            streams = list(self._streams)
+        # 结束进度流
+        for events in streams:
+            events.put(None)
+
+
+class DownloadEngine:
+    """下载任务的提交、执行、进度和取消
+
+    submit() 在引擎自己的工作线程中执行任务；run() 在调用线程中同步执行，
+    适合命令行和已经运行在工作线程中的图形界面任务。
+    """
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}      # 任务ID -> DownloadJob
+        self._active = 0     # 正在下载的任务数（包括 run() 执行的）
+        self._scheduler = None
+
+    def submit(self, request, on_progress=None, on_warning=None, priority=0):
+        """提交任务，立即返回 DownloadJob"""
+        job = self._create_job(request, on_progress, on_warning)
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = DownloadScheduler(self.max_concurrent)
+            scheduler = self._scheduler
+        scheduler.submit(lambda: self._execute(job), job.job_id, url=request.url, priority=priority)
+        return job
+
+    def run(self, request, on_progress=None, on_warning=None):
+        """在当前线程下载，返回最终文件路径，失败时抛出异常"""
+        return self.run_job(request, on_progress, on_warning).filepath
+
+    def run_job(self, request, on_progress=None, on_warning=None):
+        """在当前线程下载，返回已完成的 DownloadJob（含字幕文件路径），失败时抛出异常"""
+        job = self._create_job(request, on_progress, on_warning)
+        self._execute(job)
+        job.result()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消任务，返回任务是否存在"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            scheduler = self._scheduler
+        if job is None:
+            return False
+        job.cancel()
+        if scheduler is not None and scheduler.cancel(job_id):
+            # 还在排队，直接结束
+            job._finish(JOB_CANCELLED, error=DownloadCancelled("下载已取消"))
+            self._forget(job)
+        return True
+
+    def active_count(self):
+        with self._lock:
+            return self._active
+
+    def shutdown(self):
+        """取消所有任务，停止工作线程"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            scheduler, self._scheduler = self._scheduler, None
+        if scheduler is not None:
+            scheduler.shutdown()
+        for job in jobs:
+            job.cancel()
+            if job.state == JOB_QUEUED:
+                # 排队中的任务不会再执行
+                job._finish(JOB_CANCELLED, error=DownloadCancelled("下载已取消"))
+
+    def archived(self, request):
+        """下载存档中与请求匹配的记录（文件仍然存在），没有或 skip_archived 为 False 时返回 None"""
+        if not request.skip_archived:
+            return None
+        return get_archive().find(request.url, request.archive_format)
+
+    def extract_info(self, url, proxy=None):
+        """提取视频信息（可序列化，可直接用于下载），优先从缓存读取"""
+        ydl_opts = dict(EXTRACT_OPTS)
+        if proxy:
+            ydl_opts['proxy'] = proxy
+
+        def extract():
+            with pooled_ydl(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=False)
+                return ydl.sanitize_info(info, remove_private_keys=True)
+
+        return get_info_cache().get_or_extract(url, extract, route=proxy)
+
+    def list_formats(self, url, proxy=None):
+        """打印 yt-dlp 的格式列表，返回视频信息"""
+        info = self.extract_info(url, proxy)
+        ydl_opts = dict(EXTRACT_OPTS, quiet=False)
+        if proxy:
+            ydl_opts['proxy'] = proxy
+        with pooled_ydl(ydl_opts) as ydl:
+            ydl.list_formats(info)
+        return info
+
+    def _create_job(self, request, on_progress, on_warning):
+        with self._lock:
+            job = DownloadJob(next(self._ids), request, on_progress, on_warning)
+            self._jobs[job.job_id] = job
+        return job
+
+    def _forget(self, job):
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+
+    def _execute(self, job):
+        if job.cancelled:
+            job._finish(JOB_CANCELLED, error=DownloadCancelled("下载已取消"))
+            self._forget(job)
+            return
+        # 在提取视频信息之前查询存档，已下载过的视频不访问网络
+        entry = self.archived(job.request)
+        if entry is not None:
+            job.skipped = True
+            job._warn(f"已下载过，跳过: {entry.path}")
+            job._finish(JOB_COMPLETED, filepath=entry.path)
+            self._forget(job)
+            return
+        with self._lock:
+            self._active += 1
+        job.state = JOB_RUNNING
+        try:
+            filepath = self._download(job)
+        except Exception as e:
+            if job.cancelled:
+                job._finish(JOB_CANCELLED, error=DownloadCancelled("下载已取消"))
+            else:
+                job._finish(JOB_FAILED, error=e)
+        else:
+            self._archive(job, filepath)
+            job._finish(JOB_COMPLETED, filepath=filepath)
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._forget(job)
+
+    def _archive(self, job, filepath):
+        """把完成的下载记入存档，存档写入失败不影响下载结果"""
+        try:
+            get_archive().record(job.request.url, job.request.archive_format, filepath)
+        except (OSError, sqlite3.Error) as e:
+            job._warn(f"写入下载存档失败: {e}")
+
+    def _download(self, job):
+        limit = current_limit()
+        if limit is not None:
+            # 前端已经为这个任务登记了限速（例如图形界面的下载任务）
+            return self._download_limited(job, limit)
+        key = ('engine', job.job_id)
+        with get_limiter().register(key, job.request.weight, job.request.rate_limit) as limit:
+            return self._download_limited(job, limit)
+
+    def _download_limited(self, job, limit):
+        request = job.request
+        os.makedirs(request.output_path, exist_ok=True)
+
+        # 并发片段数和分块大小按线路自动调优
+        tuning = get_autotuner().start(request.proxy, self.active_count(), limit)
+        # 限速回调放在最后，调优器测得的是限速后的速度
+        # 图形界面通过 run() 执行的任务不受引擎并发上限约束，按实际同时进行的下载数计算
+        ydl_opts = request.ydl_opts([job._hook, tuning.progress_hook, limit.progress_hook], tuning.ytdlp_opts(),
+                                    postprocessor_hooks=[job._pp_hook],
+                                    parties=max(self.max_concurrent, self.active_count()))
+        aria2c_args = (ydl_opts.get('external_downloader_args') or {}).get('aria2c')
+        if aria2c_args is not None and limit.effective_rate:
+            # aria2c 是独立进程，按启动时分到的速率限速
+            ydl_opts['external_downloader_args'] = {
+                'aria2c': aria2c_args + [f'--max-overall-download-limit={limit.effective_rate}']
+            }
+
+        try:
+            # 视频信息优先从缓存读取，列出格式或添加视频时已提取过的信息不再重复提取
+            info = self.extract_info(request.url, request.proxy)
+            return self._process(job, info, ydl_opts, tuning)
+        except Exception as e:
+            if job.cancelled:
+                raise
+            job._warn(f"下载过程中出现问题: {e}\n尝试使用备用方法下载...")
+
+        # 缓存的流地址可能已失效，重新提取后再试一次
+        get_info_cache().invalidate(request.url, route=request.proxy)
+        if request.fallback_format:
+            ydl_opts['format'] = request.fallback_format
+        info = self.extract_info(request.url, request.proxy)
+        return self._process(job, info, ydl_opts, tuning)
+
+    def _process(self, job, info, ydl_opts, tuning):
+        """下载并返回最终文件路径
+
+        路径依次取自下载结果、后处理回调和进度回调，都没有时才按输出模板推算。
+        """
+        job._reset_outputs()
+        with pooled_ydl(ydl_opts) as ydl:
+            tuning.attach(ydl)
+            result = ydl.process_ie_result(info, download=True)
+            if not result:
+                raise Exception("下载失败: 无法获取视频信息")
+            job._record_outputs(result)
+            for download in result.get('requested_downloads') or []:
+                job._record_outputs(download)
+            return job._final_path or job._reported_path or ydl.prepare_filename(result)
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """返回进程内共享的下载引擎"""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = DownloadEngine()
+        return _default_engine
@@ -14,25 +14,15 @@ import argparse
 import subprocess
 import re
 import json
-import shutil
 from datetime import datetime, timedelta
 
-# 检查 yt-dlp 是否已安装
-try:
-    import yt_dlp
-    YTDLP_AVAILABLE = True
-except ImportError:
-    YTDLP_AVAILABLE = False
+from bandwidth import get_limiter, parse_rate
+from capabilities import get_capabilities
+from download_engine import DownloadRequest, get_engine
 
-# 检查 ffmpeg 是否已安装
-def check_ffmpeg():
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        return False
-
-FFMPEG_AVAILABLE = check_ffmpeg()
+# 检查 yt-dlp 和 ffmpeg 是否已安装（使用缓存的检测结果，yt-dlp 在下载时才导入）
+YTDLP_AVAILABLE = get_capabilities().ytdlp
+FFMPEG_AVAILABLE = get_capabilities().ffmpeg
 
 # ANSI 颜色代码
 class Colors:
@@ -248,19 +238,10 @@ def get_video_info(url, proxy=None):
         print(f"{Colors.RED}请先安装 yt-dlp{Colors.ENDC}")
         return None
     
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True
-    }
-    
-    if proxy:
-        ydl_opts['proxy'] = proxy
-    
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            print(f"{Colors.CYAN}正在获取视频信息...{Colors.ENDC}")
-            info = ydl.extract_info(url, download=False)
-            return info
+        # 先查缓存，列出格式后再下载不会重复提取
+        print(f"{Colors.CYAN}正在获取视频信息...{Colors.ENDC}")
+        return get_engine().extract_info(url, proxy)
     except Exception as e:
         print(f"{Colors.RED}获取视频信息失败: {str(e)}{Colors.ENDC}")
         return None
@@ -343,7 +324,7 @@ def list_formats(url, proxy=None):
     return False
 
 # 高速下载视频
-def download_video(url, resolution=None, output_path=None, proxy=None, format_id=None):
+def download_video(url, resolution=None, output_path=None, proxy=None, format_id=None, force=False):
     if not YTDLP_AVAILABLE:
         print(f"{Colors.RED}请先安装 yt-dlp{Colors.ENDC}")
         return False
@@ -351,71 +332,37 @@ def download_video(url, resolution=None, output_path=None, proxy=None, format_id
     if not output_path:
         output_path = os.path.expanduser("~/Downloads")
     
-    if not os.path.exists(output_path):
-        try:
-            os.makedirs(output_path)
-        except Exception as e:
-            print(f"{Colors.RED}创建下载目录失败: {str(e)}{Colors.ENDC}")
-            return False
-    
-    # 根据是否指定了格式ID来设置格式
     if format_id:
-        format_spec = format_id
         print(f"{Colors.CYAN}使用指定格式ID: {format_id}{Colors.ENDC}")
-    else:
-        # 设置默认格式
-        format_spec = 'bestvideo[height<=1080]+bestaudio/best'
-        if resolution and resolution.isdigit():
-            height = int(resolution)
-            format_spec = f'bestvideo[height<={height}]+bestaudio/best[height<={height}]'
-        
-        # 如果 ffmpeg 不可用，使用单一格式
-        if not FFMPEG_AVAILABLE:
-            if resolution and resolution.isdigit():
-                format_spec = f'best[height<={resolution}]/best'
-            else:
-                format_spec = 'best'
-            print(f"{Colors.YELLOW}警告: 未安装 ffmpeg，将下载单一格式视频。质量可能不是最佳。{Colors.ENDC}")
-    
-    # 设置输出模板
-    output_template = os.path.join(output_path, '%(title)s.%(ext)s')
-    
-    # 设置 yt-dlp 选项 - 高级性能优化
-    ydl_opts = {
-        'format': format_spec,
-        'outtmpl': output_template,
-        'progress_hooks': [progress_hook],
-        'no_check_certificate': True,
-        'quiet': False,
-        'no_warnings': True,
-        'color': 'always',
-        # 高级下载速度优化
-        'concurrent_fragments': 8,      # 提高到8个并发片段
-        'retries': 10,                  # 重试次数
-        'fragment_retries': 10,         # 片段重试次数
-        'buffersize': 1024*1024*32,     # 增加缓冲区到32MB
-        'http_chunk_size': 10485760*2,  # 20MB的块大小
-        'socket_timeout': 30,           # 超时时间
-        'extractor_retries': 5,         # 提取器重试次数
-        'file_access_retries': 5,       # 文件访问重试
-        # 使用外部下载器加速 (如果可用)
-        'external_downloader': 'aria2c' if shutil.which('aria2c') else None,
-        'external_downloader_args': {
-            'aria2c': ['--min-split-size=1M', '--max-connection-per-server=16', '--max-concurrent-downloads=8']
-        },
-        # 后处理参数
-        'postprocessor_args': {
-            'ffmpeg': ['-threads', '4']  # 使用4个线程进行处理
-        },
-        # 禁用一些不必要的功能以提高速度
-        'updatetime': False,            # 不更新文件修改时间
-        'ignoreerrors': False,          # 遇到错误时停止
-        'geo_bypass': True,             # 尝试绕过地理限制
-        'sleep_interval': 0,            # 下载前不等待
-    }
-    
-    if proxy:
-        ydl_opts['proxy'] = proxy
+    elif not FFMPEG_AVAILABLE:
+        print(f"{Colors.YELLOW}警告: 未安装 ffmpeg，将下载单一格式视频。质量可能不是最佳。{Colors.ENDC}")
+    
+    # 默认最高 1080p
+    request = DownloadRequest(
+        url,
+        resolution=resolution if resolution and resolution.isdigit() else "1080",
+        output_path=output_path,
+        proxy=proxy,
+        format_id=format_id,
+        ffmpeg=FFMPEG_AVAILABLE,
+        skip_archived=not force,
+        external_downloader=True,  # 使用 aria2c 加速 (如果可用)
+        extra_opts={
+            'quiet': False,
+            'no_warnings': True,
+            'color': 'always',
+            # 禁用一些不必要的功能以提高速度
+            'updatetime': False,            # 不更新文件修改时间
+            'geo_bypass': True,             # 尝试绕过地理限制
+            'sleep_interval': 0,            # 下载前不等待
+        }
+    )
+    
+    # 下载存档中已有的视频不再提取信息和下载
+    entry = get_engine().archived(request)
+    if entry is not None:
+        print(f"{Colors.GREEN}已下载过，跳过: {entry.path} (使用 --force 重新下载){Colors.ENDC}")
+        return True
     
     try:
         print(f"{Colors.CYAN}正在下载视频: {url}{Colors.ENDC}")
@@ -425,16 +372,15 @@ def download_video(url, resolution=None, output_path=None, proxy=None, format_id
         if proxy:
             print(f"{Colors.CYAN}使用代理: {proxy}{Colors.ENDC}")
         
-        print(f"{Colors.YELLOW}已启用多线程高速下载优化 (并发片段: 8){Colors.ENDC}")
+        print(f"{Colors.YELLOW}已启用多线程高速下载优化 (并发片段自动调优){Colors.ENDC}")
         
-        if shutil.which('aria2c'):
+        if get_capabilities().has('aria2c'):
             print(f"{Colors.GREEN}已启用 aria2c 外部下载器，可显著提高下载速度{Colors.ENDC}")
         
         # 开始计时
         start_time = time.time()
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        get_engine().run(request, on_progress=progress_hook)
         
         # 计算总耗时
         end_time = time.time()
@@ -467,9 +413,14 @@ def main():
     parser.add_argument("-i", "--install", action="store_true", help="安装 yt-dlp")
     parser.add_argument("-a", "--aria2", action="store_true", help="安装 aria2 下载加速器")
     parser.add_argument("--ffmpeg", action="store_true", help="安装 ffmpeg")
+    parser.add_argument("--limit-rate", type=parse_rate, default=0, help="总下载限速，例如 500K、2M (默认不限速)")
+    parser.add_argument("--force", action="store_true", help="忽略下载存档，重新下载已下载过的视频")
     
     args = parser.parse_args()
     
+    # 全局限速
+    get_limiter().set_rate(args.limit_rate)
+    
     # 安装 yt-dlp
     if args.install:
         install_ytdlp()
@@ -517,11 +468,9 @@ def main():
             print(f"{Colors.RED}请手动安装 yt-dlp: pip install yt-dlp{Colors.ENDC}")
             return
         
-        # 重新导入 yt-dlp
-        try:
-            import yt_dlp
-            YTDLP_AVAILABLE = True
-        except ImportError:
+        # 重新检测 yt-dlp
+        YTDLP_AVAILABLE = get_capabilities(refresh=True).ytdlp
+        if not YTDLP_AVAILABLE:
             print(f"{Colors.RED}安装 yt-dlp 失败，请手动安装{Colors.ENDC}")
             return
     
@@ -548,7 +497,7 @@ def main():
     if args.list_formats:
         list_formats(args.url, proxy)
     else:
-        download_video(args.url, resolution, output_path, proxy, args.format)
+        download_video(args.url, resolution, output_path, proxy, args.format, force=args.force)
 
 if __name__ == "__main__":
     try:
@@ -7,12 +7,14 @@ This version fixes the duplicate class and method issues in the original code
 import os
 import sys
 import importlib.util
-import shutil
 import subprocess
 import time
 from datetime import datetime
 import platform
 
+from capabilities import get_capabilities
+from download_engine import DownloadRequest, get_engine
+
 # Check if PyQt6 is available
 PYQT_AVAILABLE = importlib.util.find_spec("PyQt6") is not None
 
@@ -26,12 +28,12 @@ if PYQT_AVAILABLE:
     from PyQt6.QtGui import QPixmap
 
 # Check if yt-dlp is available
-YTDLP_AVAILABLE = importlib.util.find_spec("yt_dlp") is not None
+YTDLP_AVAILABLE = get_capabilities().ytdlp
 
 # Check if ffmpeg is installed
 def is_ffmpeg_installed():
     """Check if ffmpeg is installed on the system"""
-    return shutil.which('ffmpeg') is not None
+    return get_capabilities().ffmpeg
 
 FFMPEG_AVAILABLE = is_ffmpeg_installed()
 
@@ -195,8 +197,6 @@ class DownloadThread(QThread):
     def download_with_ytdlp(self):
         """Download video using yt-dlp"""
         try:
-            import yt_dlp
-            
             # Configure proxy if provided
             proxy_url = None
             if self.proxy_host and self.proxy_port:
@@ -207,47 +207,20 @@ class DownloadThread(QThread):
             
             # Create a timestamp-based filename
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_filename = f"youtube_{timestamp}"
-            output_path = os.path.join(self.download_path, f"%(title)s_{timestamp}.%(ext)s")
-            
-            # Configure format based on resolution
-            format_str = f"bestvideo[height<={self.resolution}]+bestaudio/best[height<={self.resolution}]"
-            if not FFMPEG_AVAILABLE:
-                # If ffmpeg is not available, use a single format
-                format_str = f"best[height<={self.resolution}]"
-            
-            # Configure yt-dlp options with optimized settings
-            ydl_opts = {
-                'format': format_str,
-                'outtmpl': output_path,
-                'noplaylist': True,
-                'progress_hooks': [self.ytdlp_progress_hook],
-                
-                # Speed optimization parameters
-                'concurrent_fragments': 5,
-                'retries': 10,
-                'fragment_retries': 10,
-                'buffersize': 1024 * 1024 * 16,  # 16MB
-                'http_chunk_size': 10 * 1024 * 1024,  # 10MB
-                'socket_timeout': 30,
-                'extractor_retries': 5,
-                'file_access_retries': 5,
-                
-                # FFmpeg optimization
-                'postprocessor_args': {
-                    'ffmpeg': ['-threads', '4']
-                }
-            }
             
-            # Add proxy if configured
-            if proxy_url:
-                ydl_opts['proxy'] = proxy_url
+            # Format selection, tuning and retries are handled by the shared engine
+            request = DownloadRequest(
+                self.url,
+                resolution=self.resolution,
+                output_path=self.download_path,
+                proxy=proxy_url,
+                outtmpl=f"%(title)s_{timestamp}.%(ext)s",
+                ffmpeg=FFMPEG_AVAILABLE
+            )
             
             # Download the video
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(self.url, download=True)
-                downloaded_file = ydl.prepare_filename(info)
-                self.finished_signal.emit(downloaded_file)
+            downloaded_file = get_engine().run(request, on_progress=self.ytdlp_progress_hook)
+            self.finished_signal.emit(downloaded_file)
                 
         except Exception as e:
             self.error_signal.emit(f"yt-dlp 下载失败: {str(e)}")
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP/1.1 长连接池
+urllib 默认每个请求都带 `Connection: close`，pytubefix 的元数据请求和断点续传的每个分段请求
+都要重新建立 TCP 和 TLS 连接。这里的处理器把读完的连接放回池中复用，按主机（和代理线路）
+限制同时使用的连接数，空闲过久的连接自动关闭。直连、HTTP 代理和 SOCKS5 代理都走同一个池；
+新建的 HTTPS 连接恢复缓存的 TLS 会话
+"""
+
+import http.client
+import select
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from tls_cache import remember_session, wrap_socket
+
+# 同一主机（同一线路）最多同时使用的连接数
+DEFAULT_MAX_PER_HOST = 6
+
+# 空闲连接保留的时间（秒），超过后关闭
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+# 等待空闲连接的最长时间（秒）
+DEFAULT_ACQUIRE_TIMEOUT = 60.0
+
+# 复用的连接失效时可以安全重发的请求方法
+_IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# 复用的连接被服务器关闭时发送或读取响应会遇到的错误
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                 ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+
+
+def _is_dead(conn):
+    """空闲连接的套接字可读说明服务器已关闭连接（或发来了多余的数据），不能再用"""
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _timeout(value):
+    """urllib 的默认超时是一个占位对象，换算为实际的套接字超时"""
+    return socket.getdefaulttimeout() if value is socket._GLOBAL_DEFAULT_TIMEOUT else value
+
+
+class ConnectionPool:
+    """按 (协议, 主机, 线路) 划分的长连接池
+
+    acquire() 优先返回空闲连接，没有时在连接数未达上限时新建，否则等待其他请求释放；
+    release() 把可以复用的连接放回池中。
+    """
+
+    def __init__(self, max_per_host=DEFAULT_MAX_PER_HOST, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        self.max_per_host = max(1, int(max_per_host))
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = {}     # 键 -> [(放回时间, 连接)]，最近放回的在最后
+        self._in_use = {}   # 键 -> 正在使用的连接数
+        self.created = 0    # 新建的连接数
+        self.reused = 0     # 复用的次数
+
+    def acquire(self, key, factory):
+        """取得一个连接，返回 (连接, 是否复用)"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                self._evict_locked(time.monotonic())
+                idle = self._idle.get(key)
+                while idle:
+                    _, conn = idle.pop()
+                    if _is_dead(conn):
+                        conn.close()
+                        continue
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    self.reused += 1
+                    return conn, True
+                if self._in_use.get(key, 0) + len(self._idle.get(key, ())) < self.max_per_host:
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    self.created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise urllib.error.URLError(f"等待连接超时: {key[1]} 的 {self.max_per_host} 个连接都在使用中")
+                self._cond.wait(remaining)
+        try:
+            return factory(), False
+        except BaseException:
+            self.release(key, None)
+            raise
+
+    def release(self, key, conn, reusable=False):
+        """归还连接；不能复用的连接（或 conn 为 None）只释放名额"""
+        with self._cond:
+            self._in_use[key] = max(0, self._in_use.get(key, 0) - 1)
+            if conn is not None and reusable and conn.sock is not None:
+                self._idle.setdefault(key, []).append((time.monotonic(), conn))
+                conn = None
+            self._cond.notify_all()
+        if conn is not None:
+            conn.close()
+
+    def close_idle(self):
+        """关闭所有空闲连接"""
+        with self._cond:
+            idle, self._idle = self._idle, {}
+            self._cond.notify_all()
+        for connections in idle.values():
+            for _, conn in connections:
+                conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "idle": sum(len(connections) for connections in self._idle.values()),
+                "in_use": sum(self._in_use.values()),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+    def _evict_locked(self, now):
+        """关闭空闲超时的连接（需持有锁）"""
+        for key in list(self._idle):
+            fresh = []
+            for released_at, conn in self._idle[key]:
+                if now - released_at > self.idle_timeout:
+                    conn.close()
+                else:
+                    fresh.append((released_at, conn))
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+
+class PooledResponse(http.client.HTTPResponse):
+    """读完后把连接还给连接池的响应
+
+    正文读完（或响应本来就没有正文）时连接可以复用；没读完就关闭的响应连同连接一起关闭。
+    """
+
+    _on_done = None
+
+    def close(self):
+        if self.fp is not None:
+            # 正文还没读完，连接上残留的数据会影响下一个请求
+            self.will_close = True
+        super().close()
+
+    def _close_conn(self):
+        was_open = self.fp is not None
+        super()._close_conn()
+        if was_open:
+            self._done()
+
+    def _done(self):
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done(not self.will_close)
+
+
+class PooledConnectionMixin:
+    """使用 PooledResponse 的连接"""
+    response_class = PooledResponse
+
+
+class PooledHTTPConnection(PooledConnectionMixin, http.client.HTTPConnection):
+    pass
+
+
+class PooledHTTPSConnection(PooledConnectionMixin, http.client.HTTPSConnection):
+    """握手时恢复缓存的 TLS 会话（见 tls_cache）"""
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        if self._tunnel_host:
+            server_hostname, port = self._tunnel_host, self._tunnel_port
+        else:
+            server_hostname, port = self.host, self.port
+        self.sock = wrap_socket(self._context, self.sock, server_hostname, port)
+
+    def getresponse(self):
+        response = super().getresponse()
+        self._remember_session()
+        return response
+
+    def close(self):
+        self._remember_session()
+        super().close()
+
+    def _remember_session(self):
+        # TLS 1.3 的会话票据在握手之后才收到，读到响应时再保存
+        if self.sock is not None and hasattr(self.sock, "session"):
+            if self._tunnel_host:
+                remember_session(self._context, self.sock, self._tunnel_host, self._tunnel_port)
+            else:
+                remember_session(self._context, self.sock, self.host, self.port)
+
+
+class _PooledHandlerMixin:
+    """urllib 处理器：从连接池取连接发送请求，不加 `Connection: close`"""
+
+    def _pooled_open(self, connection_class, req, **conn_args):
+        host = req.host
+        if not host:
+            raise urllib.error.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update({k: v for k, v in req.headers.items() if k not in headers})
+        headers = {name.title(): val for name, val in headers.items()}
+        tunnel_headers = {}
+        if req._tunnel_host and "Proxy-Authorization" in headers:
+            # 代理认证只发给代理，不发给目标服务器
+            tunnel_headers["Proxy-Authorization"] = headers.pop("Proxy-Authorization")
+
+        key = (req.type, host, req._tunnel_host, self.route)
+
+        def connect():
+            conn = connection_class(host, timeout=req.timeout, **conn_args)
+            conn.set_debuglevel(self._debuglevel)
+            if req._tunnel_host:
+                conn.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+            return conn
+
+        method = req.get_method()
+        while True:
+            conn, reused = self.pool.acquire(key, connect)
+            if reused:
+                conn.timeout = _timeout(req.timeout)
+                conn.sock.settimeout(conn.timeout)
+            try:
+                try:
+                    conn.request(method, req.selector, req.data, headers,
+                                 encode_chunked=req.has_header('Transfer-encoding'))
+                    response = conn.getresponse()
+                except _STALE_ERRORS:
+                    if reused and method in _IDEMPOTENT_METHODS:
+                        # 服务器已关闭这个空闲连接，换一个连接重发
+                        self.pool.release(key, conn)
+                        continue
+                    raise
+                except OSError as err:
+                    raise urllib.error.URLError(err)
+            except BaseException:
+                self.pool.release(key, conn)
+                raise
+            break
+
+        response._on_done = lambda reusable: self.pool.release(key, conn, reusable)
+        if response.fp is None:
+            # 连接已随响应关闭（例如服务器要求关闭）
+            response._done()
+        elif response.length == 0 and not response.chunked:
+            # 没有正文的响应（HEAD、204、304）不会再读取，立即归还连接
+            response._close_conn()
+        response.url = req.get_full_url()
+        response.msg = response.reason
+        return response
+
+
+class PooledHTTPHandler(_PooledHandlerMixin, urllib.request.HTTPHandler):
+    """使用连接池的 HTTP 处理器
+
+    connection_class 可以替换为经代理建连的连接类，route 用于区分不同线路的连接。
+    """
+
+    def __init__(self, pool=None, connection_class=PooledHTTPConnection, route=None):
+        super().__init__()
+        self.pool = pool or get_http_pool()
+        self.connection_class = connection_class
+        self.route = route
+
+    def http_open(self, req):
+        return self._pooled_open(self.connection_class, req)
+
+
+class PooledHTTPSHandler(_PooledHandlerMixin, urllib.request.HTTPSHandler):
+    """使用连接池的 HTTPS 处理器，同一个 SSL 上下文的连接才会互相复用"""
+
+    def __init__(self, pool=None, context=None, connection_class=PooledHTTPSConnection, route=None):
+        super().__init__(context=context)
+        self.pool = pool or get_http_pool()
+        self.connection_class = connection_class
+        self.route = (route, id(context))
+
+    def https_open(self, req):
+        return self._pooled_open(self.connection_class, req, context=self._context)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_http_pool():
+    """返回进程内共享的连接池"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+视频信息缓存
+按视频ID缓存 extract_info 的结果（压缩后的 JSON），过期时间与流地址的有效期一致，
+同一视频的并发请求只会触发一次提取
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+from urls import cache_key
+
+# 默认缓存目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~/.downtube"), "info_cache")
+
+# 找不到流地址有效期时使用的缓存时间（秒）
+DEFAULT_TTL = 4 * 3600
+
+# 流地址到期前提前失效的时间（秒），留给下载使用
+EXPIRY_MARGIN = 30 * 60
+
+# 内存中保留的条目数
+MEMORY_ENTRIES = 128
+
+
+def stream_url_expiry(info):
+    """返回信息中所有流地址最早的过期时间（Unix时间戳），没有则返回 None"""
+    expiries = []
+    formats = list(info.get('formats') or [])
+    formats.extend(info.get('requested_formats') or [])
+    for fmt in formats:
+        url = fmt.get('url') if isinstance(fmt, dict) else None
+        if not url:
+            continue
+        try:
+            query = parse_qs(urlparse(url).query)
+        except ValueError:
+            continue
+        value = query.get('expire', [None])[0]
+        if value and value.isdigit():
+            expiries.append(int(value))
+    return min(expiries) if expiries else None
+
+
+class _Flight:
+    """一次正在进行的提取"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InfoCache:
+    """视频信息缓存（内存 + 磁盘）"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, default_ttl=DEFAULT_TTL, memory_entries=MEMORY_ENTRIES):
+        self.cache_dir = cache_dir
+        self.default_ttl = default_ttl
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # 文件名 -> (过期时间, 压缩数据)
+        self._flights = {}            # 文件名 -> _Flight
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_name(self, url, namespace, route):
+        """缓存条目名：命名空间-视频ID[-线路摘要]
+
+        流地址与出口IP绑定，不同代理线路分别缓存
+        """
+        name = f"{namespace}-{cache_key(url)}"
+        if route:
+            name += "-" + hashlib.sha1(route.encode("utf-8")).hexdigest()[:8]
+        return name
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name + ".json.z")
+
+    def get(self, url, namespace="ytdlp", route=None):
+        """读取缓存，不存在或已过期返回 None"""
+        name = self._entry_name(url, namespace, route)
+        with self._lock:
+            entry = self._memory.get(name)
+            if entry is not None:
+                self._memory.move_to_end(name)
+        if entry is None:
+            entry = self._read_disk(name)
+            if entry is None:
+                return None
+            self._remember(name, entry)
+        expires, blob = entry
+        if expires <= time.time():
+            self.invalidate(url, namespace, route)
+            return None
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def put(self, url, info, namespace="ytdlp", route=None, ttl=None):
+        """写入缓存，过期时间默认取流地址的有效期"""
+        now = time.time()
+        if ttl is not None:
+            expires = now + ttl
+        else:
+            expiry = stream_url_expiry(info)
+            expires = expiry - EXPIRY_MARGIN if expiry else now + self.default_ttl
+        if expires <= now:
+            return
+        blob = zlib.compress(json.dumps(info, ensure_ascii=False).encode("utf-8"), 6)
+        name = self._entry_name(url, namespace, route)
+        self._remember(name, (expires, blob))
+        self._write_disk(name, expires, blob)
+
+    def invalidate(self, url, namespace="ytdlp", route=None):
+        """删除缓存条目，例如流地址已失效时"""
+        name = self._entry_name(url, namespace, route)
+        with self._lock:
+            self._memory.pop(name, None)
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def get_or_extract(self, url, extract, namespace="ytdlp", route=None, ttl=None):
+        """读取缓存，未命中时调用 extract() 提取并写入缓存
+
+        同一条目的并发调用会等待第一次提取的结果，而不是各自提取
+        """
+        info = self.get(url, namespace, route)
+        if info is not None:
+            return info
+
+        name = self._entry_name(url, namespace, route)
+        with self._lock:
+            flight = self._flights.get(name)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[name] = flight
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return json.loads(flight.result)
+
+        try:
+            # 等待锁期间可能已有其他线程写入
+            info = self.get(url, namespace, route)
+            if info is None:
+                info = extract()
+                self.put(url, info, namespace, route, ttl)
+            # 每个调用者拿到独立的副本
+            flight.result = json.dumps(info, ensure_ascii=False)
+            return info
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(name, None)
+            flight.event.set()
+
+    def _remember(self, name, entry):
+        with self._lock:
+            self._memory[name] = entry
+            self._memory.move_to_end(name)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, name):
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        header, _, blob = data.partition(b"\n")
+        try:
+            return float(header), blob
+        except ValueError:
+            return None
+
+    def _write_disk(self, name, expires, blob):
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(f"{expires}\n".encode("ascii"))
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except OSError:
+            # 缓存写入失败不影响下载
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_info_cache():
+    """返回进程内共享的缓存实例"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = InfoCache()
+        return _default_cache
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基于 SQLite 的下载任务存储
+保存下载队列，程序重启或崩溃后可以从中断处继续
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from urls import extract_video_id
+
+# 默认数据库位置
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~/.downtube"), "jobs.db")
+
+# 任务状态
+STATE_WAITING = "waiting"          # 已添加，未开始
+STATE_PENDING = "pending"          # 已加入下载队列
+STATE_DOWNLOADING = "downloading"  # 下载中
+STATE_COMPLETED = "completed"      # 已完成
+STATE_FAILED = "failed"            # 下载失败
+
+# 需要立即写入磁盘的状态
+_DURABLE_STATES = (STATE_PENDING, STATE_COMPLETED, STATE_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT,
+    url TEXT NOT NULL,
+    title TEXT,
+    author TEXT,
+    resolution TEXT,
+    engine TEXT DEFAULT 'auto',
+    download_subtitles INTEGER DEFAULT 1,
+    state TEXT NOT NULL DEFAULT 'waiting',
+    progress INTEGER DEFAULT 0,
+    priority INTEGER DEFAULT 0,
+    file_path TEXT,
+    error TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state);
+CREATE INDEX IF NOT EXISTS idx_jobs_video_id ON jobs(video_id);
+"""
+
+_UPDATABLE = ("state", "progress", "priority", "file_path", "error")
+
+
+class JobStore:
+    """下载任务存储
+
+    进度和状态更新先缓存在内存中，按时间间隔批量写入，
+    完成、失败等关键状态会立即落盘。
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, flush_interval=2.0):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._pending = {}      # 任务ID -> 待写入字段
+        self._last_flush = time.monotonic()
+
+    def add_job(self, url, title, author, resolution, engine="auto", download_subtitles=True, priority=0):
+        """添加任务，返回任务ID"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (video_id, url, title, author, resolution, engine, "
+                "download_subtitles, state, progress, priority, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                (extract_video_id(url), url, title, author, resolution, engine,
+                 1 if download_subtitles else 0, STATE_WAITING, priority, now, now)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        """按ID获取任务，返回字典或 None"""
+        with self._lock:
+            self._flush_locked()
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs(self, state=None):
+        """按添加顺序列出任务，可按状态过滤"""
+        with self._lock:
+            self._flush_locked()
+            if state is None:
+                rows = self._conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_by_video_id(self, video_id):
+        """按视频ID查找任务"""
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE video_id = ? ORDER BY id", (video_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id, **fields):
+        """更新任务字段（批量写入）"""
+        unknown = set(fields) - set(_UPDATABLE)
+        if unknown:
+            raise ValueError(f"不支持更新的字段: {', '.join(sorted(unknown))}")
+        with self._lock:
+            self._pending.setdefault(job_id, {}).update(fields)
+            if fields.get("state") in _DURABLE_STATES:
+                self._flush_locked()
+            elif time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def set_state(self, job_id, state, **fields):
+        """更新任务状态"""
+        self.update(job_id, state=state, **fields)
+
+    def set_progress(self, job_id, progress):
+        """更新下载进度"""
+        self.update(job_id, progress=int(progress))
+
+    def remove(self, job_id):
+        """删除任务"""
+        with self._lock:
+            self._pending.pop(job_id, None)
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+    def clear_completed(self):
+        """删除所有已完成的任务（下载存档不受影响），返回删除的任务ID列表"""
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute("SELECT id FROM jobs WHERE state = ?", (STATE_COMPLETED,)).fetchall()
+            job_ids = [row["id"] for row in rows]
+            self._conn.execute("DELETE FROM jobs WHERE state = ?", (STATE_COMPLETED,))
+            self._conn.commit()
+        return job_ids
+
+    def recover(self):
+        """崩溃恢复：把上次未完成的任务重置为等待状态
+
+        返回需要重新加入下载队列的任务ID列表（按优先级和添加顺序）
+        """
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE state IN (?, ?) ORDER BY priority DESC, id",
+                (STATE_PENDING, STATE_DOWNLOADING)
+            ).fetchall()
+            job_ids = [row["id"] for row in rows]
+            if job_ids:
+                self._conn.executemany(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                    [(STATE_WAITING, time.time(), job_id) for job_id in job_ids]
+                )
+                self._conn.commit()
+        return job_ids
+
+    def flush(self):
+        """立即写入所有缓存的更新"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """写入缓存并关闭数据库"""
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def _flush_locked(self):
+        """在一个事务中写入缓存的更新（需持有锁）"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        with self._conn:
+            for job_id, fields in pending.items():
+                names = sorted(fields)
+                assignments = ", ".join(f"{name} = ?" for name in names)
+                self._conn.execute(
+                    f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                    [fields[name] for name in names] + [now, job_id]
+                )
@@ -1,57 +1,65 @@
-import http.client
-import importlib.util
 import os
-import shutil
 import socket
-import ssl
 import sys
+import threading
 import time
-import urllib.request
 import re
-import requests
+import sqlite3
 
-from PyQt6.QtCore import QThread, pyqtSignal, Qt
+from PyQt6.QtCore import QObject, QSize, QThread, QTimer, pyqtSignal, Qt
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QPushButton,
                              QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
                              QComboBox, QFileDialog, QMessageBox, QListWidget,
                              QListWidgetItem, QDialog, QRadioButton, QGroupBox,
-                             QStyle, QTextEdit, QProgressBar, QCheckBox)
-from PyQt6.QtGui import QPixmap
-from pytubefix import YouTube, exceptions
+                             QStyle, QTextEdit, QProgressBar, QCheckBox, QSpinBox)
+from PyQt6.QtGui import QIcon
+
+import startup_timer
+from adaptive_mux import download_and_mux, pick_audio_stream
+from bandwidth import get_limiter, limited
+from bulk_intake import BulkIntake, parse_urls, read_url_file
+from capabilities import get_capabilities
+from download_archive import get_archive
+from download_engine import DownloadRequest, archive_format, get_engine
+from http_pool import get_http_pool
+from job_store import (JobStore, STATE_WAITING, STATE_PENDING, STATE_DOWNLOADING,
+                       STATE_COMPLETED, STATE_FAILED)
+from postprocess import convert_to_mp3, ffmpeg_thread_args, get_postprocessor, has_audio_stream
+from proxy_pool import ProxyLease, get_proxy_pool
+from proxy_probe import probe_local_proxies
+from progress_bus import ProgressBus, format_eta, format_speed
+from proxy_session import ProxyConfig, routed, set_default_route
+from resumable import DownloadInterrupted, download_stream
+from retry import EXTRACTOR, PERMANENT, THROTTLED, TRANSIENT, RetryPolicy, RetryState, classify
+from scheduler import DownloadScheduler
+from thumbnail_cache import ThumbnailLoader
+from tls_cache import client_context, get_session_cache, prewarm
+from urls import extract_video_id
+from youtube_cache import forget_youtube, get_youtube, is_expired_error
 
 # 默认下载路径
 DEFAULT_DOWNLOAD_PATH = os.path.expanduser("~/Downloads")
 
+# 下载调度配置
+MAX_CONCURRENT_DOWNLOADS = 3   # 同时下载的视频数
+MAX_DOWNLOADS_PER_HOST = 2     # 同一主机同时下载的视频数，None 表示不单独限制
+
+# 界面刷新下载进度的间隔（毫秒），与同时下载的任务数无关
+PROGRESS_REFRESH_MS = 250
+
+# 缩略图显示尺寸
+THUMBNAIL_SIZE = (240, 135)       # 添加视频对话框
+LIST_THUMBNAIL_SIZE = (64, 36)    # 下载列表
+
 # 配置超时时间（单位：秒）
 socket.setdefaulttimeout(15)  # 设置默认Socket超时（减少等待时间）
-http.client.HTTPConnection._http_vsn = 10  # 使用HTTP/1.0而非HTTP/1.1
-http.client.HTTPConnection._http_vsn_str = 'HTTP/1.0'
+# urllib 的请求（pytubefix、断点续传）通过 http_pool 使用 HTTP/1.1 长连接，由 set_default_route 安装
 
-# 创建一个默认的SSL上下文
-ssl_context = ssl.create_default_context()
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
-ssl_context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1  # 仅使用TLS 1.2+
+# 进程内共用的SSL上下文（不校验证书，TLS 1.2+），TLS 会话按主机缓存，新连接恢复会话
+ssl_context = client_context()
 
-# 尝试不同的SSL配置
-try:
-    # 设置更宽松的SSL选项
-    ssl_context.options &= ~ssl.OP_NO_TLSv1
-    ssl_context.options &= ~ssl.OP_NO_TLSv1_1
-    # 尝试使用更兼容的密码套件配置
-    try:
-        # 尝试设置更宽松的密码套件
-        ssl_context.set_ciphers('HIGH:!aNULL:!eNULL:!EXPORT:!DES:!RC4:!MD5:!PSK')
-    except ssl.SSLError:
-        # 如果失败，不设置特定的密码套件
-        pass
-except AttributeError:
-    # 某些旧版本Python可能不支持这些选项
-    pass
-
-# 重写urllib的opener，使用我们的SSL上下文
-opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-urllib.request.install_opener(opener)
+# 重写urllib的opener，使用我们的SSL上下文（各下载任务可以在此基础上指定自己的代理）
+set_default_route(ssl_context=ssl_context)
 
 # 代理支持
 USE_PROXY = False
@@ -60,167 +68,89 @@ PROXY_HOST = None
 PROXY_PORT = None
 PROXY_TYPE = "http"  # "http" 或 "socks5"
 
+# 任务状态与界面显示文字的对应关系
+STATUS_TEXT = {
+    STATE_WAITING: "等待下载",
+    STATE_PENDING: "排队中",
+    STATE_DOWNLOADING: "下载中",
+    STATE_COMPLETED: "已完成",
+    STATE_FAILED: "下载失败",
+}
+
 # 常用代理端口列表（用于自动探测）
 COMMON_PROXY_PORTS = {
     "http": [7897, 1080, 8080, 7890, 10809, 8118, 3128, 8000],
     "socks5": [7897, 1080, 10808, 7891, 1081, 9050]
 }
 
-# 检查是否安装了 yt-dlp
-YTDLP_AVAILABLE = importlib.util.find_spec("yt_dlp") is not None
+# 检查是否安装了 yt-dlp 和 ffmpeg（结果缓存在磁盘上，启动时不导入 yt-dlp）
+YTDLP_AVAILABLE = get_capabilities().ytdlp
 
 # 检查是否安装了 ffmpeg
 def is_ffmpeg_installed():
     """检查系统是否安装了 ffmpeg"""
-    return shutil.which('ffmpeg') is not None
+    return get_capabilities().ffmpeg
 
 # 全局变量，存储 ffmpeg 安装状态
 FFMPEG_AVAILABLE = is_ffmpeg_installed()
 
 def test_proxy(proxy_url, proxy_type="http", timeout=5):
-    """测试代理是否可用"""
-    handlers = []
-    
+    """测试代理是否可用（只使用临时的 opener，不影响正在进行的下载）"""
     try:
-        if proxy_type == "http":
-            proxy_handler = urllib.request.ProxyHandler({
-                'http': proxy_url,
-                'https': proxy_url
-            })
-            handlers.append(proxy_handler)
-        elif proxy_type == "socks5":
-            try:
-                import socks
-                # 解析主机名和端口
-                if ":" in proxy_url:
-                    host, port = proxy_url.split(":")
-                    port = int(port)
-                else:
-                    host = proxy_url
-                    port = 1080  # 默认SOCKS5端口
-                    
-                # 创建临时socket以进行测试
-                old_socket = socket.socket
-                socks.set_default_proxy(socks.PROXY_TYPE_SOCKS5, host, port)
-                socket.socket = socks.socksocket
-            except ImportError:
-                return False, "请先安装 PySocks: pip install PySocks"
-                
-        handlers.append(urllib.request.HTTPSHandler(context=ssl_context))
-        test_opener = urllib.request.build_opener(*handlers)
-        
-        # 使用较短的测试超时时间
-        old_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(timeout)
-        
-        try:
-            # 尝试访问一个简单的网站
-            response = test_opener.open("https://www.google.com", timeout=timeout)
-            content = response.read(100)
-            # 如果是SOCKS5代理，恢复旧的socket
-            if proxy_type == "socks5":
-                socket.socket = old_socket
-            socket.setdefaulttimeout(old_timeout)
-            return True, "代理测试成功"
-        except Exception as e:
-            # 确保恢复旧的socket
-            if proxy_type == "socks5":
-                socket.socket = old_socket
-            socket.setdefaulttimeout(old_timeout)
-            return False, f"代理测试失败: {str(e)}"
-            
+        test_opener = ProxyConfig.parse(proxy_url, proxy_type).build_opener(ssl_context)
     except Exception as e:
-        # 确保恢复旧的socket
-        if proxy_type == "socks5" and 'old_socket' in locals():
-            socket.socket = old_socket
         return False, f"代理配置错误: {str(e)}"
+    
+    try:
+        # 尝试访问一个简单的网站
+        response = test_opener.open("https://www.google.com", timeout=timeout)
+        response.read(100)
+        return True, "代理测试成功"
+    except Exception as e:
+        return False, f"代理测试失败: {str(e)}"
 
-def detect_local_proxies(callback=None):
-    """探测本地可能的代理"""
+def detect_local_proxies(callback=None, on_found=None):
+    """并发探测本地可能的代理
+
+    callback(进度, 已发现的代理列表) 在进度变化时调用，
+    on_found(代理) 在每发现一个代理时立即调用
+    """
     working_proxies = []
-    hosts = ["127.0.0.1", "localhost"]
-    total_tests = len(hosts) * (len(COMMON_PROXY_PORTS["http"]) + len(COMMON_PROXY_PORTS["socks5"]))
-    completed = 0
-    
-    for host in hosts:
-        # 测试HTTP代理
-        for port in COMMON_PROXY_PORTS["http"]:
-            proxy_url = f"{host}:{port}"
-            success, _ = test_proxy(proxy_url, "http", 2)
-            if success:
-                working_proxies.append({"url": proxy_url, "type": "http"})
-            completed += 1
-            if callback:
-                callback(completed / total_tests, working_proxies)
-                
-        # 测试SOCKS5代理
-        for port in COMMON_PROXY_PORTS["socks5"]:
-            try:
-                import socks
-                proxy_url = f"{host}:{port}"
-                success, _ = test_proxy(proxy_url, "socks5", 2)
-                if success:
-                    working_proxies.append({"url": proxy_url, "type": "socks5"})
-            except ImportError:
-                pass  # 如果没有安装PySocks库，跳过SOCKS5测试
-            completed += 1
-            if callback:
-                callback(completed / total_tests, working_proxies)
-    
-    return working_proxies
+    
+    def found(proxy):
+        working_proxies.append(proxy)
+        if on_found:
+            on_found(proxy)
+    
+    def progress(value):
+        if callback:
+            callback(value, list(working_proxies))
+    
+    return probe_local_proxies(["127.0.0.1", "localhost"], COMMON_PROXY_PORTS,
+                               on_found=found, on_progress=progress)
 
 def set_proxy(host=None, port=None, proxy_type="http"):
-    """设置HTTP/HTTPS或SOCKS5代理"""
+    """设置默认的HTTP/HTTPS或SOCKS5代理
+
+    只影响没有指定代理的请求（例如获取视频信息），
+    下载任务使用创建时传入的代理线路
+    """
     global USE_PROXY, PROXY_URL, PROXY_TYPE, PROXY_HOST, PROXY_PORT
     
     if host and port:
+        proxy = ProxyConfig(host, port, proxy_type)
+        set_default_route(proxy, ssl_context)
+        # 新线路上的连接要重新建立（TLS 会话可以沿用），在后台先与常用主机建立连接
+        prewarm()
         PROXY_HOST = host
         PROXY_PORT = port
         PROXY_TYPE = proxy_type
-        PROXY_URL = f"{host}:{port}"
-        
-        if proxy_type == "http" or proxy_type == "https":
-            proxy_handler = urllib.request.ProxyHandler({
-                'http': f"{proxy_type}://{host}:{port}",
-                'https': f"{proxy_type}://{host}:{port}"
-            })
-            opener = urllib.request.build_opener(
-                proxy_handler,
-                urllib.request.HTTPSHandler(context=ssl_context)
-            )
-        elif proxy_type == "socks5":
-            try:
-                import socks
-                # 设置默认的SOCKS5代理
-                socks.set_default_proxy(socks.PROXY_TYPE_SOCKS5, host, port)
-                socket.socket = socks.socksocket
-                
-                # 为urllib建立opener
-                opener = urllib.request.build_opener(
-                    urllib.request.HTTPSHandler(context=ssl_context)
-                )
-            except ImportError:
-                raise ImportError("使用SOCKS5代理需要安装PySocks库: pip install PySocks")
-        else:
-            raise ValueError(f"不支持的代理类型: {proxy_type}, 支持的类型有: http, https, socks5")
-            
-        urllib.request.install_opener(opener)
+        PROXY_URL = proxy.address
         USE_PROXY = True
         return True
     else:
-        # 如果之前设置了SOCKS5代理，需要恢复默认socket
-        if PROXY_TYPE == "socks5" and USE_PROXY:
-            try:
-                # 恢复默认socket
-                socket.socket = socket._socketobject
-            except:
-                # 如果失败，尝试其他方法恢复
-                import socket as socket_module
-                socket.socket = socket_module.socket
-            
         # 重置为无代理状态
-        opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-        urllib.request.install_opener(opener)
+        set_default_route(ssl_context=ssl_context)
         USE_PROXY = False
         PROXY_URL = None
         PROXY_HOST = None
@@ -349,17 +279,18 @@ class ProxyDialog(QDialog):
         # 创建探测线程
         self.detect_thread = ProxyDetectThread()
         self.detect_thread.progress_signal.connect(self.update_detect_progress)
+        self.detect_thread.found_signal.connect(self.add_detected_proxy)
         self.detect_thread.finished_signal.connect(self.detection_finished)
         self.detect_thread.start()
     
-    def update_detect_progress(self, progress, proxies):
+    def update_detect_progress(self, progress):
         """更新探测进度"""
         self.progress_label.setText(f"探测进度: {int(progress * 100)}%")
-        
-        # 更新列表
-        self.proxy_list.clear()
-        for proxy in proxies:
-            self.proxy_list.addItem(f"{proxy['type']}: {proxy['url']}")
+    
+    def add_detected_proxy(self, proxy):
+        """探测到代理后立即加入列表，同时加入代理池供下载任务使用（代理池按主机和端口去重）"""
+        self.proxy_list.addItem(f"{proxy['type']}: {proxy['url']}")
+        get_proxy_pool().add(ProxyConfig.parse(proxy['url'], proxy['type']))
             
     def detection_finished(self, proxies):
         """探测完成"""
@@ -394,104 +325,231 @@ class ProxyDialog(QDialog):
 
 class ProxyDetectThread(QThread):
     """代理探测线程"""
-    progress_signal = pyqtSignal(float, list)  # 进度, 已发现的代理列表
+    progress_signal = pyqtSignal(float)  # 进度
+    found_signal = pyqtSignal(dict)  # 新发现的代理
     finished_signal = pyqtSignal(list)  # 所有找到的代理
     
     def run(self):
-        detect_local_proxies(lambda progress, proxies: 
-                            self.progress_signal.emit(progress, proxies))
-        
-        # 获取最终结果
-        working_proxies = detect_local_proxies()
+        working_proxies = detect_local_proxies(
+            lambda progress, proxies: self.progress_signal.emit(progress),
+            on_found=self.found_signal.emit
+        )
         self.finished_signal.emit(working_proxies)
 
-class DownloadThread(QThread):
-    """下载视频的线程"""
+class BulkAddDialog(QDialog):
+    """批量添加视频对话框"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("批量添加视频")
+        self.resize(550, 400)
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #121212;
+            }
+            QLabel {
+                color: #e0e0e0;
+            }
+            QTextEdit, QComboBox {
+                background-color: #2a2a2a;
+                color: #e0e0e0;
+                border: 1px solid #3a3a3a;
+                border-radius: 4px;
+                padding: 6px;
+            }
+            QPushButton {
+                background-color: #3a75b0;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                padding: 8px 16px;
+            }
+            QPushButton:hover {
+                background-color: #4a85c0;
+            }
+        """)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.addWidget(QLabel("每行一个视频链接，也可以是播放列表或频道链接:"))
+        
+        self.url_edit = QTextEdit()
+        self.url_edit.setPlaceholderText("https://www.youtube.com/watch?v=...\nhttps://www.youtube.com/playlist?list=...")
+        layout.addWidget(self.url_edit)
+        
+        # 从文件导入和分辨率选择
+        option_layout = QHBoxLayout()
+        self.import_btn = QPushButton("从文件导入")
+        self.import_btn.clicked.connect(self.import_file)
+        option_layout.addWidget(self.import_btn)
+        option_layout.addStretch()
+        option_layout.addWidget(QLabel("分辨率:"))
+        self.res_combo = QComboBox()
+        self.res_combo.addItems(["最高质量", "1080p", "720p", "480p", "360p", "仅音频"])
+        self.res_combo.setCurrentText("720p")
+        option_layout.addWidget(self.res_combo)
+        layout.addLayout(option_layout)
+        
+        btn_layout = QHBoxLayout()
+        cancel_btn = QPushButton("取消")
+        cancel_btn.clicked.connect(self.reject)
+        ok_btn = QPushButton("添加")
+        ok_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(cancel_btn)
+        btn_layout.addStretch()
+        btn_layout.addWidget(ok_btn)
+        layout.addLayout(btn_layout)
+    
+    def import_file(self):
+        """从文本文件导入链接"""
+        path, _ = QFileDialog.getOpenFileName(self, "选择链接列表文件", "", "文本文件 (*.txt);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            urls = read_url_file(path)
+        except OSError as e:
+            QMessageBox.warning(self, "导入失败", str(e))
+            return
+        current = self.url_edit.toPlainText().strip()
+        self.url_edit.setPlainText("\n".join(([current] if current else []) + urls))
+    
+    def get_urls(self):
+        """返回去重后的链接列表"""
+        return parse_urls(self.url_edit.toPlainText())
+
+class BulkIntakeThread(QThread):
+    """批量解析视频链接的线程"""
+    item_signal = pyqtSignal(dict)  # 解析出的视频信息
+    error_signal = pyqtSignal(str, str)  # 链接, 错误信息
+    progress_signal = pyqtSignal(int, int)  # 已完成数, 已知总数
+    finished_signal = pyqtSignal(int)  # 添加的视频数
+    skipped_signal = pyqtSignal(str)  # 下载存档中已有、没有解析的链接
+    
+    def __init__(self, urls, parent=None, skip=None):
+        super().__init__(parent)
+        self.urls = urls
+        proxy_opts = {}
+        if USE_PROXY and PROXY_URL:
+            proxy_opts = {'proxy': f"{PROXY_TYPE}://{PROXY_URL}"}
+        self.intake = BulkIntake(resolve_video_info, proxy_opts=proxy_opts, skip=skip)
+    
+    def cancel(self):
+        self.intake.cancel()
+    
+    def run(self):
+        added = self.intake.run(
+            self.urls,
+            on_item=self.item_signal.emit,
+            on_error=self.error_signal.emit,
+            on_progress=self.progress_signal.emit,
+            on_skip=self.skipped_signal.emit
+        )
+        self.finished_signal.emit(added)
+
+class DownloadThread(QObject):
+    """下载视频的任务，由下载调度器的工作线程执行 run()"""
+    started_signal = pyqtSignal(int)
     progress_signal = pyqtSignal(int, int)
-    finished_signal = pyqtSignal(int, str)
+    finished_signal = pyqtSignal(int, str, list)  # 任务ID, 文件路径, 字幕文件路径
     error_signal = pyqtSignal(int, str)
     warning_signal = pyqtSignal(str)  # 新增警告信号，用于非致命性错误提示
+    postprocessing_signal = pyqtSignal(int)  # 下载完成，文件已交给后处理工作池
     
-    def __init__(self, idx, video, download_path, proxy_host=None, proxy_port=None, proxy_type=None):
+    def __init__(self, job_id, video, download_path, proxy=None, progress_bus=None, postprocessor=None, weight=1.0,
+                 proxy_pool=None, scheduler=None):
         super().__init__()
-        self.idx = idx
+        self.job_id = job_id
         self.video = video
         self.download_path = download_path
-        self.proxy_host = proxy_host
-        self.proxy_port = proxy_port
-        self.proxy_type = proxy_type
-        self.max_retries = 5  # 最大重试次数
-        self.retry_delay = 3  # 重试延迟时间（秒）
+        self.proxy = proxy  # ProxyConfig，None 表示使用默认线路；使用代理池时为优先选择的代理
+        self.proxy_pool = proxy_pool  # 设置后从代理池中选择线路，代理出错时换到另一个代理
+        self.lease = None
+        self.progress_bus = progress_bus  # 设置后进度由界面定时汇总，不再逐块发信号
+        self.postprocessor = postprocessor or get_postprocessor()  # MP3 转换和音频检查不占用下载线程
+        self.weight = weight  # 分配全局限速时的权重
+        self.scheduler = scheduler  # 所在的调度器，按其当前的并发上限分配 ffmpeg 线程
+        self.archived = False  # 下载引擎（yt-dlp）已把完成的文件记入下载存档
+        self.max_retries = 5  # 连续失败（期间没有新数据）的最大尝试次数
+        self.retry_delay = 3  # 第一次重试的基础等待时间（秒），之后按指数增长并随机抖动
+        self.downloaded = 0  # 本任务上报过的最大已下载字节数，用于判断两次失败之间是否有进展
         
     def run(self):
-        """运行线程"""
-        retry_count = 0
-        last_error = None
-        
-        while retry_count < self.max_retries:
+        """运行下载任务"""
+        # 所有传输计入该任务的限速；代理从代理池租用，任务结束时归还
+        with get_limiter().register(self.job_id, self.weight) as limit, limited(limit), \
+                ProxyLease(self.proxy_pool, ssl_context, preferred=self.proxy) as self.lease:
+            self.run_with_retries()
+    
+    def attempt_route(self):
+        """本次尝试使用租用的代理
+
+        pytubefix 和断点续传的请求在本线程内走该代理，分段下载中途代理出错时通过租约换到另一个代理。
+        """
+        self.proxy = self.lease.proxy
+        return routed(self.proxy, ssl_context, self.lease.failover)
+    
+    def run_with_retries(self):
+        """按引擎下载，出错时按错误类型决定是否重试
+
+        网络错误换到另一个代理（或退避等待）后从 .part 文件的中断处继续；被限流时等待更久；
+        流地址失效或提取失败时重新提取后再试；视频不可用等永久错误不再重试。
+        """
+        retry = RetryState(RetryPolicy(max_attempts=self.max_retries, base_delay=self.retry_delay))
+        # 根据视频信息中的引擎选择下载方法
+        engine = getattr(self.video, 'engine', 'auto')
+        use_ytdlp = engine == 'yt-dlp' or (engine == 'auto' and YTDLP_AVAILABLE)
+        self.started_signal.emit(self.job_id)
+        
+        while True:
             try:
-                # 根据视频信息中的引擎选择下载方法
-                engine = getattr(self.video, 'engine', 'auto')
-                
-                if engine == 'yt-dlp' or (engine == 'auto' and YTDLP_AVAILABLE):
-                    # 使用 yt-dlp 下载
-                    self.download_with_ytdlp()
-                    return
-                else:
-                    # 使用 pytubefix 下载
-                    self.download_with_pytube()
-                    return
+                with self.attempt_route():
+                    if use_ytdlp:
+                        self.download_with_ytdlp()
+                    else:
+                        self.download_with_pytube()
+                return
                     
             except Exception as e:
-                last_error = str(e)
-                
-                # 检查特定的警告信息
-                if "ANDROID_VR client returned: This video is not available" in last_error or "Switching to client: TV" in last_error:
-                    # 发送警告信号，但不中断下载
-                    self.warning_signal.emit(last_error)
-                    # 继续尝试下载
-                    retry_count += 1
-                    if retry_count < self.max_retries:
-                        time.sleep(self.retry_delay)
-                        continue
+                delay = retry.next_delay(e, self.downloaded)
+                if is_expired_error(e) or retry.last_kind == EXTRACTOR:
+                    # 流地址已失效或提取失败，下次重试重新获取播放器信息
+                    forget_youtube(self.video.url)
+                if delay is None:
+                    break
                 
-                # 检查是否为 SSL 错误
-                if "SSL" in last_error or "EOF occurred" in last_error or "连接错误" in last_error:
-                    if retry_count < self.max_retries:
-                        time.sleep(self.retry_delay)
-                        continue
-                    
-                    # 如果是 SSL 错误且 pytubefix 失败，尝试使用 yt-dlp
-                    if YTDLP_AVAILABLE and engine != 'yt-dlp':
-                        try:
-                            self.download_with_ytdlp()
-                            return
-                        except Exception as ytdlp_error:
-                            last_error = f"pytubefix 失败: {last_error}\n\nyt-dlp 失败: {str(ytdlp_error)}"
-                
-                # 其他错误或重试次数用尽
-                break
+                if retry.last_kind == EXTRACTOR:
+                    # 客户端被拒绝等提取问题：发送警告，重新提取后继续尝试
+                    self.warning_signal.emit(str(e))
+                elif retry.last_kind == TRANSIENT and self.lease.failover(e) is not None:
+                    # 下一次尝试换到另一个健康的代理，从 .part 文件的中断处继续，不必等待
+                    self.warning_signal.emit(f"代理出错，已切换到 {self.lease.proxy.url} 继续下载")
+                    continue
+                elif retry.last_kind == THROTTLED:
+                    self.warning_signal.emit(f"请求过于频繁，{delay:.0f} 秒后重试")
+                time.sleep(delay)
+        
+        last_error = str(retry.last_error)
+        # pytubefix 重试用尽（不是视频本身的问题）时改用 yt-dlp，已下载的 .part 文件不受影响
+        if not use_ytdlp and YTDLP_AVAILABLE and retry.last_kind != PERMANENT:
+            try:
+                with self.attempt_route():
+                    self.download_with_ytdlp()
+                return
+            except Exception as ytdlp_error:
+                last_error = f"pytubefix 失败: {last_error}\n\nyt-dlp 失败: {str(ytdlp_error)}"
         
         # 所有重试都失败了
         error_msg = f"下载失败: {last_error}"
-        if "SSL" in str(last_error):
+        if retry.last_kind == TRANSIENT:
             error_msg += "\n\n这可能是由于 SSL 证书问题或网络连接问题导致的。请检查您的网络连接和代理设置。"
         
-        self.error_signal.emit(self.idx, error_msg)
+        self.error_signal.emit(self.job_id, error_msg)
     
     def download_with_pytube(self):
-        """使用 pytubefix 下载视频"""
-        # 设置代理
-        if self.proxy_host and self.proxy_port:
-            os.environ['HTTP_PROXY'] = f"{self.proxy_type}://{self.proxy_host}:{self.proxy_port}"
-            os.environ['HTTPS_PROXY'] = f"{self.proxy_type}://{self.proxy_host}:{self.proxy_port}"
-        
+        """使用 pytubefix 下载视频（代理由 run() 按线程设置）"""
         try:
-            # 创建 YouTube 对象
-            yt = YouTube(
-                self.video.url,
-                on_progress_callback=lambda stream, chunk, bytes_remaining: self.update_progress(stream, bytes_remaining)
-            )
+            # 复用批量添加或上一次尝试时已获取播放器信息的 YouTube 对象
+            # 进度由 download_stream 汇报，共用的对象上不设置回调
+            yt = get_youtube(self.video.url)
             
             # 选择要下载的流
             if self.video.resolution == "仅音频":
@@ -500,24 +558,11 @@ class DownloadThread(QThread):
                 if not stream:
                     raise Exception("无法找到合适的音频流")
                     
-                # 下载音频
-                file_path = stream.download(output_path=self.download_path)
+                # 下载音频（支持断点续传）
+                file_path = download_stream(stream, self.download_path, on_progress=self.pytube_progress)
                 
-                # 如果有ffmpeg，转换为mp3格式
-                if FFMPEG_AVAILABLE:
-                    try:
-                        import subprocess
-                        mp3_path = os.path.splitext(file_path)[0] + ".mp3"
-                        subprocess.run(['ffmpeg', '-i', file_path, '-vn', '-ar', '44100', '-ac', '2', '-b:a', '192k', mp3_path], 
-                                      check=True, capture_output=True)
-                        # 删除原始文件
-                        os.remove(file_path)
-                        file_path = mp3_path
-                    except Exception as e:
-                        self.warning_signal.emit(f"转换为MP3格式失败: {str(e)}")
-                
-                # 发送完成信号
-                self.finished_signal.emit(self.idx, file_path)
+                # 如果有ffmpeg，交给后处理工作池转换为mp3格式
+                self.hand_off(file_path, convert_mp3=FFMPEG_AVAILABLE)
                 return
             else:
                 # 尝试找到指定分辨率的流
@@ -537,47 +582,33 @@ class DownloadThread(QThread):
             # 检查是否是自适应流（没有音频）
             has_audio = stream.includes_audio_track
             
-            # 下载视频
-            file_path = stream.download(output_path=self.download_path)
-            
-            # 如果视频没有音频，尝试下载并合并音频
+            # 自适应流没有音频：视频和音频同时下载，边下载边合并
+            audio_stream = None
             if not has_audio and FFMPEG_AVAILABLE:
-                try:
-                    # 获取最佳音频流
-                    audio_stream = yt.streams.filter(only_audio=True).first()
-                    if audio_stream:
-                        # 下载音频
-                        audio_path = audio_stream.download(output_path=self.download_path, 
-                                                          filename=f"audio_{os.path.basename(file_path)}")
-                        
-                        # 合并视频和音频
-                        import subprocess
-                        output_path = os.path.join(self.download_path, f"merged_{os.path.basename(file_path)}")
-                        subprocess.run(['ffmpeg', '-i', file_path, '-i', audio_path, '-c:v', 'copy', 
-                                        '-c:a', 'aac', '-map', '0:v:0', '-map', '1:a:0', output_path], 
-                                      check=True, capture_output=True)
-                        
-                        # 删除原始文件
-                        os.remove(file_path)
-                        os.remove(audio_path)
-                        
-                        # 重命名合并后的文件
-                        os.rename(output_path, file_path)
-                    else:
-                        self.warning_signal.emit("视频可能没有音频，无法找到合适的音频流")
-                except Exception as e:
-                    self.warning_signal.emit(f"合并音频失败: {str(e)}")
+                audio_stream = pick_audio_stream(yt, stream)
+                if not audio_stream:
+                    self.warning_signal.emit("视频可能没有音频，无法找到合适的音频流")
             elif not has_audio and not FFMPEG_AVAILABLE:
                 self.warning_signal.emit("视频可能没有音频。未检测到ffmpeg，无法合并音频。")
             
-            # 检查视频是否包含音频
-            if FFMPEG_AVAILABLE:
-                self.check_audio_in_video(file_path)
+            if audio_stream:
+                file_path = download_and_mux(stream, audio_stream, self.download_path,
+                                             on_progress=self.report_progress)
+            else:
+                # 下载视频（支持断点续传）
+                file_path = download_stream(stream, self.download_path, on_progress=self.pytube_progress)
             
-            # 发送完成信号
-            self.finished_signal.emit(self.idx, file_path)
+            # 检查视频是否包含音频（在后处理工作池中进行）
+            self.hand_off(file_path, check_audio=FFMPEG_AVAILABLE)
             
+        except DownloadInterrupted:
+            # 已下载的部分保留在 .part 文件中，交给 run() 的重试循环续传
+            raise
         except Exception as e:
+            if classify(e) != EXTRACTOR:
+                # 网络错误和限流交给 run() 的重试循环（换线路、退避后续传）；视频不可用等永久错误
+                # 换下载方法也不会成功，直接结束。只有提取失败时才换用其他客户端或 yt-dlp
+                raise
             error_msg = str(e)
             # 检查特定的警告信息
             if "ANDROID_VR client returned: This video is not available" in error_msg or "Switching to client: TV" in error_msg:
@@ -586,9 +617,8 @@ class DownloadThread(QThread):
                 # 如果是警告信息，继续尝试下载
                 try:
                     # 重试下载，使用不同的客户端
-                    yt = YouTube(
+                    yt = get_youtube(
                         self.video.url,
-                        on_progress_callback=lambda stream, chunk, bytes_remaining: self.update_progress(stream, bytes_remaining),
                         use_oauth=True,
                         allow_oauth_cache=True
                     )
@@ -602,14 +632,13 @@ class DownloadThread(QThread):
                                 yt.streams.get_highest_resolution()
                     
                     if stream:
-                        file_path = stream.download(output_path=self.download_path)
+                        file_path = download_stream(stream, self.download_path, on_progress=self.pytube_progress)
                         
                         # 检查视频是否包含音频
-                        if FFMPEG_AVAILABLE and self.video.resolution != "仅音频":
-                            self.check_audio_in_video(file_path)
-                            
-                        self.finished_signal.emit(self.idx, file_path)
+                        self.hand_off(file_path, check_audio=FFMPEG_AVAILABLE and self.video.resolution != "仅音频")
                         return
+                except DownloadInterrupted:
+                    raise
                 except Exception as retry_error:
                     # 如果重试失败，抛出原始错误
                     raise Exception(f"{error_msg}\n\n重试失败: {str(retry_error)}")
@@ -627,142 +656,95 @@ class DownloadThread(QThread):
             raise e
     
     def download_with_ytdlp(self):
-        """使用 yt-dlp 下载视频"""
-        import yt_dlp
-        
-        # 设置代理
-        proxy_opts = {}
-        if self.proxy_host and self.proxy_port:
-            proxy_url = f"{self.proxy_type}://{self.proxy_host}:{self.proxy_port}"
-            proxy_opts = {'proxy': proxy_url}
+        """使用 yt-dlp 下载视频（由共享的下载引擎执行）"""
+        # 代理只作用于本任务
+        proxy = self.proxy.url if self.proxy else None
         
         # 创建文件名
         safe_title = re.sub(r'[\\/*?:"<>|]', '', self.video.title)
-        output_file = os.path.join(self.download_path, f"{safe_title}.mp4")
-        
-        # 设置格式
-        if self.video.resolution == "仅音频":
-            format_spec = 'bestaudio/best'
-            output_file = os.path.join(self.download_path, f"{safe_title}.mp3")
-        elif self.video.resolution == "最高质量":
-            # 确保获取最高质量的视频和音频并合并
-            format_spec = 'bestvideo+bestaudio/best'
-        else:
-            # 根据选定的分辨率获取视频和音频
-            height = self.video.resolution.replace('p', '')
-            format_spec = f'bestvideo[height<={height}]+bestaudio/best[height<={height}]'
-        
-        # 创建 yt-dlp 选项 - 优化下载速度
-        ydl_opts = {
-            'format': format_spec,
-            'outtmpl': output_file,
-            'no_check_certificate': True,  # 避免SSL证书问题
-            'progress_hooks': [self.ytdlp_progress_hook],
+        
+        # 如果 ffmpeg 不可用，只能下载包含音频的单一格式
+        if not FFMPEG_AVAILABLE:
+            if self.video.resolution == "仅音频":
+                # 警告用户没有ffmpeg可能导致音频质量降低
+                self.warning_signal.emit("未检测到ffmpeg，音频质量可能受到影响。")
+            else:
+                self.warning_signal.emit("未检测到ffmpeg，无法合并单独的视频和音频流。将下载包含音频的单一视频流，质量可能较低。")
+        
+        extra_opts = {
             'quiet': False,
             'no_warnings': False,  # 允许警告，以便捕获
             'logger': self.ytdlp_logger(),  # 自定义日志处理
             'merge_output_format': 'mp4',  # 强制使用mp4作为输出格式
-            # 优化下载速度的参数
-            'concurrent_fragments': 5,     # 并发下载片段数，提高到5个
-            'retries': 10,                 # 重试次数增加到10次
-            'fragment_retries': 10,        # 片段重试次数
-            'buffersize': 1024*1024*16,    # 增加缓冲区到16MB
-            'http_chunk_size': 10485760,   # 10MB的块大小，提高吞吐量
-            'socket_timeout': 30,          # 增加超时时间
-            'extractor_retries': 5,        # 提取器重试次数
-            'file_access_retries': 5,      # 文件访问重试
-            'postprocessor_args': {        # FFmpeg后处理参数
-                'ffmpeg': ['-threads', '4', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k']  # 使用4个线程进行处理，复制视频流，使用AAC编码音频
-            },
-            **proxy_opts
         }
+        if FFMPEG_AVAILABLE:
+            # 复制视频流，使用AAC编码音频；线程数取全局 ffmpeg 线程预算的一份
+            extra_opts['postprocessor_args'] = {
+                'ffmpeg': ffmpeg_thread_args(self.concurrency()) + ['-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k']
+            }
         
-        # 根据用户选择添加字幕下载选项
-        if hasattr(self.video, 'download_subtitles') and self.video.download_subtitles:
-            ydl_opts.update({
-                'writesubtitles': True,        # 下载字幕
-                'writeautomaticsub': True,     # 下载自动生成的字幕
-                'subtitleslangs': ['zh-CN', 'zh-TW', 'en'],  # 优先下载中文和英文字幕
-                'subtitlesformat': 'srt',      # 使用SRT格式字幕
-            })
+        request = DownloadRequest(
+            self.video.url,
+            resolution=self.video.resolution,
+            output_path=self.download_path,
+            proxy=proxy,
+            outtmpl=os.path.join(self.download_path, f"{safe_title}.%(ext)s"),
+            subtitles=getattr(self.video, 'download_subtitles', False),
+            ffmpeg=FFMPEG_AVAILABLE,
+            fallback_format='best',
+            extra_opts=extra_opts
+        )
+        # 文件和字幕的路径由下载引擎从 yt-dlp 的结果中取得
+        job = get_engine().run_job(
+            request,
+            on_progress=self.ytdlp_progress_hook,
+            on_warning=self.warning_signal.emit
+        )
+        self.archived = True
         
-        # 如果 ffmpeg 不可用，使用单一格式
-        if not FFMPEG_AVAILABLE and resolution != "仅音频":
-            if self.video.resolution == "仅音频":
-                ydl_opts['format'] = 'bestaudio/best'
-                # 警告用户没有ffmpeg可能导致音频质量降低
-                self.warning_signal.emit("未检测到ffmpeg，音频质量可能受到影响。")
-            else:
-                # 对于视频，使用单一格式（包含音频的格式）
-                height = self.video.resolution.replace('p', '')
-                ydl_opts['format'] = f'best[height<={height}]/best'
-                # 警告用户没有ffmpeg可能导致无法获取最佳质量
-                self.warning_signal.emit("未检测到ffmpeg，无法合并单独的视频和音频流。将下载包含音频的单一视频流，质量可能较低。")
+        # 如果不是仅音频模式，检查视频是否包含音频
+        self.hand_off(job.filepath, check_audio=self.video.resolution != "仅音频" and FFMPEG_AVAILABLE,
+                      subtitles=job.subtitle_files)
+    
+    def concurrency(self):
+        """可能同时进行的下载数（调度器当前的并发上限，界面上可以随时调整）"""
+        if self.scheduler is not None:
+            return self.scheduler.max_concurrent
+        return MAX_CONCURRENT_DOWNLOADS
+    
+    def hand_off(self, file_path, convert_mp3=False, check_audio=False, subtitles=None):
+        """下载完成后把需要 ffmpeg 处理的文件交给后处理工作池，下载线程立即去执行下一个任务"""
+        subtitles = list(subtitles or [])
+        if not (convert_mp3 or check_audio):
+            self.finished_signal.emit(self.job_id, file_path, subtitles)
+            return
         
-        try:
-            # 下载视频
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([self.video.url])
-            
-            # 验证文件是否存在
-            if not os.path.exists(output_file):
-                # 尝试查找可能的输出文件（yt-dlp有时会修改文件名）
-                possible_files = [f for f in os.listdir(self.download_path) if safe_title in f]
-                if possible_files:
-                    output_file = os.path.join(self.download_path, possible_files[0])
-                else:
-                    raise Exception("下载完成，但找不到输出文件")
-            
-            # 如果不是仅音频模式，检查视频是否包含音频
-            if self.video.resolution != "仅音频" and FFMPEG_AVAILABLE:
-                self.check_audio_in_video(output_file)
-            
-            # 发送完成信号
-            self.finished_signal.emit(self.idx, output_file)
-            
-        except Exception as e:
-            # 如果出现错误，尝试使用更简单的格式重新下载
-            error_msg = str(e)
-            self.warning_signal.emit(f"下载过程中出现问题: {error_msg}\n尝试使用备用方法下载...")
-            
-            try:
-                # 使用更简单的格式配置
-                ydl_opts['format'] = 'best'
-                ydl_opts['merge_output_format'] = 'mp4'
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([self.video.url])
-                
-                # 验证文件是否存在
-                if not os.path.exists(output_file):
-                    possible_files = [f for f in os.listdir(self.download_path) if safe_title in f]
-                    if possible_files:
-                        output_file = os.path.join(self.download_path, possible_files[0])
-                
-                # 发送完成信号
-                self.finished_signal.emit(self.idx, output_file)
-            except Exception as retry_error:
-                # 如果重试失败，抛出原始错误
-                raise Exception(f"下载失败: {error_msg}\n\n重试失败: {str(retry_error)}")
-    
-    def check_audio_in_video(self, file_path):
-        """检查视频文件是否包含音频流"""
-        if not FFMPEG_AVAILABLE:
+        self.postprocessing_signal.emit(self.job_id)
+        if convert_mp3:
+            future = self.postprocessor.submit(convert_to_mp3, file_path)
+        else:
+            future = self.postprocessor.submit(has_audio_stream, file_path)
+        future.add_done_callback(lambda f: self.postprocess_done(f, file_path, convert_mp3, subtitles))
+    
+    def postprocess_done(self, future, file_path, convert_mp3, subtitles):
+        """后处理完成回调（在后处理工作池的线程中调用）"""
+        if future.cancelled():
+            # 程序退出时丢弃的任务，下次启动时重新下载
             return
-            
-        try:
-            import subprocess
-            
-            # 使用ffprobe检查视频文件的音频流
-            cmd = ['ffprobe', '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=codec_type', '-of', 'default=noprint_wrappers=1', file_path]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            # 如果没有音频流，输出将为空
-            if not result.stdout.strip():
-                self.warning_signal.emit(f"警告：下载的视频文件 {os.path.basename(file_path)} 不包含音频流。这可能是由于YouTube的限制或下载过程中的问题。")
-        except Exception as e:
+        error = future.exception()
+        if convert_mp3:
+            if error is not None:
+                self.warning_signal.emit(f"转换为MP3格式失败: {str(error)}")
+            else:
+                file_path = future.result()
+        elif error is not None:
             # 如果检查过程出错，发出警告但不中断下载
-            self.warning_signal.emit(f"无法检查视频是否包含音频: {str(e)}")
+            self.warning_signal.emit(f"无法检查视频是否包含音频: {str(error)}")
+        elif not future.result():
+            self.warning_signal.emit(f"警告：下载的视频文件 {os.path.basename(file_path)} 不包含音频流。这可能是由于YouTube的限制或下载过程中的问题。")
+        
+        # 发送完成信号
+        self.finished_signal.emit(self.job_id, file_path, subtitles)
     
     def ytdlp_logger(self):
         """创建自定义的yt-dlp日志处理器，用于捕获警告信息"""
@@ -789,72 +771,63 @@ class DownloadThread(QThread):
                 
         return YtdlpLogger(self)
     
+    def pytube_progress(self, stream, chunk, bytes_remaining):
+        """断点续传下载的进度回调（参数与 pytubefix 的 on_progress_callback 相同）"""
+        self.update_progress(stream, bytes_remaining)
+    
     def update_progress(self, stream, bytes_remaining):
         """更新下载进度"""
         file_size = stream.filesize
-        bytes_downloaded = file_size - bytes_remaining
-        progress = int(bytes_downloaded / file_size * 100)
-        self.progress_signal.emit(self.idx, progress)
+        self.report_progress(file_size - bytes_remaining, file_size)
+    
+    def report_progress(self, downloaded, total):
+        """上报已下载字节数"""
+        self.downloaded = max(self.downloaded, downloaded)
+        if self.lease is not None:
+            # 按代理统计吞吐量
+            self.lease.progress(downloaded)
+        if self.progress_bus is not None:
+            self.progress_bus.report(self.job_id, downloaded, total)
+        elif total > 0:
+            self.progress_signal.emit(self.job_id, int(downloaded / total * 100))
     
     def ytdlp_progress_hook(self, d):
         """yt-dlp 进度回调"""
         if d['status'] == 'downloading':
             total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
             if total_bytes > 0:
-                downloaded_bytes = d.get('downloaded_bytes', 0)
-                progress = int(downloaded_bytes / total_bytes * 100)
-                self.progress_signal.emit(self.idx, progress)
+                self.report_progress(d.get('downloaded_bytes', 0), total_bytes)
         elif d['status'] == 'error':
             # 如果有错误信息，检查是否为特定警告
             error_msg = d.get('error', '')
             if "ANDROID_VR client returned: This video is not available" in error_msg or "Switching to client: TV" in error_msg:
                 self.warning_signal.emit(error_msg)
-    
-    def download_finished(self, idx, file_path):
-        """下载完成回调"""
-        if 0 <= idx < len(self.videos):
-            self.videos[idx].status = "已完成"
-            self.videos[idx].progress = 100
-            
-            # 检查是否同时下载了字幕文件
-            subtitle_files = []
-            base_path = os.path.splitext(file_path)[0]
-            for ext in ['.zh-CN.srt', '.zh-TW.srt', '.en.srt', '.srt']:
-                if os.path.exists(base_path + ext):
-                    subtitle_files.append(os.path.basename(base_path + ext))
-            
-            # 构建消息
-            message = f"视频已下载到:\n{file_path}"
-            if subtitle_files:
-                message += f"\n\n同时下载了以下字幕文件:\n" + "\n".join(subtitle_files)
-            
-            QMessageBox.information(self, "下载完成", message)
-            
-            # 清理线程引用
-            if idx in self.download_threads:
-                del self.download_threads[idx]
-    
-    def download_error(self, idx, error_msg):
-        """下载错误回调"""
-        if 0 <= idx < len(self.videos):
-            self.videos[idx].status = "下载失败"
-            QMessageBox.warning(self, "下载错误", error_msg)
-            
-            # 清理线程引用
-            if idx in self.download_threads:
-                del self.download_threads[idx]
 
 class VideoItem:
     """视频项目类，用于存储视频信息"""
-    def __init__(self, title, author, url, resolution, engine="auto"):
+    def __init__(self, title, author, url, resolution, engine="auto", job_id=None):
+        self.job_id = job_id
         self.title = title
         self.author = author
         self.url = url
         self.resolution = resolution
         self.status = "等待下载"
         self.progress = 0
+        self.speed = 0.0  # 当前下载速度（字节/秒）
+        self.eta = None   # 预计剩余时间（秒）
         self.engine = engine
         self.download_subtitles = True  # 默认下载字幕
+        self.list_item = None  # 对应的列表项
+    
+    @classmethod
+    def from_job(cls, job):
+        """从任务存储中的记录创建视频项目"""
+        video = cls(job['title'], job['author'], job['url'], job['resolution'],
+                    job['engine'] or "auto", job_id=job['id'])
+        video.status = STATUS_TEXT.get(job['state'], "等待下载")
+        video.progress = job['progress'] or 0
+        video.download_subtitles = bool(job['download_subtitles'])
+        return video
 
 class MainWindow(QMainWindow):
     """主窗口"""
@@ -864,20 +837,41 @@ class MainWindow(QMainWindow):
         self.resize(800, 600)
         
         # 初始化变量
-        self.videos = []
+        self.job_store = JobStore()
+        self.archive = get_archive()  # 已下载完成的视频，添加和下载前查询
+        if not len(self.archive):
+            # 第一次使用存档时从已完成的任务导入
+            self.archive.import_jobs(self.job_store.jobs(STATE_COMPLETED),
+                                     lambda job: archive_format(job['resolution']))
+        self.videos = {}  # 任务ID -> VideoItem（按添加顺序）
         self.download_threads = {}
         self.download_path = DEFAULT_DOWNLOAD_PATH
-        self.proxy_host = None
-        self.proxy_port = None
-        self.proxy_type = "http"
+        self.proxy = None  # 新建下载任务优先使用的代理线路
+        self.proxy_pool = get_proxy_pool()  # 可用的代理，下载任务按健康得分分散到各个代理
+        
+        # 下载调度器：限制同时进行的下载数量并复用工作线程
+        self.scheduler = DownloadScheduler(MAX_CONCURRENT_DOWNLOADS, MAX_DOWNLOADS_PER_HOST)
+        
+        # 下载进度汇总，按固定频率刷新界面
+        self.progress_bus = ProgressBus()
+        
+        # 缩略图在后台加载并缓存
+        self.thumbnails = ThumbnailLoader(self)
         
         # 设置界面
         self.init_ui()
         
+        self.progress_timer = QTimer(self)
+        self.progress_timer.timeout.connect(self.refresh_progress)
+        self.progress_timer.start(PROGRESS_REFRESH_MS)
+        
         # 检查 yt-dlp 和 ffmpeg 是否已安装
         self.check_ytdlp_installed()
         self.check_ffmpeg_installed()
         
+        # 恢复上次的下载队列
+        self.restore_jobs()
+        
     def init_ui(self):
         """初始化界面"""
         # 创建中央窗口部件
@@ -891,6 +885,7 @@ class MainWindow(QMainWindow):
         
         # 视频列表
         self.video_list = QListWidget()
+        self.video_list.setIconSize(QSize(*LIST_THUMBNAIL_SIZE))
         self.video_list.setStyleSheet("""
             QListWidget {
                 background-color: #1e1e1e;
@@ -916,6 +911,11 @@ class MainWindow(QMainWindow):
         self.add_btn.clicked.connect(self.add_video)
         btn_layout.addWidget(self.add_btn)
         
+        # 批量添加按钮
+        self.bulk_add_btn = QPushButton("批量添加")
+        self.bulk_add_btn.clicked.connect(self.bulk_add)
+        btn_layout.addWidget(self.bulk_add_btn)
+        
         # 下载选中视频按钮
         self.download_selected_btn = QPushButton("下载选中")
         self.download_selected_btn.clicked.connect(self.download_selected)
@@ -926,6 +926,11 @@ class MainWindow(QMainWindow):
         self.download_all_btn.clicked.connect(self.download_all)
         btn_layout.addWidget(self.download_all_btn)
         
+        # 清除已完成任务按钮
+        self.clear_completed_btn = QPushButton("清除已完成")
+        self.clear_completed_btn.clicked.connect(self.clear_completed)
+        btn_layout.addWidget(self.clear_completed_btn)
+        
         # 设置下载路径按钮
         self.path_btn = QPushButton("下载路径")
         self.path_btn.clicked.connect(self.set_download_path)
@@ -936,12 +941,39 @@ class MainWindow(QMainWindow):
         self.proxy_btn.clicked.connect(self.set_proxy)
         btn_layout.addWidget(self.proxy_btn)
         
+        # 同时下载数量
+        btn_layout.addWidget(QLabel("同时下载:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 16)
+        self.concurrency_spin.setValue(MAX_CONCURRENT_DOWNLOADS)
+        self.concurrency_spin.valueChanged.connect(self.scheduler.set_max_concurrent)
+        btn_layout.addWidget(self.concurrency_spin)
+        
+        # 全局限速，所有下载按权重分享
+        btn_layout.addWidget(QLabel("限速:"))
+        self.rate_limit_spin = QSpinBox()
+        self.rate_limit_spin.setRange(0, 1000)
+        self.rate_limit_spin.setSuffix(" MB/s")
+        self.rate_limit_spin.setSpecialValueText("不限速")
+        self.rate_limit_spin.setValue(0)
+        self.rate_limit_spin.valueChanged.connect(self.set_rate_limit)
+        btn_layout.addWidget(self.rate_limit_spin)
+        
         # 添加按钮区域到主布局
         main_layout.addLayout(btn_layout)
         
         # 添加视频列表到主布局
         main_layout.addWidget(self.video_list)
         
+        # 总下载速度和剩余时间
+        self.speed_label = QLabel("")
+        main_layout.addWidget(self.speed_label)
+        
+        # 批量添加进度
+        self.intake_label = QLabel("")
+        self.intake_label.setVisible(False)
+        main_layout.addWidget(self.intake_label)
+        
         # 添加 yt-dlp 安装状态和按钮
         ytdlp_layout = QHBoxLayout()
         self.ytdlp_label = QLabel("yt-dlp: 检查中...")
@@ -1075,6 +1107,17 @@ class MainWindow(QMainWindow):
             if not url:
                 QMessageBox.warning(self, "错误", "请输入视频URL")
                 return
+            
+            # 已下载过的视频先确认，确认重新下载时删除存档记录
+            entry = self.archive.find(url)
+            if entry is not None:
+                answer = QMessageBox.question(
+                    self, "已下载过",
+                    f"该视频已下载到:\n{entry.path}\n\n是否重新下载？"
+                )
+                if answer != QMessageBox.StandardButton.Yes:
+                    return
+                self.archive.forget(url)
                 
             # 显示忙碌对话框
             self.busy_dialog = QMessageBox(self)
@@ -1096,6 +1139,70 @@ class MainWindow(QMainWindow):
             self.fetch_thread.warning.connect(self.show_warning)  # 连接警告信号
             self.fetch_thread.start()
     
+    def bulk_add(self):
+        """批量添加视频：后台解析，结果逐条加入下载列表"""
+        dialog = BulkAddDialog(self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        urls = dialog.get_urls()
+        if not urls:
+            QMessageBox.warning(self, "错误", "没有找到有效的视频链接")
+            return
+        
+        self.bulk_resolution = dialog.res_combo.currentText()
+        self.bulk_errors = []
+        self.bulk_skipped = 0
+        self.bulk_add_btn.setEnabled(False)
+        self.intake_label.setText("正在解析视频链接...")
+        self.intake_label.setVisible(True)
+        
+        # 下载存档中已有的视频不再解析
+        bulk_format = archive_format(self.bulk_resolution)
+        self.intake_thread = BulkIntakeThread(urls, self, skip=lambda url: self.archive.contains(url, bulk_format))
+        self.intake_thread.item_signal.connect(self.add_bulk_item)
+        self.intake_thread.skipped_signal.connect(self.bulk_item_skipped)
+        self.intake_thread.error_signal.connect(lambda url, error: self.bulk_errors.append(f"{url}: {error}"))
+        self.intake_thread.progress_signal.connect(self.update_intake_progress)
+        self.intake_thread.finished_signal.connect(self.bulk_add_finished)
+        self.intake_thread.start()
+    
+    def add_bulk_item(self, info):
+        """把批量解析出的视频加入下载列表（已在列表中的视频跳过）"""
+        video_id = extract_video_id(info['url'])
+        if video_id and any(job['state'] != STATE_FAILED for job in self.job_store.find_by_video_id(video_id)):
+            return
+        
+        title = info.get('title') or info['url']
+        author = info.get('author') or 'Unknown'
+        job_id = self.job_store.add_job(
+            url=info['url'],
+            title=title,
+            author=author,
+            resolution=self.bulk_resolution
+        )
+        self.add_video_item(VideoItem(title, author, info['url'], self.bulk_resolution, job_id=job_id))
+    
+    def bulk_item_skipped(self, url):
+        """批量添加时跳过已下载过的视频"""
+        self.bulk_skipped += 1
+    
+    def update_intake_progress(self, done, total):
+        """更新批量解析进度"""
+        self.intake_label.setText(f"正在解析视频链接: {done}/{total}")
+    
+    def bulk_add_finished(self, added):
+        """批量解析完成"""
+        self.bulk_add_btn.setEnabled(True)
+        self.intake_label.setVisible(False)
+        message = f"已添加 {added} 个视频"
+        if self.bulk_skipped:
+            message += f"，跳过 {self.bulk_skipped} 个已下载过的视频"
+        if self.bulk_errors:
+            message += f"\n\n{len(self.bulk_errors)} 个链接解析失败:\n" + "\n".join(self.bulk_errors[:10])
+            if len(self.bulk_errors) > 10:
+                message += "\n..."
+        QMessageBox.information(self, "批量添加", message)
+    
     def show_warning(self, warning_msg):
         """显示警告信息"""
         QMessageBox.warning(self, "警告", warning_msg)
@@ -1115,16 +1222,19 @@ class MainWindow(QMainWindow):
         dialog.duration_label.setText(f"视频时长: {self.format_duration(video_info['duration'])}")
         dialog.platform_label.setText(f"作者: {video_info.get('author', 'Unknown')}")
         
-        # 显示缩略图
-        if 'thumbnail' in video_info:
-            try:
-                thumbnail_data = urllib.request.urlopen(video_info['thumbnail']).read()
-                pixmap = QPixmap()
-                pixmap.loadFromData(thumbnail_data)
-                dialog.thumbnail_label.setPixmap(pixmap.scaled(240, 135, Qt.AspectRatioMode.KeepAspectRatio))
-            except:
-                # 如果缩略图加载失败，显示默认图像
-                dialog.thumbnail_label.setText("缩略图加载失败")
+        # 显示缩略图（后台加载，不阻塞界面）
+        if video_info.get('thumbnail'):
+            dialog.thumbnail_label.setText("正在加载缩略图...")
+            
+            def show_thumbnail(pixmap):
+                if pixmap is None:
+                    # 如果缩略图加载失败，显示默认图像
+                    dialog.thumbnail_label.setText("缩略图加载失败")
+                else:
+                    dialog.thumbnail_label.setPixmap(pixmap)
+            
+            self.thumbnails.request(video_info['url'], video_info['thumbnail'],
+                                    *THUMBNAIL_SIZE, show_thumbnail)
         
         # 显示视频信息区域，隐藏获取按钮
         dialog.video_info_widget.setVisible(True)
@@ -1138,23 +1248,57 @@ class MainWindow(QMainWindow):
             resolution = dialog.res_combo.currentText()
             engine, download_subtitles = dialog.get_selected_engine()
             
+            # 保存到任务存储
+            job_id = self.job_store.add_job(
+                url=video_info['url'],
+                title=video_info['title'],
+                author=video_info.get('author', 'Unknown'),
+                resolution=resolution,
+                engine=engine,
+                download_subtitles=download_subtitles
+            )
+            
             # 创建VideoItem对象
             video = VideoItem(
                 title=video_info['title'],
                 author=video_info.get('author', 'Unknown'),
                 url=video_info['url'],
                 resolution=resolution,
-                engine=engine
+                engine=engine,
+                job_id=job_id
             )
             
             # 添加字幕下载选项
             video.download_subtitles = download_subtitles
             
             # 添加到视频列表
-            self.videos.append(video)
-            
-            # 更新视频列表显示
-            self.video_list.addItem(f"{video.title} ({video.resolution})")
+            self.add_video_item(video)
+    
+    def add_video_item(self, video):
+        """把视频项目添加到列表显示"""
+        self.videos[video.job_id] = video
+        video.list_item = QListWidgetItem()
+        video.list_item.setData(Qt.ItemDataRole.UserRole, video.job_id)
+        self.video_list.addItem(video.list_item)
+        self.update_video_item(video.job_id)
+        
+        # 列表项图标使用缓存的缩略图
+        list_item = video.list_item
+        self.thumbnails.request(
+            video.url, None, *LIST_THUMBNAIL_SIZE,
+            lambda pixmap: list_item.setIcon(QIcon(pixmap)) if pixmap is not None else None
+        )
+    
+    def restore_jobs(self):
+        """从任务存储恢复下载列表，并继续上次中断的下载"""
+        interrupted = self.job_store.recover()
+        priorities = {}
+        for job in self.job_store.jobs():
+            priorities[job['id']] = job['priority'] or 0
+            self.add_video_item(VideoItem.from_job(job))
+        for job_id in interrupted:
+            # 保留上次排队时的优先级（例如手动选中的视频）
+            self.start_download(job_id, priority=priorities.get(job_id, 0))
     
     def fetch_error(self, error_msg):
         """获取视频信息错误回调"""
@@ -1182,8 +1326,9 @@ class MainWindow(QMainWindow):
             return
             
         for item in selected_items:
-            idx = self.video_list.row(item)
-            self.start_download(idx)
+            job_id = item.data(Qt.ItemDataRole.UserRole)
+            # 手动选中的视频优先于"下载全部"排队的视频
+            self.start_download(job_id, priority=1)
     
     def download_all(self):
         """下载所有视频"""
@@ -1191,96 +1336,176 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "错误", "请先添加视频")
             return
             
-        for idx in range(len(self.videos)):
-            if self.videos[idx].status == "等待下载":
-                self.start_download(idx)
+        for job in self.job_store.jobs(STATE_WAITING):
+            self.start_download(job['id'])
+    
+    def clear_completed(self):
+        """从列表和任务存储中删除已完成的任务（已下载的文件和下载存档保留）"""
+        for job_id in self.job_store.clear_completed():
+            video = self.videos.pop(job_id, None)
+            if video is not None and video.list_item is not None:
+                self.video_list.takeItem(self.video_list.row(video.list_item))
+                video.list_item = None
     
-    def start_download(self, idx):
-        """开始下载指定索引的视频"""
-        if idx < 0 or idx >= len(self.videos):
+    def start_download(self, job_id, priority=0):
+        """将指定任务加入下载队列"""
+        video = self.videos.get(job_id)
+        if video is None:
             return
             
-        if self.videos[idx].status != "等待下载" and self.videos[idx].status != "下载失败":
+        if video.status != "等待下载" and video.status != "下载失败":
+            return
+        
+        # 已下载过且文件还在的视频直接标记为完成，不再排队
+        entry = self.archive.find(video.url, archive_format(video.resolution))
+        if entry is not None:
+            video.status = "已完成"
+            video.progress = 100
+            self.job_store.set_state(job_id, STATE_COMPLETED, progress=100, file_path=entry.path, error=None)
+            self.update_video_item(job_id)
             return
             
         # 更新视频状态
-        self.videos[idx].status = "下载中"
-        self.videos[idx].progress = 0
-        self.update_video_item(idx)
+        video.status = "排队中"
+        video.progress = 0
+        self.job_store.set_state(job_id, STATE_PENDING, progress=0, priority=priority, error=None)
+        self.update_video_item(job_id)
         
-        # 创建下载线程
+        # 创建下载任务
         thread = DownloadThread(
-            idx, 
-            self.videos[idx], 
+            job_id, 
+            video, 
             self.download_path,
-            self.proxy_host,
-            self.proxy_port,
-            self.proxy_type
+            self.proxy,
+            self.progress_bus,
+            weight=1 + priority,  # 手动选中的视频分到更多带宽
+            proxy_pool=self.proxy_pool,
+            scheduler=self.scheduler
         )
         
-        thread.progress_signal.connect(self.update_progress)
+        thread.started_signal.connect(self.download_started)
         thread.finished_signal.connect(self.download_finished)
         thread.error_signal.connect(self.download_error)
         thread.warning_signal.connect(self.show_warning)
+        thread.postprocessing_signal.connect(self.download_postprocessing)
         
-        # 保存线程引用
-        self.download_threads[idx] = thread
+        # 保存任务引用
+        self.download_threads[job_id] = thread
         
-        # 启动线程
-        thread.start()
+        # 交给调度器，由空闲的工作线程执行
+        self.scheduler.submit(thread.run, job_id, url=video.url, priority=priority)
     
-    def update_progress(self, idx, progress):
-        """更新下载进度"""
-        if 0 <= idx < len(self.videos):
-            self.videos[idx].progress = progress
-            self.update_video_item(idx)
+    def download_started(self, job_id):
+        """任务开始执行回调"""
+        if job_id in self.videos:
+            self.videos[job_id].status = "下载中"
+            self.job_store.set_state(job_id, STATE_DOWNLOADING)
+            self.update_video_item(job_id)
+    
+    def download_postprocessing(self, job_id):
+        """下载完成、等待后处理回调（下载线程已经释放）"""
+        if job_id in self.videos:
+            self.videos[job_id].status = "处理中"
+            self.videos[job_id].progress = 100
+            self.progress_bus.remove(job_id)
+            self.update_video_item(job_id)
     
-    def update_video_item(self, idx):
+    def refresh_progress(self):
+        """定时刷新：批量更新有变化的任务和总速度"""
+        changed, total_speed, total_eta, active = self.progress_bus.snapshot()
+        for job in changed:
+            video = self.videos.get(job.job_id)
+            if video is None:
+                continue
+            video.progress = job.percent
+            video.speed = job.speed
+            video.eta = job.eta
+            self.job_store.set_progress(job.job_id, job.percent)
+            self.update_video_item(job.job_id)
+        
+        if active:
+            self.speed_label.setText(
+                f"正在下载 {active} 个视频 | 总速度: {format_speed(total_speed)} | "
+                f"剩余时间: {format_eta(total_eta)}"
+            )
+        else:
+            self.speed_label.setText("")
+    
+    def update_video_item(self, job_id):
         """更新视频列表项的显示"""
-        if 0 <= idx < len(self.videos):
-            video = self.videos[idx]
-            item = self.video_list.item(idx)
-            
-            if video.status == "下载中":
-                item.setText(f"{video.title} ({video.resolution}) - {video.progress}%")
-            else:
-                item.setText(f"{video.title} ({video.resolution}) - {video.status}")
-    
-    def download_finished(self, idx, file_path):
-        """下载完成回调"""
-        if 0 <= idx < len(self.videos):
-            self.videos[idx].status = "已完成"
-            self.videos[idx].progress = 100
-            self.update_video_item(idx)
+        video = self.videos.get(job_id)
+        if video is None or video.list_item is None:
+            return
             
-            # 检查是否同时下载了字幕文件
-            subtitle_files = []
-            base_path = os.path.splitext(file_path)[0]
-            for ext in ['.zh-CN.srt', '.zh-TW.srt', '.en.srt', '.srt']:
-                if os.path.exists(base_path + ext):
-                    subtitle_files.append(os.path.basename(base_path + ext))
+        if video.status == "下载中":
+            video.list_item.setText(
+                f"{video.title} ({video.resolution}) - {video.progress}% "
+                f"{format_speed(video.speed)} 剩余 {format_eta(video.eta)}"
+            )
+        else:
+            video.list_item.setText(f"{video.title} ({video.resolution}) - {video.status}")
+    
+    def download_finished(self, job_id, file_path, subtitle_files):
+        """下载完成回调（subtitle_files 为同时下载的字幕文件路径）"""
+        if job_id in self.videos:
+            self.videos[job_id].status = "已完成"
+            self.videos[job_id].progress = 100
+            self.job_store.set_state(job_id, STATE_COMPLETED, progress=100, file_path=file_path)
+            thread = self.download_threads.get(job_id)
+            if thread is None or not thread.archived:
+                # yt-dlp 下载已由下载引擎记入存档，这里只记录 pytubefix 的下载
+                self.record_archive(self.videos[job_id], file_path)
+            self.progress_bus.remove(job_id)
+            self.update_video_item(job_id)
             
             # 构建消息
             message = f"视频已下载到:\n{file_path}"
             if subtitle_files:
-                message += f"\n\n同时下载了以下字幕文件:\n" + "\n".join(subtitle_files)
+                message += f"\n\n同时下载了以下字幕文件:\n" + "\n".join(os.path.basename(path) for path in subtitle_files)
             
             QMessageBox.information(self, "下载完成", message)
             
-            # 清理线程引用
-            if idx in self.download_threads:
-                del self.download_threads[idx]
+            # 清理任务引用
+            self.download_threads.pop(job_id, None)
+    
+    def record_archive(self, video, file_path):
+        """把完成的下载记入存档，存档写入失败不影响下载结果"""
+        try:
+            self.archive.record(video.url, archive_format(video.resolution), file_path, title=video.title)
+        except (OSError, sqlite3.Error) as e:
+            self.show_warning(f"写入下载存档失败: {e}")
     
-    def download_error(self, idx, error_msg):
+    def download_error(self, job_id, error_msg):
         """下载错误回调"""
-        if 0 <= idx < len(self.videos):
-            self.videos[idx].status = "下载失败"
-            self.update_video_item(idx)
+        if job_id in self.videos:
+            self.videos[job_id].status = "下载失败"
+            self.job_store.set_state(job_id, STATE_FAILED, error=error_msg)
+            self.progress_bus.remove(job_id)
+            self.update_video_item(job_id)
             QMessageBox.warning(self, "下载错误", error_msg)
             
-            # 清理线程引用
-            if idx in self.download_threads:
-                del self.download_threads[idx]
+            # 清理任务引用
+            self.download_threads.pop(job_id, None)
+    
+    def closeEvent(self, event):
+        """关闭窗口时丢弃排队中的下载任务并保存队列
+
+        未完成的任务保持排队/下载中状态，下次启动时自动继续。
+        """
+        if getattr(self, 'intake_thread', None) is not None:
+            self.intake_thread.cancel()
+        self.scheduler.shutdown()
+        get_postprocessor().shutdown()
+        self.thumbnails.shutdown()
+        self.proxy_pool.stop_monitor()
+        get_http_pool().close_idle()
+        get_session_cache().save_hosts()
+        self.job_store.close()
+        super().closeEvent(event)
+    
+    def set_rate_limit(self, mb_per_second):
+        """调整全局限速，正在进行的下载立即生效（已启动的 aria2c 除外）"""
+        get_limiter().set_rate(mb_per_second * 1024 * 1024)
     
     def set_download_path(self):
         """设置下载路径"""
@@ -1295,6 +1520,18 @@ class MainWindow(QMainWindow):
             self.download_path = path
             QMessageBox.information(self, "下载路径", f"已设置下载路径为:\n{path}")
     
+    def discover_proxies(self):
+        """在后台探测本地代理并加入代理池，之后定期检查各代理的延迟和可用性"""
+        def found(proxy):
+            # 代理池按主机和端口去重：localhost 与 127.0.0.1、混合端口的 HTTP 与 SOCKS5 只保留一个
+            self.proxy_pool.add(ProxyConfig.parse(proxy['url'], proxy['type']))
+        
+        def discover():
+            detect_local_proxies(on_found=found)
+            self.proxy_pool.start_monitor(ssl_context)
+        
+        threading.Thread(target=discover, daemon=True, name="proxy-discovery").start()
+    
     def set_proxy(self):
         """打开代理设置对话框"""
         dialog = ProxyDialog(self)
@@ -1310,25 +1547,25 @@ class MainWindow(QMainWindow):
                     # 设置代理
                     try:
                         set_proxy(host, port, proxy_type)
-                        self.proxy_host = host
-                        self.proxy_port = port
-                        self.proxy_type = proxy_type
+                        # 用户指定的协议替换探测时在同一端口上记录的协议
+                        self.proxy = self.proxy_pool.add(ProxyConfig(host, port, proxy_type), replace=True)
                         QMessageBox.information(self, "代理设置", f"已设置代理: {proxy_type}://{host}:{port}")
                     except Exception as e:
                         QMessageBox.warning(self, "代理设置错误", str(e))
                 else:
                     QMessageBox.warning(self, "代理格式错误", "代理地址格式应为: 主机名:端口号")
             else:
-                # 清除代理设置
+                # 清除代理设置（代理池一并清空，新任务直连）
                 set_proxy()
-                self.proxy_host = None
-                self.proxy_port = None
+                self.proxy = None
+                self.proxy_pool.clear()
                 QMessageBox.information(self, "代理设置", "已清除代理设置")
     
     def check_ytdlp_installed(self):
         """检查是否安装了yt-dlp"""
         if YTDLP_AVAILABLE:
-            self.ytdlp_label.setText("yt-dlp: 已安装")
+            version = get_capabilities().ytdlp_version
+            self.ytdlp_label.setText(f"yt-dlp: 已安装 {version}" if version else "yt-dlp: 已安装")
             self.ytdlp_label.setStyleSheet("color: green; background-color: #2a2a2a; padding: 5px; border-radius: 4px;")
             self.install_ytdlp_btn.setText("更新 yt-dlp")
         else:
@@ -1350,6 +1587,8 @@ class MainWindow(QMainWindow):
     def ytdlp_installed(self, success):
         """yt-dlp 安装完成回调"""
         global YTDLP_AVAILABLE
+        # 安装后重新检测，更新磁盘上的缓存
+        get_capabilities(refresh=True)
         if success:
             YTDLP_AVAILABLE = True
             self.ytdlp_label.setText("yt-dlp: 已安装 ✓")
@@ -1393,6 +1632,8 @@ class MainWindow(QMainWindow):
     def ffmpeg_installed(self, success):
         """ffmpeg 安装完成回调"""
         global FFMPEG_AVAILABLE
+        # 安装后重新检测，更新磁盘上的缓存
+        get_capabilities(refresh=True)
         if success:
             FFMPEG_AVAILABLE = True
             self.ffmpeg_label.setText("ffmpeg: 已安装 ✓")
@@ -1411,25 +1652,21 @@ class MainWindow(QMainWindow):
         self.install_ffmpeg_btn.setEnabled(True)
         QMessageBox.warning(self, "安装错误", f"安装 ffmpeg 时出错:\n{error_msg}")
 
+def resolve_video_info(url):
+    """获取批量添加所需的视频信息（标题、作者）"""
+    if YTDLP_AVAILABLE:
+        return get_video_info_with_ytdlp(url)
+    # 下载时复用同一个 YouTube 对象
+    yt = get_youtube(url)
+    return {'url': url, 'title': yt.title, 'author': yt.author}
+
 def get_video_info_with_ytdlp(url):
     """使用 yt-dlp 获取视频信息"""
-    import yt_dlp
-    
     # 设置代理
-    proxy_opts = {}
-    if USE_PROXY and PROXY_URL:
-        proxy_url = f"{PROXY_TYPE}://{PROXY_URL}"
-        proxy_opts = {'proxy': proxy_url}
-    
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'no_check_certificate': True,
-        **proxy_opts
-    }
+    proxy = f"{PROXY_TYPE}://{PROXY_URL}" if USE_PROXY and PROXY_URL else None
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+    # 结果写入缓存，之后下载该视频时直接复用
+    info = get_engine().extract_info(url, proxy)
         
     # 构建视频信息
     video_info = {
@@ -1467,24 +1704,40 @@ def get_video_info_with_ytdlp(url):
     
     return video_info
 
+startup_timer.mark("module loaded")
+
 if __name__ == "__main__":
+    # --startup-report: 窗口显示后输出各阶段启动耗时并退出
+    startup_report = "--startup-report" in sys.argv
     print("Application starting...")
     app = QApplication(sys.argv)
     print("QApplication created")
+    startup_timer.mark("QApplication")
     window = MainWindow()
     print("MainWindow created")
+    startup_timer.mark("MainWindow")
     
     # 自动尝试设置 Clash Verge 代理
     try:
         proxy_url, proxy_type = set_clash_verge_proxy()
-        window.proxy_host = "127.0.0.1"
-        window.proxy_port = 7897
-        window.proxy_type = "http"
+        window.proxy = window.proxy_pool.add(ProxyConfig("127.0.0.1", 7897, "http"))
         print(f"已自动设置 Clash Verge 代理: {proxy_url}")
     except Exception as e:
         print(f"自动设置代理失败: {str(e)}")
     
+    # 在后台探测其他本地代理，下载任务分散到所有可用的代理上
+    window.discover_proxies()
+    
     print("About to show window")
     window.show()
     print("Window shown, entering event loop")
+    
+    def window_visible():
+        """事件循环处理完第一批事件（窗口已绘制）"""
+        startup_timer.mark("window visible")
+        if startup_report:
+            startup_timer.timer.report()
+            app.quit()
+    
+    QTimer.singleShot(0, window_visible)
     sys.exit(app.exec()) 
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+后处理工作池
+MP3 转换、音频流检查等 ffmpeg/ffprobe 任务在独立的工作池中运行，不占用下载线程；
+工作池大小等于 CPU 核数，所有 ffmpeg 进程共用一个全局线程预算，替代固定的 `-threads 4`
+"""
+
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认工作数（同时运行的 ffmpeg/ffprobe 进程数）
+DEFAULT_WORKERS = os.cpu_count() or 2
+
+# 默认的 ffmpeg 线程总预算
+DEFAULT_THREAD_BUDGET = os.cpu_count() or 2
+
+
+class ThreadBudget:
+    """所有 ffmpeg 进程共用的线程预算
+
+    acquire(want) 在至少有一个线程空闲时返回实际分到的线程数（不超过 want），
+    保证同时运行的 ffmpeg 线程总数不超过预算。
+    """
+
+    def __init__(self, total=DEFAULT_THREAD_BUDGET):
+        self.total = max(1, int(total))
+        self._free = self.total
+        self._cond = threading.Condition()
+
+    def share(self, parties=1):
+        """预算平均分给 parties 个进程时每个进程的线程数"""
+        return max(1, self.total // max(1, int(parties)))
+
+    def acquire(self, want):
+        with self._cond:
+            while self._free <= 0:
+                self._cond.wait()
+            granted = max(1, min(int(want), self._free))
+            self._free -= granted
+            return granted
+
+    def release(self, count):
+        with self._cond:
+            self._free = min(self.total, self._free + count)
+            self._cond.notify_all()
+
+
+def convert_to_mp3(file_path, threads=1):
+    """把音频文件转换为 MP3，成功后删除原文件，返回 MP3 路径"""
+    mp3_path = os.path.splitext(file_path)[0] + ".mp3"
+    subprocess.run(['ffmpeg', '-y', '-i', file_path, '-threads', str(threads),
+                    '-vn', '-ar', '44100', '-ac', '2', '-b:a', '192k', mp3_path],
+                   check=True, capture_output=True)
+    os.remove(file_path)
+    return mp3_path
+
+
+def has_audio_stream(file_path, threads=1):
+    """用 ffprobe 检查文件是否包含音频流（只读取文件头，占用一个线程）"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=codec_type',
+           '-of', 'default=noprint_wrappers=1', file_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    # 如果没有音频流，输出将为空
+    return bool(result.stdout.strip())
+
+
+class PostProcessor:
+    """后处理工作池
+
+    submit(func, *args) 把任务放入工作池并立即返回 Future；
+    func 以 func(*args, threads=N) 调用，N 为从全局预算中分到的 ffmpeg 线程数。
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, budget=None):
+        self.budget = budget or ThreadBudget()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)),
+                                            thread_name_prefix="postprocess")
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def submit(self, func, *args):
+        return self._executor.submit(self._run, func, args)
+
+    def active_count(self):
+        """正在运行的后处理任务数"""
+        with self._lock:
+            return self._active
+
+    def _run(self, func, args):
+        with self._lock:
+            self._active += 1
+            # 同时运行的任务平分预算，单独运行时可以使用全部线程
+            want = self.budget.share(self._active)
+        threads = self.budget.acquire(want)
+        try:
+            return func(*args, threads=threads)
+        finally:
+            self.budget.release(threads)
+            with self._lock:
+                self._active -= 1
+
+    def shutdown(self, wait=False):
+        """停止接收任务，丢弃还没开始的任务"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def ffmpeg_thread_args(parties=1):
+    """下载过程中由 yt-dlp 调用的 ffmpeg（合并、转码）使用的线程参数
+
+    parties 为可能同时运行的下载数，每个下载分到预算的一份。
+    """
+    return ['-threads', str(get_postprocessor().budget.share(parties))]
+
+
+_default_postprocessor = None
+_default_postprocessor_lock = threading.Lock()
+
+
+def get_postprocessor():
+    """返回进程内共享的后处理工作池"""
+    global _default_postprocessor
+    with _default_postprocessor_lock:
+        if _default_postprocessor is None:
+            _default_postprocessor = PostProcessor()
+        return _default_postprocessor
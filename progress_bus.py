@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载进度汇总
+下载线程每个数据块只更新一次内存中的计数，界面按固定频率取快照批量刷新，
+同时计算每个任务和全部任务的平滑速度（EWMA）与剩余时间
+"""
+
+import threading
+import time
+
+# 速度平滑系数，越大越跟随瞬时速度
+DEFAULT_ALPHA = 0.3
+
+
+class JobProgress:
+    """单个任务在一次快照中的进度"""
+    __slots__ = ("job_id", "downloaded", "total", "percent", "speed", "eta")
+
+    def __init__(self, job_id, downloaded, total, percent, speed, eta):
+        self.job_id = job_id
+        self.downloaded = downloaded
+        self.total = total
+        self.percent = percent
+        self.speed = speed  # 字节/秒
+        self.eta = eta      # 秒，无法估计时为 None
+
+
+class _JobState:
+    __slots__ = ("downloaded", "total", "sampled", "sampled_at", "speed", "dirty")
+
+    def __init__(self):
+        self.downloaded = 0
+        self.total = 0
+        self.sampled = 0       # 上次快照时的已下载字节数
+        self.sampled_at = None
+        self.speed = 0.0
+        self.dirty = False
+
+
+class ProgressBus:
+    """线程安全的进度汇总器
+
+    report() 可以在任意线程中高频调用，开销只是一次加锁赋值；
+    snapshot() 由界面定时器调用，只返回上次快照后有变化的任务。
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._jobs = {}  # 任务ID -> _JobState
+
+    def report(self, job_id, downloaded, total):
+        """上报任务当前已下载字节数和总字节数"""
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None:
+                state = self._jobs[job_id] = _JobState()
+            state.downloaded = downloaded
+            state.total = total
+            state.dirty = True
+
+    def remove(self, job_id):
+        """任务结束后移除，不再参与统计"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def snapshot(self):
+        """计算一次快照
+
+        返回 (有变化的任务进度列表, 总速度, 总剩余时间, 活动任务数)
+        """
+        now = time.monotonic()
+        changed = []
+        total_speed = 0.0
+        total_remaining = 0
+        with self._lock:
+            for job_id, state in self._jobs.items():
+                self._sample(state, now)
+                total_speed += state.speed
+                if state.total:
+                    total_remaining += max(0, state.total - state.downloaded)
+                if state.dirty:
+                    state.dirty = False
+                    changed.append(self._progress(job_id, state))
+            active = len(self._jobs)
+        total_eta = total_remaining / total_speed if total_speed > 0 else None
+        return changed, total_speed, total_eta, active
+
+    def _sample(self, state, now):
+        """用两次快照之间的平均速度更新 EWMA 速度"""
+        if state.sampled_at is None or state.downloaded < state.sampled:
+            # 第一次采样，或开始下载新的文件（例如视频下载完后下载音频）
+            state.sampled = state.downloaded
+            state.sampled_at = now
+            return
+        elapsed = now - state.sampled_at
+        if elapsed <= 0:
+            return
+        instant = (state.downloaded - state.sampled) / elapsed
+        if state.speed:
+            state.speed = self.alpha * instant + (1 - self.alpha) * state.speed
+        else:
+            state.speed = instant
+        state.sampled = state.downloaded
+        state.sampled_at = now
+        if instant == 0 and state.speed < 1:
+            state.speed = 0.0
+
+    def _progress(self, job_id, state):
+        percent = int(state.downloaded / state.total * 100) if state.total else 0
+        remaining = state.total - state.downloaded if state.total else None
+        eta = remaining / state.speed if remaining is not None and state.speed > 0 else None
+        return JobProgress(job_id, state.downloaded, state.total, min(percent, 100), state.speed, eta)
+
+
+def format_speed(speed):
+    """把字节/秒格式化为易读的速度"""
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if speed < 1024:
+            return f"{speed:.0f} {unit}" if unit == "B/s" else f"{speed:.1f} {unit}"
+        speed /= 1024
+    return f"{speed:.1f} GB/s"
+
+
+def format_eta(seconds):
+    """把剩余秒数格式化为 时:分:秒"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
@@ -9,17 +9,20 @@
 import os
 import sys
 import argparse
-import importlib.util
 import time
 import shutil
 
+from bandwidth import get_limiter, parse_rate
+from capabilities import get_capabilities
+from download_engine import DownloadRequest, get_engine
+
 # 检查是否安装了 yt-dlp
-YTDLP_AVAILABLE = importlib.util.find_spec("yt_dlp") is not None
+YTDLP_AVAILABLE = get_capabilities().ytdlp
 
 # 检查是否安装了 ffmpeg
 def is_ffmpeg_installed():
     """检查系统是否安装了 ffmpeg"""
-    return shutil.which('ffmpeg') is not None
+    return get_capabilities().ffmpeg
 
 # 全局变量，存储 ffmpeg 安装状态
 FFMPEG_AVAILABLE = is_ffmpeg_installed()
@@ -78,7 +81,7 @@ def progress_hook(d):
         sys.stdout.write(f"下载完成，正在处理文件...\n")
         sys.stdout.flush()
 
-def download_video(url, resolution="720", output_path=os.path.expanduser("~/Downloads"), proxy=None):
+def download_video(url, resolution="720", output_path=os.path.expanduser("~/Downloads"), proxy=None, force=False):
     """
     下载YouTube视频
     
@@ -87,6 +90,7 @@ def download_video(url, resolution="720", output_path=os.path.expanduser("~/Down
         resolution (str): 视频分辨率，例如 "360", "720" (默认 "720")
         output_path (str): 下载保存路径 (默认 ~/Downloads)
         proxy (str): 代理服务器，例如 "http://127.0.0.1:7897"
+        force (bool): 忽略下载存档，重新下载已下载过的视频
     
     返回:
         tuple: (成功状态, 文件路径或错误消息)
@@ -96,8 +100,6 @@ def download_video(url, resolution="720", output_path=os.path.expanduser("~/Down
         return False, "未安装 yt-dlp"
     
     try:
-        import yt_dlp
-        
         print(f"下载视频: {url}")
         print(f"目标分辨率: {resolution}p")
         print(f"保存路径: {output_path}")
@@ -105,55 +107,36 @@ def download_video(url, resolution="720", output_path=os.path.expanduser("~/Down
         if proxy:
             print(f"使用代理: {proxy}")
         
-        # 创建输出目录（如果不存在）
-        os.makedirs(output_path, exist_ok=True)
-        
-        # 设置 yt-dlp 选项
-        ydl_opts = {
-            'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
-            'quiet': False,
-            'no_warnings': False,
-            'ignoreerrors': True,
-            'noplaylist': True,  # 不下载播放列表，只下载单个视频
-            'progress_hooks': [progress_hook],  # 添加进度回调
-            'noprogress': False,  # 确保显示进度
-        }
-        
         # 根据 ffmpeg 是否安装选择不同的格式
         if FFMPEG_AVAILABLE:
             # 如果 ffmpeg 已安装，使用最佳质量（可能需要合并）
-            if resolution != "audio":
-                ydl_opts['format'] = f'bestvideo[height<={resolution}]+bestaudio/best[height<={resolution}]'
-            else:
-                ydl_opts['format'] = 'bestaudio'
             print("使用 ffmpeg 合并模式，将获得最佳视频质量")
         else:
             # 如果 ffmpeg 未安装，使用单一格式（不需要合并）
-            if resolution != "audio":
-                ydl_opts['format'] = f'best[height<={resolution}]/best'
-            else:
-                ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio'
             print("警告: 未安装 ffmpeg，将下载单一格式视频。质量可能不是最佳。")
         
-        # 添加代理设置
-        if proxy:
-            ydl_opts['proxy'] = proxy
+        request = DownloadRequest(
+            url,
+            resolution=resolution,
+            output_path=output_path,
+            proxy=proxy,
+            ffmpeg=FFMPEG_AVAILABLE,
+            skip_archived=not force,
+            extra_opts={
+                'quiet': False,
+                'no_warnings': False,
+                'noprogress': False,  # 确保显示进度
+            }
+        )
+        
+        # 下载存档中已有的视频不再提取信息和下载
+        entry = get_engine().archived(request)
+        if entry is not None:
+            print("已下载过，跳过 (使用 --force 重新下载)")
+            return True, entry.path
         
         # 下载视频
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            if not info:
-                return False, "下载失败: 无法获取视频信息"
-            
-            # 获取下载的文件路径
-            if 'requested_downloads' in info:
-                for download in info['requested_downloads']:
-                    if 'filepath' in download:
-                        return True, download['filepath']
-            
-            # 如果无法获取精确路径，构造一个可能的路径
-            filename = ydl.prepare_filename(info)
-            return True, filename
+        return True, get_engine().run(request, on_progress=progress_hook)
     
     except Exception as e:
         return False, f"下载错误: {str(e)}"
@@ -174,23 +157,11 @@ def list_formats(url, proxy=None):
         return False
     
     try:
-        import yt_dlp
-        
-        # 设置 yt-dlp 选项
-        ydl_opts = {
-            'listformats': True,
-            'quiet': False,
-            'no_warnings': False,
-        }
-        
-        # 添加代理设置
         if proxy:
-            ydl_opts['proxy'] = proxy
             print(f"使用代理: {proxy}")
         
         # 列出格式
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(url, download=False)
+        get_engine().list_formats(url, proxy)
         return True
     
     except Exception as e:
@@ -278,9 +249,14 @@ def main():
     parser.add_argument("-l", "--list-formats", action="store_true", help="列出可用格式而不下载")
     parser.add_argument("-i", "--install", action="store_true", help="安装 yt-dlp")
     parser.add_argument("-f", "--install-ffmpeg", action="store_true", help="安装 ffmpeg")
+    parser.add_argument("--limit-rate", type=parse_rate, default=0, help="总下载限速，例如 500K、2M (默认不限速)")
+    parser.add_argument("--force", action="store_true", help="忽略下载存档，重新下载已下载过的视频")
     
     args = parser.parse_args()
     
+    # 全局限速
+    get_limiter().set_rate(args.limit_rate)
+    
     # 检查是否需要安装 ffmpeg
     if args.install_ffmpeg:
         if install_ffmpeg():
@@ -315,7 +291,7 @@ def main():
             return 1
     else:
         try:
-            success, result = download_video(args.url, args.resolution, args.output, args.proxy)
+            success, result = download_video(args.url, args.resolution, args.output, args.proxy, force=args.force)
             if success:
                 print(f"\n下载成功: {result}")
             else:
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多代理线路池
+同时使用探测到的多个本地代理（Clash 的 HTTP/SOCKS 端口、V2Ray 等）。每个代理按延迟、吞吐量和
+出错率打分，新任务分到当前得分最高（按正在使用的任务数折算）的健康代理；连续出错的代理暂停使用
+一段时间，后台定期探测恢复。任务通过 ProxyLease 使用代理，下载中途代理失效时换到另一个代理，
+配合 .part 文件和分段日志从当前位置继续
+"""
+
+import threading
+import time
+import urllib.request
+
+from proxy_session import ProxyConfig
+
+# 探测代理时请求的地址（返回 204，没有正文）
+CHECK_URL = "https://www.youtube.com/generate_204"
+
+# 探测超时时间（秒）
+CHECK_TIMEOUT = 8
+
+# 后台探测的间隔（秒）
+CHECK_INTERVAL = 30
+
+# 移动平均的权重（新样本所占比例）
+ALPHA = 0.3
+
+# 没有吞吐量数据的代理按这个速率估计（字节/秒），新代理因此会被尝试
+DEFAULT_THROUGHPUT = 2 * 1024 * 1024
+
+# 出错率高于这个值的代理不再分配新任务（除非没有其他代理）
+MAX_ERROR_RATE = 0.6
+
+# 连续出错后暂停使用的时间（秒），每多错一次加倍，不超过 MAX_COOLDOWN
+COOLDOWN = 10
+MAX_COOLDOWN = 300
+
+# 计入吞吐量的最短传输时间（秒）
+MIN_SAMPLE_SECONDS = 1.0
+
+# 本机地址的不同写法
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def endpoint(proxy):
+    """代理的 (主机, 端口)，用于去重
+
+    本机的不同写法视为同一个主机；同一端口上的 HTTP 和 SOCKS5（例如 Clash 的混合端口）
+    是同一个上游，只算一个代理。
+    """
+    host = proxy.host.lower().strip("[]")
+    if host in _LOOPBACK_HOSTS:
+        host = "127.0.0.1"
+    return host, proxy.port
+
+
+class ProxyHealth:
+    """一个代理的健康数据"""
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.latency = None      # 探测延迟的移动平均（秒）
+        self.throughput = None   # 下载速度的移动平均（字节/秒）
+        self.error_rate = 0.0    # 出错率的移动平均（0~1）
+        self.failures = 0        # 连续出错次数
+        self.cooldown_until = 0.0
+        self.active = 0          # 正在使用的任务数
+
+    def healthy(self, now):
+        return now >= self.cooldown_until and self.error_rate <= MAX_ERROR_RATE
+
+    def score(self):
+        """得分越高越优先：估计吞吐量按出错率和延迟折算，再由正在使用的任务平分"""
+        throughput = self.throughput or DEFAULT_THROUGHPUT
+        latency = self.latency if self.latency is not None else 1.0
+        return throughput * (1.0 - self.error_rate) / (1.0 + latency) / (self.active + 1)
+
+    def _average(self, old, value):
+        return value if old is None else old + ALPHA * (value - old)
+
+    def record_success(self, latency=None, throughput=None):
+        if latency is not None:
+            self.latency = self._average(self.latency, latency)
+        if throughput is not None:
+            self.throughput = self._average(self.throughput, throughput)
+        self.error_rate = self._average(self.error_rate, 0.0)
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self, now):
+        self.error_rate = self._average(self.error_rate, 1.0)
+        self.failures += 1
+        self.cooldown_until = now + min(MAX_COOLDOWN, COOLDOWN * 2 ** (self.failures - 1))
+
+    def to_dict(self):
+        return {
+            "proxy": self.proxy.url,
+            "latency": self.latency,
+            "throughput": self.throughput,
+            "error_rate": round(self.error_rate, 3),
+            "failures": self.failures,
+            "active": self.active,
+        }
+
+
+class ProxyPool:
+    """多个代理的线路池
+
+    池为空时 acquire() 返回 None，任务使用默认线路。同一主机和端口只保留一个代理（见 endpoint）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proxies = {}   # (主机, 端口) -> ProxyHealth（按加入顺序）
+        self._monitor = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._proxies)
+
+    def add(self, proxy, replace=False):
+        """加入代理（ProxyConfig 或 "类型://主机:端口"），返回池中实际使用的代理
+
+        同一主机和端口已有代理时保留已有的协议；replace 为 True 时（用户手动指定）改用 proxy 的协议，
+        健康数据保留。
+        """
+        if isinstance(proxy, str):
+            proxy = ProxyConfig.parse(proxy)
+        key = endpoint(proxy)
+        with self._lock:
+            health = self._proxies.get(key)
+            if health is None:
+                self._proxies[key] = ProxyHealth(proxy)
+            elif replace:
+                health.proxy = proxy
+            else:
+                return health.proxy
+        return proxy
+
+    def remove(self, proxy):
+        with self._lock:
+            self._proxies.pop(endpoint(proxy), None)
+
+    def clear(self):
+        with self._lock:
+            self._proxies.clear()
+
+    def proxies(self):
+        with self._lock:
+            return [health.proxy for health in self._proxies.values()]
+
+    def stats(self):
+        with self._lock:
+            return [health.to_dict() for health in self._proxies.values()]
+
+    def _pick_locked(self, exclude=(), preferred=None):
+        now = time.monotonic()
+        excluded = {endpoint(proxy) for proxy in exclude}
+        candidates = [h for key, h in self._proxies.items() if key not in excluded]
+        if not candidates:
+            return None
+        healthy = [h for h in candidates if h.healthy(now)]
+        if not healthy:
+            # 全部暂停中时用最先恢复的代理，不让任务无线路可用
+            return min(candidates, key=lambda h: h.cooldown_until)
+        best = max(healthy, key=lambda h: h.score())
+        preferred = self._proxies.get(endpoint(preferred)) if preferred is not None else None
+        if preferred in healthy and preferred.score() >= best.score() * 0.8:
+            # 用户选定的代理在得分接近时优先
+            return preferred
+        return best
+
+    def acquire(self, exclude=(), preferred=None):
+        """为一个任务选择代理（计入正在使用的任务数），池为空时返回 None"""
+        with self._lock:
+            health = self._pick_locked(exclude, preferred)
+            if health is None:
+                return None
+            health.active += 1
+            return health.proxy
+
+    def release(self, proxy):
+        with self._lock:
+            health = self._proxies.get(endpoint(proxy))
+            if health is not None:
+                health.active = max(0, health.active - 1)
+
+    def switch(self, proxy, exclude=()):
+        """把一个任务从 proxy 换到另一个代理，没有其他可用代理时返回 None（仍使用原代理）"""
+        with self._lock:
+            health = self._pick_locked(set(exclude) | {proxy})
+            if health is None:
+                return None
+            old = self._proxies.get(endpoint(proxy))
+            if old is not None:
+                old.active = max(0, old.active - 1)
+            health.active += 1
+            return health.proxy
+
+    def record_transfer(self, proxy, size, seconds):
+        """记录一段传输，按下载速度更新吞吐量"""
+        if proxy is None or seconds < MIN_SAMPLE_SECONDS or size <= 0:
+            return
+        with self._lock:
+            health = self._proxies.get(endpoint(proxy))
+            if health is not None:
+                health.record_success(throughput=size / seconds)
+
+    def record_failure(self, proxy):
+        if proxy is None:
+            return
+        with self._lock:
+            health = self._proxies.get(endpoint(proxy))
+            if health is not None:
+                health.record_failure(time.monotonic())
+
+    def check(self, proxy, ssl_context=None, timeout=CHECK_TIMEOUT):
+        """通过代理请求 CHECK_URL 测量延迟并更新健康数据，返回是否可用"""
+        started = time.monotonic()
+        try:
+            with proxy.build_opener(ssl_context).open(urllib.request.Request(CHECK_URL), timeout=timeout) as response:
+                response.read()
+        except Exception:
+            self.record_failure(proxy)
+            return False
+        latency = time.monotonic() - started
+        with self._lock:
+            health = self._proxies.get(endpoint(proxy))
+            if health is not None:
+                health.record_success(latency=latency)
+        return True
+
+    def check_all(self, ssl_context=None):
+        """并发探测所有代理"""
+        threads = [threading.Thread(target=self.check, args=(proxy, ssl_context), daemon=True)
+                   for proxy in self.proxies()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def start_monitor(self, ssl_context=None, interval=CHECK_INTERVAL):
+        """启动后台探测线程（重复调用时忽略）"""
+        with self._lock:
+            if self._monitor is not None:
+                return
+            self._stop.clear()
+            self._monitor = threading.Thread(target=self._run_monitor, args=(ssl_context, interval),
+                                             daemon=True, name="proxy-monitor")
+            self._monitor.start()
+
+    def stop_monitor(self):
+        self._stop.set()
+        with self._lock:
+            monitor, self._monitor = self._monitor, None
+        if monitor is not None:
+            monitor.join(timeout=1)
+
+    def _run_monitor(self, ssl_context, interval):
+        while not self._stop.is_set():
+            self.check_all(ssl_context)
+            self._stop.wait(interval)
+
+
+class ProxyLease:
+    """一个任务对代理池的使用
+
+    proxy 为任务当前使用的代理（池为空时为 None，使用默认线路）；failover() 在代理出错时
+    换到另一个代理，并返回新代理的 opener。progress() 上报已下载字节数，用于统计各代理的吞吐量。
+    """
+
+    def __init__(self, pool=None, ssl_context=None, preferred=None):
+        self.pool = pool
+        self.ssl_context = ssl_context
+        self._lock = threading.Lock()
+        self._failed = set()
+        self._leased = pool.acquire(preferred=preferred) if pool is not None else None
+        self.proxy = self._leased or preferred
+        self._last = 0
+        self._start_sample()
+
+    def _start_sample(self):
+        self._started = time.monotonic()
+        self._bytes = 0
+
+    def _finish_sample(self):
+        if self.pool is not None and self._leased is not None:
+            self.pool.record_transfer(self._leased, self._bytes, time.monotonic() - self._started)
+
+    def progress(self, downloaded):
+        """上报当前文件已下载的字节数（可以在多个线程中调用）"""
+        with self._lock:
+            # 开始下载下一个文件时已下载字节数会变小
+            delta = downloaded - self._last if downloaded >= self._last else downloaded
+            self._last = downloaded
+            self._bytes += max(0, delta)
+
+    def failover(self, error=None):
+        """当前代理出错：记录失败并换到另一个代理，返回新代理的 opener；没有其他代理时返回 None"""
+        with self._lock:
+            if self.pool is None or self._leased is None:
+                return None
+            self._finish_sample()
+            self.pool.record_failure(self._leased)
+            self._failed.add(self._leased)
+            proxy = self.pool.switch(self._leased, self._failed)
+            if proxy is None:
+                # 所有代理都试过了，下次重新从得分最高的开始
+                self._failed.clear()
+                self._start_sample()
+                return None
+            self.proxy = self._leased = proxy
+            self._start_sample()
+        return proxy.build_opener(self.ssl_context)
+
+    def close(self):
+        with self._lock:
+            self._finish_sample()
+            if self.pool is not None and self._leased is not None:
+                self.pool.release(self._leased)
+                self._leased = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_proxy_pool():
+    """返回进程内共享的代理池"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ProxyPool()
+        return _default_pool
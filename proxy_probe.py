@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地代理并发探测
+先并发做 TCP 连接预筛，只对开放的端口做 HTTP CONNECT / SOCKS5 握手，
+整个探测受一个总超时限制，发现的代理通过回调实时返回
+"""
+
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 握手时请求连接的目标，能建立隧道说明代理可以访问外网
+PROBE_TARGET_HOST = "www.google.com"
+PROBE_TARGET_PORT = 443
+
+# 整个探测的总时间上限（秒）
+DEFAULT_DEADLINE = 6.0
+
+# TCP 预筛的连接超时（秒），本地端口不开放时会立即被拒绝
+CONNECT_TIMEOUT = 0.5
+
+# 协议握手超时（秒），包括代理连接目标服务器的时间
+HANDSHAKE_TIMEOUT = 4.0
+
+# 并发探测线程数
+MAX_WORKERS = 32
+
+
+def _remaining(deadline, limit):
+    """返回本次操作可用的超时时间，不超过总截止时间"""
+    return max(0.05, min(limit, deadline - time.monotonic()))
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("连接被关闭")
+        data += chunk
+    return data
+
+
+def port_open(host, port, timeout=CONNECT_TIMEOUT):
+    """TCP 连接预筛，端口可连接返回 True"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def probe_http_connect(host, port, timeout=HANDSHAKE_TIMEOUT):
+    """用 HTTP CONNECT 握手检测 HTTP 代理"""
+    target = f"{PROBE_TARGET_HOST}:{PROBE_TARGET_PORT}"
+    request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode("ascii")
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(request)
+            status_line = sock.recv(128).split(b"\r\n", 1)[0].decode("latin-1")
+    except OSError:
+        return False
+    parts = status_line.split()
+    return len(parts) >= 2 and parts[0].startswith("HTTP/") and parts[1] == "200"
+
+
+def probe_socks5(host, port, timeout=HANDSHAKE_TIMEOUT):
+    """用 SOCKS5 握手（无认证 + CONNECT）检测 SOCKS5 代理"""
+    target = PROBE_TARGET_HOST.encode("ascii")
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(b"\x05\x01\x00")
+            if _recv_exact(sock, 2) != b"\x05\x00":
+                return False
+            sock.sendall(b"\x05\x01\x00\x03" + bytes([len(target)]) + target
+                         + struct.pack(">H", PROBE_TARGET_PORT))
+            reply = _recv_exact(sock, 2)
+    except OSError:
+        return False
+    return reply == b"\x05\x00"
+
+
+_HANDSHAKES = {
+    "http": probe_http_connect,
+    "socks5": probe_socks5,
+}
+
+
+def probe_local_proxies(hosts, ports, on_found=None, on_progress=None,
+                        deadline=DEFAULT_DEADLINE, max_workers=MAX_WORKERS):
+    """并发探测代理
+
+    ports 为 {代理类型: [端口]}，与 COMMON_PROXY_PORTS 格式相同。
+    每发现一个代理调用 on_found({"url": "主机:端口", "type": 类型})，
+    进度变化时调用 on_progress(完成比例)。返回按发现顺序排列的代理列表。
+    """
+    end_time = time.monotonic() + deadline
+    candidates = [(host, port, proxy_type)
+                  for host in hosts
+                  for proxy_type, type_ports in ports.items()
+                  for port in type_ports]
+    total = len(candidates)
+    found = []
+    lock = threading.Lock()
+    state = {"completed": 0, "closed": False}
+
+    def advance(count=1):
+        with lock:
+            state["completed"] += count
+            progress = state["completed"] / total if total else 1.0
+            closed = state["closed"]
+        if on_progress and not closed:
+            on_progress(progress)
+
+    def handshake(host, port, proxy_type):
+        try:
+            if _HANDSHAKES[proxy_type](host, port, _remaining(end_time, HANDSHAKE_TIMEOUT)):
+                proxy = {"url": f"{host}:{port}", "type": proxy_type}
+                with lock:
+                    # 截止时间之后才完成的结果不再上报
+                    if state["closed"]:
+                        return
+                    found.append(proxy)
+                if on_found:
+                    on_found(proxy)
+        finally:
+            advance()
+
+    # 同一端口只做一次 TCP 预筛
+    endpoints = {}
+    for host, port, proxy_type in candidates:
+        endpoints.setdefault((host, port), []).append(proxy_type)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="proxy-probe")
+    try:
+        pending = {}  # future -> (主机, 端口)，值为 None 表示握手任务
+        for host, port in endpoints:
+            future = executor.submit(port_open, host, port, _remaining(end_time, CONNECT_TIMEOUT))
+            pending[future] = (host, port)
+        while pending:
+            timeout = end_time - time.monotonic()
+            if timeout <= 0:
+                break
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint = pending.pop(future)
+                if endpoint is None:
+                    continue
+                if future.result():
+                    for proxy_type in endpoints[endpoint]:
+                        pending[executor.submit(handshake, *endpoint, proxy_type)] = None
+                else:
+                    advance(len(endpoints[endpoint]))
+    finally:
+        with lock:
+            state["closed"] = True
+        # 超过截止时间后不再等待未完成的探测
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if on_progress:
+        on_progress(1.0)
+    with lock:
+        return list(found)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按任务划分的代理线路
+每个代理只作用于用它构建的 urllib opener 和 yt-dlp 选项，不再替换全局的 socket.socket；
+pytubefix 通过全局 urlopen 发出的请求按当前线程选择线路，
+因此同时进行的下载可以分别走不同的代理
+"""
+
+import functools
+import socket
+import threading
+import urllib.request
+from contextlib import contextmanager
+
+from http_pool import (PooledHTTPConnection, PooledHTTPHandler, PooledHTTPSConnection,
+                       PooledHTTPSHandler)
+
+# 支持的代理类型
+PROXY_TYPES = ("http", "https", "socks5")
+
+# SOCKS5 默认端口
+DEFAULT_SOCKS_PORT = 1080
+
+
+class ProxyConfig:
+    """一个代理线路"""
+
+    def __init__(self, host, port, proxy_type="http"):
+        if proxy_type not in PROXY_TYPES:
+            raise ValueError(f"不支持的代理类型: {proxy_type}, 支持的类型有: {', '.join(PROXY_TYPES)}")
+        self.host = host
+        self.port = int(port)
+        self.proxy_type = proxy_type
+
+    @classmethod
+    def parse(cls, value, proxy_type="http"):
+        """解析 "主机:端口" 或 "类型://主机:端口" 格式的代理地址"""
+        value = value.strip()
+        if "://" in value:
+            proxy_type, value = value.split("://", 1)
+        value = value.rstrip("/")
+        if ":" in value:
+            host, port = value.rsplit(":", 1)
+        elif proxy_type == "socks5":
+            host, port = value, DEFAULT_SOCKS_PORT
+        else:
+            raise ValueError("代理地址格式应为: 主机名:端口号")
+        return cls(host, port, proxy_type)
+
+    @property
+    def address(self):
+        """主机:端口"""
+        return f"{self.host}:{self.port}"
+
+    @property
+    def url(self):
+        """带协议的代理地址，也用作缓存和统计的线路标识"""
+        return f"{self.proxy_type}://{self.address}"
+
+    def ytdlp_opts(self):
+        """yt-dlp 的代理选项（每个 YoutubeDL 实例独立）"""
+        return {'proxy': self.url}
+
+    def build_opener(self, ssl_context=None):
+        """构建只走该代理的 urllib opener"""
+        return build_opener(self, ssl_context)
+
+    def __eq__(self, other):
+        return isinstance(other, ProxyConfig) and self.url == other.url
+
+    def __hash__(self):
+        return hash(self.url)
+
+    def __repr__(self):
+        return f"ProxyConfig({self.url!r})"
+
+
+def _socks_connection_class(base, proxy):
+    """返回通过 SOCKS5 代理建立连接的 http.client 连接类"""
+    import socks
+
+    create_connection = functools.partial(
+        socks.create_connection,
+        proxy_type=socks.PROXY_TYPE_SOCKS5,
+        proxy_addr=proxy.host,
+        proxy_port=proxy.port,
+        proxy_rdns=True
+    )
+
+    class SocksConnection(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # 只替换这个连接的建连函数，不影响其他连接
+            self._create_connection = create_connection
+
+    return SocksConnection
+
+
+class SocksHTTPHandler(PooledHTTPHandler):
+    """经 SOCKS5 代理的 HTTP 处理器（连接在连接池中复用）"""
+
+    def __init__(self, proxy, pool=None):
+        super().__init__(pool, _socks_connection_class(PooledHTTPConnection, proxy), route=proxy.url)
+
+
+class SocksHTTPSHandler(PooledHTTPSHandler):
+    """经 SOCKS5 代理的 HTTPS 处理器（连接在连接池中复用）"""
+
+    def __init__(self, proxy, context=None, pool=None):
+        super().__init__(pool, context, _socks_connection_class(PooledHTTPSConnection, proxy), route=proxy.url)
+
+
+def build_opener(proxy=None, ssl_context=None):
+    """构建 urllib opener，proxy 为 None 时直连（仍遵循系统代理环境变量）
+
+    所有线路都使用共享连接池的长连接，不同线路的连接互不混用。
+    """
+    if proxy is None:
+        return urllib.request.build_opener(PooledHTTPHandler(), PooledHTTPSHandler(context=ssl_context))
+
+    if proxy.proxy_type == "socks5":
+        try:
+            handlers = [SocksHTTPHandler(proxy), SocksHTTPSHandler(proxy, context=ssl_context)]
+        except ImportError:
+            raise ImportError("使用SOCKS5代理需要安装PySocks库: pip install PySocks")
+        # 忽略环境变量中的代理，避免被二次转发
+        return urllib.request.build_opener(urllib.request.ProxyHandler({}), *handlers)
+
+    return urllib.request.build_opener(
+        urllib.request.ProxyHandler({'http': proxy.url, 'https': proxy.url}),
+        PooledHTTPHandler(route=proxy.url),
+        PooledHTTPSHandler(context=ssl_context, route=proxy.url)
+    )
+
+
+_local = threading.local()
+
+# 默认线路的名称（代理地址，直连时为 "direct"）
+_default_route = "direct"
+
+
+class _RoutingOpener(urllib.request.OpenerDirector):
+    """安装为全局 opener，按当前线程选择实际使用的 opener"""
+
+    def __init__(self, default):
+        super().__init__()
+        self.default = default
+
+    def open(self, fullurl, data=None, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        opener = getattr(_local, "opener", None) or self.default
+        return opener.open(fullurl, data, timeout)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def set_default_route(proxy=None, ssl_context=None):
+    """设置没有指定线路的请求使用的默认线路（例如界面上的全局代理设置）"""
+    global _router, _default_route
+    opener = build_opener(proxy, ssl_context)
+    with _router_lock:
+        _default_route = proxy.url if proxy is not None else "direct"
+        if _router is None:
+            _router = _RoutingOpener(opener)
+        else:
+            _router.default = opener
+        urllib.request.install_opener(_router)
+    return opener
+
+
+@contextmanager
+def routed(proxy, ssl_context=None, failover=None):
+    """在当前线程内让全局 urlopen 走指定代理（用于 pytubefix 等内部调用 urlopen 的库）
+
+    proxy 为 None 时使用默认线路。failover(error) 在代理出错时换一个线路并返回新的 opener
+    （没有其他线路时返回 None），供分段下载在传输中途切换。可以嵌套使用，退出时恢复之前的线路。
+    """
+    previous = _current()
+    _local.opener = build_opener(proxy, ssl_context) if proxy is not None else None
+    _local.route = proxy.url if proxy is not None else None
+    _local.failover = failover
+    try:
+        yield
+    finally:
+        _local.opener, _local.route, _local.failover = previous
+
+
+def _current():
+    return (getattr(_local, "opener", None), getattr(_local, "route", None), getattr(_local, "failover", None))
+
+
+def current_route():
+    """当前线程的请求使用的线路名称（代理地址，直连时为 "direct"），用于按线路缓存与出口 IP 绑定的数据"""
+    return getattr(_local, "route", None) or _default_route
+
+
+def current_failover():
+    """当前线程的线路切换函数，没有时返回 None"""
+    return getattr(_local, "failover", None)
+
+
+def bind_route(func):
+    """让 func 在其他线程中执行时沿用当前线程的代理线路"""
+    route = _current()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = _current()
+        _local.opener, _local.route, _local.failover = route
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.opener, _local.route, _local.failover = previous
+
+    return wrapper
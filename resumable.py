@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+断点续传下载
+把 pytubefix 的流写入 .part 文件，并用一个小的 .part.json 日志记录已确认写入的字节数，
+重试时通过 HTTP Range 请求从中断处继续，完成后按 stream.filesize 校验长度
+"""
+
+import json
+import os
+import socket
+import ssl
+import http.client
+import urllib.error
+import urllib.request
+
+from bandwidth import throttle
+
+# 每次 Range 请求的字节数（与 pytubefix 的默认分段大小一致）
+SEGMENT_SIZE = 9 * 1024 * 1024
+
+# 每次从连接读取的字节数，也是进度回调的粒度
+READ_SIZE = 64 * 1024
+
+# 单次请求超时时间（秒）
+REQUEST_TIMEOUT = 30
+
+# 不小于这个大小的流用多个连接分段下载（字节）
+MIN_SEGMENTED_SIZE = 8 * 1024 * 1024
+
+_HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Language": "en-US,en"}
+
+
+class DownloadInterrupted(ConnectionError):
+    """下载中断，已下载的部分保留在 .part 文件中，可以续传"""
+
+    def __init__(self, message, downloaded=0, total=0):
+        super().__init__(message)
+        self.downloaded = downloaded
+        self.total = total
+
+
+def part_paths(file_path):
+    """返回 (.part 文件路径, 日志文件路径)"""
+    part_path = file_path + ".part"
+    return part_path, part_path + ".json"
+
+
+def _journal_identity(stream):
+    """日志中用于识别同一个流的字段（流地址会过期，不能作为标识）"""
+    return {
+        "video_id": getattr(stream, "video_id", None),
+        "itag": stream.itag,
+        "filesize": stream.filesize,
+    }
+
+
+def read_journal(journal_path):
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_journal(journal_path, identity, downloaded):
+    data = dict(identity, downloaded=downloaded)
+    tmp_path = journal_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, journal_path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _resume_offset(part_path, journal_path, identity):
+    """根据日志计算可以续传的位置，日志与当前流不一致时从头下载"""
+    journal = read_journal(journal_path)
+    if not journal or not os.path.exists(part_path):
+        return 0
+    if any(journal.get(key) != value for key, value in identity.items()):
+        return 0
+    # 只信任日志中已确认写入的部分，断电时文件尾部可能是未落盘的数据
+    offset = min(int(journal.get("downloaded", 0)), os.path.getsize(part_path))
+    if offset > identity["filesize"]:
+        return 0
+    return offset
+
+
+def iter_content(url, start, total, segment_size=SEGMENT_SIZE, timeout=REQUEST_TIMEOUT):
+    """按 Range 分段读取 [start, total) 范围内的数据
+
+    网络错误抛出 DownloadInterrupted，其 downloaded 为已经产出的位置
+    """
+    offset = start
+    while offset < total:
+        end = min(offset + segment_size, total) - 1
+        request = urllib.request.Request(
+            url, headers=dict(_HEADERS, Range=f"bytes={offset}-{end}")
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                skip = 0
+                if response.status == 200:
+                    # 服务器忽略了 Range，返回的是完整文件：跳过已有部分，一次读完
+                    skip = offset
+                    end = total - 1
+                while offset <= end:
+                    chunk = response.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    # 按当前任务和全局限速等待（跳过的部分同样占用带宽）
+                    throttle(len(chunk))
+                    if skip:
+                        if len(chunk) <= skip:
+                            skip -= len(chunk)
+                            continue
+                        chunk = chunk[skip:]
+                        skip = 0
+                    chunk = chunk[:end - offset + 1]
+                    offset += len(chunk)
+                    yield chunk
+        except urllib.error.HTTPError as e:
+            raise DownloadInterrupted(
+                f"连接错误: HTTP {e.code}，已下载 {offset}/{total} 字节", offset, total
+            ) from e
+        except (urllib.error.URLError, http.client.HTTPException, ssl.SSLError,
+                socket.timeout, OSError) as e:
+            raise DownloadInterrupted(
+                f"连接错误: 下载中断于 {offset}/{total} 字节: {e}", offset, total
+            ) from e
+        if offset <= end:
+            raise DownloadInterrupted(
+                f"连接错误: 服务器提前关闭连接 ({offset}/{total} 字节)", offset, total
+            )
+
+
+def download_stream(stream, output_path=None, filename=None, on_progress=None,
+                    segment_size=SEGMENT_SIZE, timeout=REQUEST_TIMEOUT):
+    """下载 pytubefix 流，支持断点续传，返回最终文件路径
+
+    on_progress 的参数与 pytubefix 的 on_progress_callback 相同：
+    (stream, chunk, bytes_remaining)，分段下载时 chunk 为空。
+    网络错误会抛出 DownloadInterrupted，再次调用时从中断处继续。
+    """
+    file_path = stream.get_file_path(filename=filename, output_path=output_path)
+    total = stream.filesize
+    if not total:
+        # 无法获取文件大小时不能校验续传结果，交给 pytubefix 完整下载（不汇报进度）
+        return stream.download(output_path=output_path, filename=filename)
+
+    if os.path.exists(file_path) and os.path.getsize(file_path) == total:
+        return file_path
+
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    part_path, journal_path = part_paths(file_path)
+    identity = _journal_identity(stream)
+
+    if total >= MIN_SEGMENTED_SIZE:
+        # 大文件用多个连接分段下载（segmented 依赖本模块，在这里导入）
+        from segmented import RangeNotSupported, download_file
+
+        def segment_progress(downloaded, _total):
+            if on_progress:
+                on_progress(stream, b"", total - downloaded)
+
+        try:
+            return download_file(stream.url, total, file_path, identity, on_progress=segment_progress)
+        except RangeNotSupported:
+            pass
+
+    offset = _resume_offset(part_path, journal_path, identity)
+    with open(part_path, "r+b" if os.path.exists(part_path) else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        _write_journal(journal_path, identity, offset)
+        if offset and on_progress:
+            on_progress(stream, b"", total - offset)
+
+        synced = offset
+        try:
+            for chunk in iter_content(stream.url, offset, total, segment_size, timeout):
+                f.write(chunk)
+                offset += len(chunk)
+                if on_progress:
+                    on_progress(stream, chunk, total - offset)
+                if offset - synced >= segment_size:
+                    # 每个分段落盘后再记录进度
+                    f.flush()
+                    os.fsync(f.fileno())
+                    _write_journal(journal_path, identity, offset)
+                    synced = offset
+        except DownloadInterrupted as e:
+            # 先落盘再记录进度，日志中的进度不会超过已落盘的数据
+            f.flush()
+            os.fsync(f.fileno())
+            cause = e.__cause__
+            if isinstance(cause, urllib.error.HTTPError) and cause.code == 416:
+                # 请求范围无效，说明本地数据已不可信
+                f.truncate(0)
+                offset = 0
+            _write_journal(journal_path, identity, offset)
+            raise
+        f.flush()
+        os.fsync(f.fileno())
+
+    size = os.path.getsize(part_path)
+    if size != total:
+        _remove(part_path)
+        _remove(journal_path)
+        raise Exception(f"文件大小校验失败: 期望 {total} 字节，实际 {size} 字节")
+
+    os.replace(part_path, file_path)
+    _remove(journal_path)
+    return file_path
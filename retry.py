@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按错误类型重试
+把下载错误分为四类：网络中断（换线路后从 .part 文件的中断处续传）、被限流（等待更久）、
+提取失败（流地址过期或客户端被拒绝，重新提取信息后再试，次数有限）和永久错误（视频不可用、
+磁盘已满等，不再重试）。重试间隔按指数增长并加入随机抖动，多个任务不会同时重连；
+总等待时间受重试预算限制。每次重试前如果又下载了新的数据，连续失败次数清零
+"""
+
+import errno
+import random
+import re
+import ssl
+import socket
+import http.client
+import urllib.error
+
+# 错误类型
+TRANSIENT = "transient"   # 网络中断、超时、SSL 握手失败、服务器 5xx
+THROTTLED = "throttled"   # HTTP 429、人机验证
+EXTRACTOR = "extractor"   # 流地址过期（403/404/410）、客户端被拒绝、无法解析页面
+PERMANENT = "permanent"   # 视频不可用、链接无效、磁盘已满、已取消
+
+# 连续失败（期间没有新数据）的最大尝试次数
+DEFAULT_MAX_ATTEMPTS = 5
+
+# 第一次重试的基础等待时间（秒），之后每次加倍
+BASE_DELAY = 1.0
+
+# 单次等待的上限（秒）
+MAX_DELAY = 60.0
+
+# 被限流时的基础等待时间（秒）
+THROTTLED_DELAY = 15.0
+
+# 服务器要求的 Retry-After 最多等待的时间（秒）
+MAX_RETRY_AFTER = 300.0
+
+# 一个任务所有重试合计的最长等待时间（秒）
+RETRY_BUDGET = 600.0
+
+# 提取失败最多重试的次数（重新提取后仍失败通常是视频本身的问题）
+EXTRACTOR_ATTEMPTS = 2
+
+# 类型的优先级：错误链中出现多种类型时取优先级最高的
+_PRIORITY = (PERMANENT, THROTTLED, EXTRACTOR, TRANSIENT)
+
+# 磁盘和权限错误，重试也不会成功
+_DISK_ERRNOS = {errno.ENOSPC, errno.EACCES, errno.EPERM, errno.EROFS, errno.ENAMETOOLONG,
+                getattr(errno, "EDQUOT", errno.ENOSPC)}
+
+# pytubefix 和下载引擎中表示不能重试的异常（按类名匹配，不必导入 pytubefix）
+_PERMANENT_NAMES = {
+    "RegexMatchError", "VideoUnavailable", "VideoPrivate", "MembersOnly", "AgeRestrictedError",
+    "LiveStreamError", "VideoRegionBlocked", "RecordingUnavailable", "DownloadCancelled",
+}
+_THROTTLED_NAMES = {"BotDetection"}
+
+# yt-dlp 自己的网络异常（yt_dlp.networking.exceptions，同样按类名匹配）
+_TRANSIENT_NAMES = {"TransportError", "IncompleteRead", "ProxyError", "CertificateVerifyError"}
+
+# 只有错误信息可用时（yt-dlp 的 DownloadError 等）按信息判断，依次匹配
+_MESSAGE_PATTERNS = (
+    (PERMANENT, re.compile(r"Private video|Video unavailable|This video is private|members-only|"
+                           r"copyright claim|has been removed|No space left|Permission denied|Unsupported URL",
+                           re.IGNORECASE)),
+    (THROTTLED, re.compile(r"HTTP Error 429|Too Many Requests|not a bot|rate.?limit", re.IGNORECASE)),
+    (EXTRACTOR, re.compile(r"HTTP Error (403|404|410)|ANDROID_VR client returned|Switching to client|"
+                           r"Unable to extract|Requested format is not available|文件大小校验失败",
+                           re.IGNORECASE)),
+    (TRANSIENT, re.compile(r"SSL|EOF occurred|连接错误|timed out|Connection (reset|refused|aborted)|"
+                           r"Remote end closed|IncompleteRead|HTTP Error 5\d\d|Temporary failure|"
+                           r"Network is unreachable", re.IGNORECASE)),
+)
+
+
+def _chain(error):
+    """错误本身及其原因（__cause__、__context__，以及 yt-dlp DownloadError 包装的原始异常）"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, "exc_info", None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = error.__cause__ or wrapped or error.__context__
+
+
+def _http_status(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    if type(error).__name__ == "HTTPError":
+        # yt-dlp 的 HTTPError 用 status
+        status = getattr(error, "status", None)
+        return status if isinstance(status, int) else None
+    return None
+
+
+def _classify_one(error):
+    """按异常类型判断单个异常，无法判断时返回 None"""
+    name = type(error).__name__
+    if name in _PERMANENT_NAMES:
+        return PERMANENT
+    if name in _THROTTLED_NAMES:
+        return THROTTLED
+    status = _http_status(error)
+    if status is not None:
+        if status == 429:
+            return THROTTLED
+        if status in (403, 404, 410):
+            return EXTRACTOR
+        if status >= 500 or status in (408, 416):
+            # 416 时续传位置已重置，重新下载即可
+            return TRANSIENT
+        return PERMANENT
+    if isinstance(error, (ssl.SSLError, socket.timeout, TimeoutError, http.client.HTTPException,
+                          urllib.error.URLError, ConnectionError)):
+        return TRANSIENT
+    if isinstance(error, OSError):
+        return PERMANENT if error.errno in _DISK_ERRNOS else TRANSIENT
+    if name in _TRANSIENT_NAMES:
+        return TRANSIENT
+    return None
+
+
+def _classify_message(message):
+    for kind, pattern in _MESSAGE_PATTERNS:
+        if pattern.search(message):
+            return kind
+    return None
+
+
+def classify(error):
+    """返回错误的类型（TRANSIENT、THROTTLED、EXTRACTOR 或 PERMANENT）
+
+    沿着错误链判断每个异常，取优先级最高的类型；都无法判断时按提取失败处理（有限次数重试）。
+    """
+    kinds = set()
+    for item in _chain(error):
+        kind = _classify_one(item)
+        if kind is None:
+            kind = _classify_message(str(item))
+        if kind is not None:
+            kinds.add(kind)
+    for kind in _PRIORITY:
+        if kind in kinds:
+            return kind
+    return EXTRACTOR
+
+
+def retry_after(error):
+    """服务器在 Retry-After 中要求等待的秒数，没有时返回 None"""
+    for item in _chain(error):
+        headers = getattr(item, "headers", None)
+        value = headers.get("Retry-After") if headers is not None else None
+        if value is None:
+            continue
+        try:
+            return min(MAX_RETRY_AFTER, max(0.0, float(value)))
+        except ValueError:
+            # 日期格式的 Retry-After 不解析，按限流的默认间隔等待
+            return None
+    return None
+
+
+def retained_bytes(error):
+    """中断时已保留在 .part 文件中的字节数（来自 DownloadInterrupted），没有时返回 0"""
+    for item in _chain(error):
+        downloaded = getattr(item, "downloaded", None)
+        if isinstance(downloaded, int):
+            return downloaded
+    return 0
+
+
+def backoff(attempt, base=BASE_DELAY, cap=MAX_DELAY, full_jitter=True):
+    """第 attempt 次重试（从 0 开始）的等待时间
+
+    上限按 base * 2^attempt 增长，不超过 cap。full_jitter 为 True 时在 [0, 上限] 中随机取值，
+    否则在 [上限/2, 上限] 中取值（保证至少等待一半）。
+    """
+    ceiling = min(cap, base * (2 ** min(attempt, 16)))
+    if full_jitter:
+        return random.uniform(0, ceiling)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class RetryPolicy:
+    """重试策略：最大尝试次数、等待时间和重试预算"""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY,
+                 throttled_delay=THROTTLED_DELAY, budget=RETRY_BUDGET, extractor_attempts=EXTRACTOR_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttled_delay = throttled_delay
+        self.budget = budget
+        self.extractor_attempts = extractor_attempts
+
+    def delay(self, kind, attempt):
+        """第 attempt 次重试（从 0 开始）前等待的秒数"""
+        if kind == THROTTLED:
+            # 被限流时至少等待一半，避免立即再次触发
+            return backoff(attempt, self.throttled_delay, max(self.max_delay, self.throttled_delay), False)
+        return backoff(attempt, self.base_delay, self.max_delay)
+
+
+class RetryState:
+    """一个任务的重试状态
+
+    每次出错调用 next_delay(error)，返回重试前等待的秒数，不应再重试时返回 None。
+    两次出错之间下载了新数据（DownloadInterrupted.downloaded 或 downloaded 参数增大）时，
+    连续失败次数清零，长时间下载中偶尔断线不会耗尽重试次数；等待时间仍计入重试预算。
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or RetryPolicy()
+        self.attempts = 0          # 已失败的次数
+        self.failures = 0          # 连续失败（期间没有新数据）的次数
+        self.extractor_failures = 0
+        self.waited = 0.0          # 已计入预算的等待时间（秒）
+        self.high_water = 0        # 已保留的最大字节数
+        self.last_error = None
+        self.last_kind = None
+
+    def next_delay(self, error, downloaded=None):
+        kind = classify(error)
+        self.attempts += 1
+        self.last_error = error
+        self.last_kind = kind
+        if kind == PERMANENT:
+            return None
+
+        retained = max(retained_bytes(error), downloaded or 0)
+        if retained > self.high_water:
+            self.high_water = retained
+            self.failures = 0
+        self.failures += 1
+        if self.failures >= self.policy.max_attempts:
+            return None
+        if kind == EXTRACTOR:
+            self.extractor_failures += 1
+            if self.extractor_failures > self.policy.extractor_attempts:
+                return None
+
+        delay = self.policy.delay(kind, self.failures - 1)
+        requested = retry_after(error)
+        if requested is not None:
+            delay = max(delay, requested)
+        if self.waited + delay > self.policy.budget:
+            return None
+        self.waited += delay
+        return delay
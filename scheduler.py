@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+下载任务调度器
+使用固定数量的工作线程执行下载任务，支持全局并发上限、单主机并发上限和任务优先级
+"""
+
+import heapq
+import itertools
+import threading
+from urllib.parse import urlparse
+
+# 默认全局并发下载数
+DEFAULT_MAX_CONCURRENT = 3
+
+# 默认单个主机的并发下载数，低于全局并发上限（YouTube 的任务几乎都落在同一上游）
+DEFAULT_MAX_PER_HOST = 2
+
+
+def host_of(url):
+    """从URL中提取主机名，用于单主机并发限制"""
+    try:
+        host = urlparse(url).hostname or ""
+    except ValueError:
+        host = ""
+    host = host.lower()
+    # youtu.be / m.youtube.com 等都指向同一上游
+    if host.endswith("youtube.com") or host == "youtu.be":
+        return "youtube.com"
+    return host
+
+
+class DownloadScheduler:
+    """带优先级的有界下载调度器
+
+    任务按优先级（数值越大越先执行）和提交顺序排队，
+    工作线程在任务之间复用，不会为每个视频创建新线程。
+    max_per_host 限制同一主机同时运行的任务数，为 None 时不单独限制（跟随全局并发上限）。
+    """
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, max_per_host=DEFAULT_MAX_PER_HOST):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue = []                 # 堆: (-优先级, 序号, 任务ID)
+        self._jobs = {}                  # 任务ID -> (函数, 主机)
+        self._counter = itertools.count()
+        self._host_active = {}           # 主机 -> 正在运行的任务数
+        self._running = set()            # 正在运行的任务ID
+        self._max_concurrent = max(1, int(max_concurrent))
+        self._max_per_host = None if max_per_host is None else max(1, int(max_per_host))
+        self._workers = []
+        self._shutdown = False
+        self._ensure_workers()
+
+    @property
+    def max_concurrent(self):
+        return self._max_concurrent
+
+    @property
+    def max_per_host(self):
+        """当前生效的单主机并发上限"""
+        return self._max_concurrent if self._max_per_host is None else self._max_per_host
+
+    def set_max_concurrent(self, value):
+        """运行时调整全局并发上限"""
+        with self._cond:
+            self._max_concurrent = max(1, int(value))
+            self._ensure_workers()
+            self._cond.notify_all()
+
+    def set_max_per_host(self, value):
+        """运行时调整单主机并发上限，None 表示不单独限制（跟随全局并发上限）"""
+        with self._cond:
+            self._max_per_host = None if value is None else max(1, int(value))
+            self._cond.notify_all()
+
+    def submit(self, func, job_id, url=None, priority=0):
+        """提交任务，同一任务ID在排队或运行期间不会重复提交
+
+        返回是否成功加入队列
+        """
+        with self._cond:
+            if self._shutdown or job_id in self._jobs:
+                return False
+            self._jobs[job_id] = (func, host_of(url) if url else "")
+            heapq.heappush(self._queue, (-priority, next(self._counter), job_id))
+            self._cond.notify()
+            return True
+
+    def cancel(self, job_id):
+        """取消尚未开始的任务，返回是否取消成功"""
+        with self._cond:
+            if job_id in self._running or job_id not in self._jobs:
+                return False
+            del self._jobs[job_id]
+            # 懒删除：队列中的条目在出队时被跳过
+            return True
+
+    def pending_count(self):
+        """排队中的任务数"""
+        with self._lock:
+            return len(self._jobs) - len(self._running)
+
+    def running_count(self):
+        """正在执行的任务数"""
+        with self._lock:
+            return len(self._running)
+
+    def shutdown(self, wait=False):
+        """停止调度，丢弃排队中的任务"""
+        with self._cond:
+            self._shutdown = True
+            for job_id in list(self._jobs):
+                if job_id not in self._running:
+                    del self._jobs[job_id]
+            self._queue = []
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _ensure_workers(self):
+        """保证工作线程数量不少于并发上限（需持有锁）"""
+        while len(self._workers) < self._max_concurrent:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"download-worker-{len(self._workers)}",
+                daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_job(self):
+        """取出优先级最高且主机未满的任务（需持有锁）"""
+        skipped = []
+        picked = None
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            job_id = entry[2]
+            if job_id not in self._jobs or job_id in self._running:
+                continue  # 已取消
+            host = self._jobs[job_id][1]
+            if host and self._host_active.get(host, 0) >= self.max_per_host:
+                skipped.append(entry)
+                continue
+            picked = job_id
+            break
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return picked
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        index = int(threading.current_thread().name.rsplit("-", 1)[-1])
+        while True:
+            with self._cond:
+                while True:
+                    if self._shutdown:
+                        return
+                    # 并发上限调低后，多余的工作线程进入等待
+                    if index < self._max_concurrent and len(self._running) < self._max_concurrent:
+                        job_id = self._next_job()
+                        if job_id is not None:
+                            break
+                    self._cond.wait()
+
+                func, host = self._jobs[job_id]
+                self._running.add(job_id)
+                if host:
+                    self._host_active[host] = self._host_active.get(host, 0) + 1
+
+            try:
+                func()
+            except Exception:
+                # 任务自身负责上报错误，这里只保证工作线程不退出
+                pass
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+                    self._jobs.pop(job_id, None)
+                    if host:
+                        self._host_active[host] -= 1
+                        if self._host_active[host] <= 0:
+                            del self._host_active[host]
+                    self._cond.notify_all()
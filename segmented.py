@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多连接分段下载
+已知大小的单文件流（pytubefix 的流、yt-dlp 的非分片格式）拆成多个范围，由几个连接同时下载，
+直接写入预先分配好大小的 .part 文件中对应的位置。某个连接空闲时从剩余最多（通常也是最慢）的
+范围中分走后一半，慢连接不会拖住整个下载。日志记录未完成的范围，中断后只下载缺少的部分；
+代理中途失效时未完成的范围换到另一个代理继续（见 proxy_pool）
+"""
+
+import http.client
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from bandwidth import bind_limit, throttle
+from http_pool import get_http_pool
+from proxy_session import ProxyConfig, bind_route, build_opener, current_failover
+from resumable import (DownloadInterrupted, MIN_SEGMENTED_SIZE, READ_SIZE, REQUEST_TIMEOUT,
+                       part_paths, read_journal)
+from retry import backoff
+
+# 默认连接数（低于连接池对同一主机的上限，给元数据请求留出连接）
+DEFAULT_CONNECTIONS = 4
+
+# 剩余部分小于这个大小的范围不再拆分（字节）
+MIN_SPLIT_SIZE = 1024 * 1024
+
+# 每个 Range 请求的最大字节数，请求结束后连接回到连接池
+REQUEST_SIZE = 4 * 1024 * 1024
+
+# 同一个范围连续失败的重试次数
+SEGMENT_RETRIES = 3
+
+# 重试前等待的基础时间（秒），按失败次数指数增长并随机抖动
+RETRY_DELAY = 1.0
+
+# 落盘并记录日志的间隔（秒）
+JOURNAL_INTERVAL = 1.0
+
+_HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Language": "en-US,en"}
+
+_NETWORK_ERRORS = (urllib.error.URLError, http.client.HTTPException, ssl.SSLError, socket.timeout, OSError)
+
+
+class RangeNotSupported(Exception):
+    """服务器不支持 Range 请求（或返回的大小与预期不符），只能单连接下载"""
+
+
+class _Segment:
+    """一个待下载的范围：start 为下一个要写入的位置，end 为最后一个字节（含）"""
+
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @property
+    def remaining(self):
+        return max(0, self.end - self.start + 1)
+
+
+def remaining_ranges(journal, identity, total):
+    """根据日志计算还需下载的范围 [(start, end)]，日志与当前文件不一致时从头下载
+
+    也接受单连接下载的日志（只有已确认写入的前缀 downloaded）。
+    """
+    if not journal or any(journal.get(key) != value for key, value in identity.items()):
+        return [(0, total - 1)]
+    if "segments" in journal:
+        ranges = []
+        for start, end in journal["segments"]:
+            start, end = max(0, int(start)), min(total - 1, int(end))
+            if start <= end:
+                ranges.append((start, end))
+        return ranges
+    downloaded = int(journal.get("downloaded", 0))
+    return [(downloaded, total - 1)] if downloaded < total else []
+
+
+class SegmentedDownloader:
+    """用多个连接把 url 的 [0, total) 下载到 part_path
+
+    opener 为 None 时使用全局 urlopen（走当前线程的代理线路）。工作线程沿用调用线程的代理线路
+    和任务限速；throttled 为 False 时这里不限速，由调用方的进度回调限速。
+    on_progress(downloaded, total) 在工作线程中调用，同一时间只有一个线程在调用。
+    failover(error) 在同一线路上重试用尽后调用，返回另一个线路的 opener，未完成的范围在新线路上继续。
+    request_size 为每个 Range 请求的最大字节数。
+    """
+
+    def __init__(self, url, total, part_path, journal_path=None, identity=None, headers=None,
+                 opener=None, connections=DEFAULT_CONNECTIONS, timeout=REQUEST_TIMEOUT,
+                 on_progress=None, throttled=True, failover=None, request_size=REQUEST_SIZE):
+        self.url = url
+        self.total = total
+        self.part_path = part_path
+        self.journal_path = journal_path
+        self.identity = identity or {}
+        self.headers = dict(_HEADERS, **(headers or {}))
+        self.opener = opener
+        self.connections = max(1, int(connections))
+        self.request_size = max(READ_SIZE, int(request_size))
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.throttled = throttled
+        self.failover = failover
+        self.downloaded = 0
+        self._lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        self._failover_lock = threading.Lock()
+        self._queue = []      # 还没有连接认领的范围
+        self._active = []     # 正在下载的范围
+        self._error = None
+        self._fd = None
+
+    def run(self, ranges=None):
+        """下载 ranges（默认整个文件）中的所有范围
+
+        网络错误抛出 DownloadInterrupted，已完成的范围记录在日志中；
+        进度回调抛出的异常（例如取消下载）原样抛出。
+        """
+        if ranges is None:
+            ranges = [(0, self.total - 1)]
+        self._queue = [_Segment(start, end) for start, end in ranges]
+        self.downloaded = self.total - sum(segment.remaining for segment in self._queue)
+
+        self._fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            # 预先分配文件大小，各连接直接写入自己的位置
+            if os.fstat(self._fd).st_size != self.total:
+                os.ftruncate(self._fd, self.total)
+            self._write_journal()
+            if self.on_progress and self.downloaded:
+                self.on_progress(self.downloaded, self.total)
+
+            # 小文件按 MIN_SPLIT_SIZE 限制连接数
+            count = min(self.connections, max(len(self._queue), (self.total - self.downloaded) // MIN_SPLIT_SIZE))
+            workers = [
+                threading.Thread(target=bind_route(bind_limit(self._worker)), daemon=True, name=f"segment-{i}")
+                for i in range(max(1, count))
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(JOURNAL_INTERVAL)
+                    self._write_journal()
+            self._write_journal()
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+        if self._error is not None:
+            raise self._error
+        if self.downloaded != self.total:
+            raise DownloadInterrupted(
+                f"连接错误: 分段下载未完成 ({self.downloaded}/{self.total} 字节)", self.downloaded, self.total
+            )
+
+    def _next_segment(self):
+        """认领下一个范围；没有排队的范围时拆分剩余最多的正在下载的范围"""
+        with self._lock:
+            if self._error is not None:
+                return None
+            if self._queue:
+                segment = self._queue.pop(0)
+                self._active.append(segment)
+                return segment
+            if not self._active:
+                return None
+            largest = max(self._active, key=lambda s: s.remaining)
+            if largest.remaining < MIN_SPLIT_SIZE * 2:
+                return None
+            middle = largest.start + largest.remaining // 2
+            segment = _Segment(middle, largest.end)
+            largest.end = middle - 1
+            self._active.append(segment)
+            return segment
+
+    def _worker(self):
+        try:
+            while True:
+                segment = self._next_segment()
+                if segment is None:
+                    return
+                try:
+                    self._fetch_segment(segment)
+                finally:
+                    with self._lock:
+                        self._active.remove(segment)
+                        if segment.remaining:
+                            # 没有下载完的范围留在日志中，下次续传
+                            self._queue.append(segment)
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+
+    def _fetch_segment(self, segment):
+        failures = 0
+        while True:
+            with self._lock:
+                if self._error is not None or segment.remaining == 0:
+                    return
+                start = segment.start
+                stop = min(segment.end, start + self.request_size - 1)
+                opener = self.opener
+            try:
+                self._fetch_range(segment, start, stop, opener)
+                failures = 0
+            except urllib.error.HTTPError as e:
+                # 4xx（地址过期、范围无效）重试也不会成功，限流（429）时等待后重试
+                failures = None if e.code < 500 and e.code != 429 else self._retry(opener, failures, e)
+                if failures is None:
+                    raise DownloadInterrupted(
+                        f"连接错误: HTTP {e.code}，已下载 {self.downloaded}/{self.total} 字节",
+                        self.downloaded, self.total
+                    ) from e
+            except _NETWORK_ERRORS as e:
+                failures = self._retry(opener, failures, e)
+                if failures is None:
+                    raise DownloadInterrupted(
+                        f"连接错误: 下载中断于 {self.downloaded}/{self.total} 字节: {e}", self.downloaded, self.total
+                    ) from e
+
+    def _retry(self, opener, failures, error):
+        """网络错误后先在同一线路上重试，用尽后切换线路；返回新的连续失败次数，放弃时返回 None"""
+        with self._lock:
+            if self.opener is not opener:
+                # 其他连接已经切换了线路
+                return 0
+        if failures < SEGMENT_RETRIES:
+            time.sleep(backoff(failures, RETRY_DELAY))
+            return failures + 1
+        if self.failover is None:
+            return None
+        with self._failover_lock:
+            if self.opener is opener:
+                new_opener = self.failover(error)
+                if new_opener is None:
+                    return None
+                with self._lock:
+                    self.opener = new_opener
+        return 0
+
+    def _fetch_range(self, segment, start, stop, opener):
+        request = urllib.request.Request(self.url, headers=dict(self.headers, Range=f"bytes={start}-{stop}"))
+        open_url = opener.open if opener is not None else urllib.request.urlopen
+        with open_url(request, timeout=self.timeout) as response:
+            if response.status != 206:
+                raise RangeNotSupported(f"服务器不支持分段下载 (HTTP {response.status})")
+            content_range = response.headers.get("Content-Range", "")
+            if not content_range.endswith(f"/{self.total}"):
+                raise RangeNotSupported(f"文件大小与预期不符: {content_range}")
+            offset = start
+            while offset <= stop:
+                chunk = response.read(min(READ_SIZE, stop - offset + 1))
+                if not chunk:
+                    raise http.client.IncompleteRead(b"", stop - offset + 1)
+                if self.throttled:
+                    throttle(len(chunk))
+                with self._lock:
+                    if self._error is not None:
+                        return
+                    # 范围的后一半可能已经被其他连接分走
+                    chunk = chunk[:max(0, segment.end - offset + 1)]
+                if not chunk:
+                    return
+                os.pwrite(self._fd, chunk, offset)
+                offset += len(chunk)
+                with self._lock:
+                    segment.start = offset
+                    self.downloaded += len(chunk)
+                    downloaded = self.downloaded
+                if self.on_progress:
+                    with self._progress_lock:
+                        self.on_progress(downloaded, self.total)
+                if offset > segment.end:
+                    return
+
+    def _write_journal(self):
+        """落盘后记录未完成的范围，日志中的进度不会超过已落盘的数据"""
+        if self.journal_path is None or self._fd is None:
+            return
+        with self._lock:
+            ranges = [[s.start, s.end] for s in self._queue + self._active if s.remaining]
+        os.fsync(self._fd)
+        # downloaded 为连续完成的前缀，单连接下载可以从这里续传
+        data = dict(self.identity, segments=ranges, downloaded=min((r[0] for r in ranges), default=self.total))
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.journal_path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _keep_prefix(part_path, journal_path, identity):
+    """只保留日志中连续完成（已落盘）的前缀，日志改为单连接下载的格式"""
+    journal = read_journal(journal_path)
+    if not journal or any(journal.get(key) != value for key, value in identity.items()):
+        _remove(part_path)
+        _remove(journal_path)
+        return
+    downloaded = int(journal.get("downloaded", 0))
+    try:
+        with open(part_path, "r+b") as f:
+            # 预先分配的文件长度等于总大小，截断后 yt-dlp 按文件长度续传也不会出错
+            f.truncate(downloaded)
+    except OSError:
+        _remove(part_path)
+        _remove(journal_path)
+        return
+    data = dict(identity, downloaded=downloaded)
+    tmp_path = journal_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, journal_path)
+
+
+def _trim_part(file_path):
+    """交给 yt-dlp 自己的下载器之前，把分段下载留下的 .part 文件截断到连续完成的前缀
+
+    进程在分段下载中途退出时文件仍是预先分配的长度，yt-dlp 按文件长度续传会把空洞当作已下载的数据。
+    """
+    part_path, journal_path = part_paths(file_path)
+    journal = read_journal(journal_path)
+    if isinstance(journal, dict) and "segments" in journal and os.path.exists(part_path):
+        identity = {key: value for key, value in journal.items() if key not in ("segments", "downloaded")}
+        _keep_prefix(part_path, journal_path, identity)
+
+
+def download_file(url, total, file_path, identity=None, headers=None, opener=None,
+                  connections=DEFAULT_CONNECTIONS, on_progress=None, throttled=True, failover=None,
+                  request_size=REQUEST_SIZE):
+    """分段下载到 file_path，经由 .part 文件并支持续传，返回 file_path
+
+    failover 默认为当前线程的线路切换函数（见 proxy_session.routed）。
+    下载失败时 .part 文件截断到连续完成的前缀（服务器不支持 Range 时抛出 RangeNotSupported，
+    调用方改为单连接下载并从前缀处续传）。
+    """
+    if failover is None:
+        failover = current_failover()
+    part_path, journal_path = part_paths(file_path)
+    identity = dict(identity or {}, filesize=total)
+    if os.path.exists(part_path):
+        ranges = remaining_ranges(read_journal(journal_path), identity, total)
+    else:
+        ranges = [(0, total - 1)]
+    downloader = SegmentedDownloader(url, total, part_path, journal_path, identity, headers, opener,
+                                     connections, on_progress=on_progress, throttled=throttled,
+                                     failover=failover, request_size=request_size)
+    try:
+        downloader.run(ranges)
+    except Exception as e:
+        cause = e.__cause__
+        if isinstance(e, DownloadInterrupted) and isinstance(cause, urllib.error.HTTPError) and cause.code == 416:
+            # 请求范围无效，说明本地数据已不可信，下次从头下载
+            _remove(part_path)
+            _remove(journal_path)
+        else:
+            # 预先分配的文件中还有没写入的空洞，下次可能交给按文件长度续传的 yt-dlp
+            _keep_prefix(part_path, journal_path, identity)
+        raise
+    os.replace(part_path, file_path)
+    _remove(journal_path)
+    return file_path
+
+
+def probe_size(url, headers=None, opener=None, timeout=REQUEST_TIMEOUT):
+    """用一个字节的 Range 请求获取文件大小，服务器不支持 Range 时返回 None"""
+    request = urllib.request.Request(url, headers=dict(_HEADERS, **(headers or {}), Range="bytes=0-0"))
+    open_url = opener.open if opener is not None else urllib.request.urlopen
+    try:
+        with open_url(request, timeout=timeout) as response:
+            if response.status != 206:
+                return None
+            response.read()
+            total = response.headers.get("Content-Range", "").rpartition("/")[2].strip()
+            return int(total) if total.isdigit() else None
+    except _NETWORK_ERRORS:
+        return None
+
+
+# yt-dlp 使用的 SSL 上下文，按是否校验证书共用（同一个上下文的连接才会在连接池中复用）
+_ssl_contexts = {}
+_ssl_contexts_lock = threading.Lock()
+
+
+def _ssl_context(verify):
+    with _ssl_contexts_lock:
+        context = _ssl_contexts.get(verify)
+        if context is None:
+            context = ssl.create_default_context()
+            if not verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            _ssl_contexts[verify] = context
+        return context
+
+
+def _ytdlp_opener(params):
+    """按 yt-dlp 的代理和证书选项构建 opener"""
+    proxy = params.get('proxy')
+    return build_opener(ProxyConfig.parse(proxy) if proxy else None,
+                        _ssl_context(not (params.get('nocheckcertificate') or params.get('no_check_certificate'))))
+
+
+def _ytdlp_eligible(ydl, name, info, subtitle, test):
+    """是否可以代替 yt-dlp 下载：单文件 HTTP 格式，没有指定外部下载器"""
+    return (not subtitle and not test and name != '-'
+            and info.get('protocol') in ('http', 'https')
+            and not info.get('fragments') and not info.get('is_live')
+            and not ydl.params.get('external_downloader')
+            and not ydl.params.get('test'))
+
+
+def ytdlp_download(ydl, name, info):
+    """用分段下载完成 yt-dlp 的一次下载，返回 (成功, 实际下载)；文件太小或大小未知时返回 None
+
+    进度按 yt-dlp 的格式交给 ydl 的进度回调，限速、进度显示和调优都在回调中完成。
+    连接数和每个请求的大小取自任务的 concurrent_fragment_downloads 和 http_chunk_size
+    （由 autotune 按线路调优），没有设置时使用默认值。
+    """
+    opener = _ytdlp_opener(ydl.params)
+    headers = info.get('http_headers') or {}
+    total = info.get('filesize') or probe_size(info['url'], headers, opener)
+    if not total or total < MIN_SEGMENTED_SIZE:
+        return None
+
+    os.makedirs(os.path.dirname(os.path.abspath(name)), exist_ok=True)
+    started = time.monotonic()
+    base = {'filename': name, 'tmpfilename': part_paths(name)[0], 'total_bytes': total, 'info_dict': info}
+
+    def report(downloaded, _total):
+        elapsed = time.monotonic() - started
+        speed = downloaded / elapsed if elapsed > 0 else None
+        eta = (total - downloaded) / speed if speed else None
+        for hook in list(ydl._progress_hooks):
+            hook(dict(base, status='downloading', downloaded_bytes=downloaded,
+                      elapsed=elapsed, speed=speed, eta=eta))
+
+    identity = {'video_id': info.get('id'), 'format_id': info.get('format_id')}
+    connections = ydl.params.get('concurrent_fragment_downloads') or DEFAULT_CONNECTIONS
+    # 连接池对同一主机的连接数有上限，留一个连接给元数据请求，多出的连接只会排队等待
+    connections = max(1, min(connections, get_http_pool().max_per_host - 1))
+    request_size = ydl.params.get('http_chunk_size') or REQUEST_SIZE
+    download_file(info['url'], total, name, identity, headers, opener, connections=connections,
+                  on_progress=report, throttled=False, request_size=request_size)
+    for hook in list(ydl._progress_hooks):
+        hook(dict(base, status='finished', downloaded_bytes=total, elapsed=time.monotonic() - started))
+    return True, True
+
+
+_ytdlp_class = None
+_ytdlp_class_lock = threading.Lock()
+
+
+def segmented_youtubedl():
+    """返回单文件格式改用分段下载的 YoutubeDL 子类（第一次调用时导入 yt_dlp）"""
+    global _ytdlp_class
+    with _ytdlp_class_lock:
+        if _ytdlp_class is None:
+            import yt_dlp
+
+            class SegmentedYoutubeDL(yt_dlp.YoutubeDL):
+                def dl(self, name, info, subtitle=False, test=False):
+                    if _ytdlp_eligible(self, name, info, subtitle, test):
+                        try:
+                            result = ytdlp_download(self, name, info)
+                        except RangeNotSupported:
+                            result = None
+                        if result is not None:
+                            return result
+                    if name != '-':
+                        _trim_part(name)
+                    return super().dl(name, info, subtitle=subtitle, test=test)
+
+            _ytdlp_class = SegmentedYoutubeDL
+        return _ytdlp_class
@@ -10,18 +10,21 @@
 import os
 import sys
 import argparse
-import importlib.util
 import time
-import shutil
 import re
 
+from bandwidth import get_limiter, parse_rate
+from capabilities import get_capabilities
+from download_engine import DownloadRequest, get_engine, normalize_resolution
+from postprocess import ffmpeg_thread_args
+
 # 检查是否安装了 yt-dlp
-YTDLP_AVAILABLE = importlib.util.find_spec("yt_dlp") is not None
+YTDLP_AVAILABLE = get_capabilities().ytdlp
 
 # 检查是否安装了 ffmpeg
 def is_ffmpeg_installed():
     """检查系统是否安装了 ffmpeg"""
-    return shutil.which('ffmpeg') is not None
+    return get_capabilities().ffmpeg
 
 # 全局变量，存储 ffmpeg 安装状态
 FFMPEG_AVAILABLE = is_ffmpeg_installed()
@@ -57,88 +60,64 @@ def progress_hook(d):
         sys.stdout.write(f"下载完成，正在处理文件...\n")
         sys.stdout.flush()
 
-def download_with_ytdlp(url, resolution=None, download_path=None, proxy=None):
+def download_with_ytdlp(url, resolution=None, download_path=None, proxy=None, force=False):
     """使用 yt-dlp 下载视频"""
     if not YTDLP_AVAILABLE:
         print("错误: 未安装 yt-dlp 库，请运行: pip install yt-dlp")
         return False
     
     try:
-        import yt_dlp
-        
         # 设置默认下载路径
         if not download_path:
             download_path = os.path.expanduser("~/Downloads")
-            
-        # 确保下载路径存在
-        os.makedirs(download_path, exist_ok=True)
-        
-        # 设置代理
-        proxy_opts = {}
-        if proxy:
-            proxy_opts = {'proxy': proxy}
         
         # 创建文件名
         safe_title = f"youtube_video_{int(time.time())}"
-        output_file = os.path.join(download_path, f"{safe_title}.mp4")
         
-        # 设置格式
-        format_spec = 'bestvideo+bestaudio/best'
-        if resolution == "audio":
-            format_spec = 'bestaudio/best'
-            output_file = os.path.join(download_path, f"{safe_title}.mp3")
-        elif resolution:
-            try:
-                height = int(resolution)
-                format_spec = f'bestvideo[height<={height}]+bestaudio/best[height<={height}]'
-            except ValueError:
-                print(f"警告: 无效的分辨率 '{resolution}'，使用最佳质量")
+        # 检查分辨率
+        try:
+            normalize_resolution(resolution)
+        except ValueError:
+            print(f"警告: 无效的分辨率 '{resolution}'，使用最佳质量")
+            resolution = None
         
-        # 创建 yt-dlp 选项
-        ydl_opts = {
-            'format': format_spec,
-            'outtmpl': output_file,
-            'no_check_certificate': True,  # 避免SSL证书问题
+        extra_opts = {
             'quiet': False,
             'no_warnings': False,  # 允许警告，以便捕获
-            'writesubtitles': True,        # 下载字幕
-            'writeautomaticsub': True,     # 下载自动生成的字幕
-            'subtitleslangs': ['zh-CN', 'zh-TW', 'en'],  # 优先下载中文和英文字幕
-            'subtitlesformat': 'srt',      # 使用SRT格式字幕
-            # 优化下载速度的参数
-            'concurrent_fragments': 5,     # 并发下载片段数，提高到5个
-            'retries': 10,                 # 重试次数增加到10次
-            'fragment_retries': 10,        # 片段重试次数
-            'buffersize': 1024*1024*16,    # 增加缓冲区到16MB
-            'http_chunk_size': 10485760,   # 10MB的块大小，提高吞吐量
-            'socket_timeout': 30,          # 增加超时时间
-            'extractor_retries': 5,        # 提取器重试次数
-            'file_access_retries': 5,      # 文件访问重试
-            **proxy_opts
         }
-        
         # 如果 ffmpeg 可用，设置后处理参数
         if FFMPEG_AVAILABLE:
-            ydl_opts['postprocessor_args'] = {
-                'ffmpeg': ['-threads', '4', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k']
+            extra_opts['postprocessor_args'] = {
+                'ffmpeg': ffmpeg_thread_args() + ['-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k']
             }
         # 如果 ffmpeg 不可用，使用单一格式
         elif resolution != "audio":
-            if resolution:
-                try:
-                    height = int(resolution)
-                    ydl_opts['format'] = f'best[height<={height}]/best'
-                except ValueError:
-                    ydl_opts['format'] = 'best'
-            else:
-                ydl_opts['format'] = 'best'
             print("警告: 未检测到ffmpeg，无法合并单独的视频和音频流。将下载包含音频的单一视频流，质量可能较低。")
         
-        # 下载视频
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        request = DownloadRequest(
+            url,
+            resolution=resolution,
+            output_path=download_path,
+            proxy=proxy,
+            outtmpl=os.path.join(download_path, f"{safe_title}.%(ext)s"),
+            subtitles=True,
+            ffmpeg=FFMPEG_AVAILABLE,
+            skip_archived=not force,
+            extra_opts=extra_opts
+        )
+        
+        # 下载存档中已有的视频不再提取信息和下载
+        entry = get_engine().archived(request)
+        if entry is not None:
+            print(f"已下载过，跳过: {entry.path} (使用 --force 重新下载)")
+            return True
+        
+        # 下载视频（文件和字幕路径来自 yt-dlp 的下载结果）
+        job = get_engine().run_job(request, on_progress=progress_hook)
         
-        print(f"下载完成! 文件保存在: {download_path}")
+        print(f"下载完成! 文件保存在: {job.filepath}")
+        for subtitle in job.subtitle_files:
+            print(f"字幕文件: {subtitle}")
         return True
         
     except Exception as e:
@@ -152,24 +131,8 @@ def list_formats(url, proxy=None):
         return False
     
     try:
-        import yt_dlp
-        
-        # 设置代理
-        proxy_opts = {}
-        if proxy:
-            proxy_opts = {'proxy': proxy}
-        
-        # 创建 yt-dlp 选项
-        ydl_opts = {
-            'listformats': True,
-            'no_check_certificate': True,  # 避免SSL证书问题
-            **proxy_opts
-        }
-        
         # 列出格式
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        
+        get_engine().list_formats(url, proxy)
         return True
         
     except Exception as e:
@@ -197,9 +160,14 @@ def main():
     parser.add_argument('-o', '--output', help='下载路径')
     parser.add_argument('-p', '--proxy', help='代理服务器 (例如: http://127.0.0.1:7897)')
     parser.add_argument('-l', '--list', action='store_true', help='列出可用的视频格式')
+    parser.add_argument('--limit-rate', type=parse_rate, default=0, help='总下载限速，例如 500K、2M (默认不限速)')
+    parser.add_argument('--force', action='store_true', help='忽略下载存档，重新下载已下载过的视频')
     
     args = parser.parse_args()
     
+    # 全局限速
+    get_limiter().set_rate(args.limit_rate)
+    
     # 检查是否需要安装 yt-dlp
     if not YTDLP_AVAILABLE:
         print("错误: 未安装 yt-dlp")
@@ -215,7 +183,7 @@ def main():
     if args.list:
         list_formats(args.url, args.proxy)
     else:
-        download_with_ytdlp(args.url, args.resolution, args.output, args.proxy)
+        download_with_ytdlp(args.url, args.resolution, args.output, args.proxy, force=args.force)
 
 if __name__ == "__main__":
     sys.exit(main()) 
\ No newline at end of file
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时记录
+在启动过程的各个阶段打点，`python main.py --startup-report` 时输出从进程启动到窗口可见的各阶段耗时
+"""
+
+import os
+import sys
+import time
+
+# 导入本模块的时间，进程启动到这里之间的解释器初始化时间单独估算
+_IMPORTED_AT = time.perf_counter()
+
+
+def _process_age():
+    """进程已运行的时间（秒），无法获取时返回 None"""
+    try:
+        # Linux: /proc/self/stat 第 22 项为进程启动时间（系统启动后的时钟节拍数）
+        with open("/proc/self/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - started)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTimer:
+    """按顺序记录启动阶段"""
+
+    def __init__(self):
+        age = _process_age()
+        # 进程启动时间换算到 perf_counter 时间轴，拿不到时从本模块导入时开始计时
+        self.origin = time.perf_counter() - age if age is not None else _IMPORTED_AT
+        self.marks = [("interpreter", _IMPORTED_AT)] if age is not None else []
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def phases(self):
+        """返回 [(阶段名, 阶段耗时毫秒, 累计毫秒)]"""
+        result = []
+        previous = self.origin
+        for name, at in self.marks:
+            result.append((name, (at - previous) * 1000, (at - self.origin) * 1000))
+            previous = at
+        return result
+
+    def report(self, stream=None):
+        stream = stream or sys.stderr
+        print("启动耗时:", file=stream)
+        for name, elapsed, total in self.phases():
+            print(f"  {name:<20} {elapsed:8.1f} ms  (累计 {total:8.1f} ms)", file=stream)
+        stream.flush()
+
+
+timer = StartupTimer()
+
+
+def mark(name):
+    """记录一个启动阶段的结束"""
+    timer.mark(name)
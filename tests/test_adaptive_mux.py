@@ -0,0 +1,98 @@
+import http.server
+import os
+import socketserver
+import threading
+
+import pytest
+
+import adaptive_mux
+from resumable import DownloadInterrupted
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="需要命名管道")
+
+DATA = os.urandom(3 * 1024 * 1024)
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """前 drops 个 1MB 之后的请求只返回一部分就断开；status 不为空时直接返回该状态码"""
+    protocol_version = "HTTP/1.1"
+    drops = 0
+    status = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.status:
+            self.send_response(self.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, stop = map(int, self.headers["Range"].split("=")[1].split("-"))
+        body = DATA[start:stop + 1]
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{stop}/{len(DATA)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if FlakyHandler.drops and start >= 1024 * 1024:
+            FlakyHandler.drops -= 1
+            self.wfile.write(body[:1000])
+            self.wfile.flush()
+            self.connection.close()
+            return
+        self.wfile.write(body)
+
+
+class FakeStream:
+    filesize = len(DATA)
+
+    def __init__(self, url):
+        self.url = url
+
+
+@pytest.fixture
+def server():
+    httpd = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FlakyHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/video"
+    httpd.shutdown()
+    httpd.server_close()
+    FlakyHandler.drops = 0
+    FlakyHandler.status = None
+
+
+def feed(url, tmp_path):
+    """用一个读取线程代替 ffmpeg，返回 (错误, 管道收到的数据)"""
+    fifo = os.path.join(str(tmp_path), "video")
+    os.mkfifo(fifo)
+    received = bytearray()
+
+    def read():
+        with open(fifo, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                received.extend(chunk)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    errors = []
+    adaptive_mux._feed(FakeStream(url), fifo, "video", adaptive_mux._Progress(len(DATA), None),
+                       threading.Event(), errors, 512 * 1024, 10)
+    reader.join()
+    return errors, bytes(received)
+
+
+def test_feed_resumes_in_place_without_part_files(server, tmp_path):
+    FlakyHandler.drops = 2
+    errors, received = feed(server, tmp_path)
+    assert errors == []
+    assert received == DATA
+    # 管道合并不写中间文件
+    assert os.listdir(str(tmp_path)) == ["video"]
+
+
+def test_feed_reports_expired_url(server, tmp_path):
+    FlakyHandler.status = 403
+    errors, received = feed(server, tmp_path)
+    assert [type(e) for e in errors] == [DownloadInterrupted]
+    assert received == b""
@@ -0,0 +1,76 @@
+import pytest
+
+from autotune import (CHUNK_SIZES, DEFAULT_CHUNK_INDEX, DEFAULT_FRAGMENTS, MAX_FRAGMENTS, Tuning,
+                      TuningSession, _RouteState)
+from bandwidth import get_limiter
+
+
+def test_tuning_bounds_and_opts():
+    assert Tuning(MAX_FRAGMENTS).step("fragments", 1) is None
+    assert Tuning(chunk_index=0).step("chunk", -1) is None
+    assert Tuning(99, 99) == Tuning(MAX_FRAGMENTS, len(CHUNK_SIZES) - 1)
+    # 同一线路上的任务平分并发片段数（向上取整）
+    assert Tuning(5).ytdlp_opts(active_jobs=2)['concurrent_fragment_downloads'] == 3
+
+
+def test_route_state_climbs_and_turns():
+    state = _RouteState()
+    base = Tuning()
+    assert state.candidate() == base
+    state.record(base, 100.0)
+
+    up = state.candidate()
+    assert up == Tuning(DEFAULT_FRAGMENTS + 1, DEFAULT_CHUNK_INDEX)
+    assert state.record(up, 120.0) == up
+    assert state.throughput == 120.0
+
+    # 提升不足 IMPROVEMENT 时反向
+    more = state.candidate()
+    assert state.record(more, 121.0) == up
+    assert state.direction == -1 and state.failures == 1
+    assert state.candidate() == base
+
+    # 两个方向都没有提升后换一个维度
+    state.record(base, 50.0)
+    assert state.dim == "chunk" and state.direction == 1
+    assert state.candidate() == Tuning(up.fragments, DEFAULT_CHUNK_INDEX + 1)
+
+
+def test_route_state_round_trip():
+    state = _RouteState()
+    state.record(Tuning(), 100.0)
+    state.record(state.candidate(), 200.0)
+    restored = _RouteState(state.to_dict())
+    assert restored.best == state.best
+    assert restored.to_dict() == state.to_dict()
+
+
+class RecordingTuner:
+    def __init__(self):
+        self.samples = []
+
+    def record(self, route, tuning, throughput):
+        self.samples.append(throughput)
+        return tuning
+
+
+def probe(session, seconds=6.0):
+    session.progress_hook({'status': 'downloading', 'filename': 'a', 'downloaded_bytes': 0})
+    session._started_at -= seconds
+    session.progress_hook({'status': 'downloading', 'filename': 'a', 'downloaded_bytes': 6000})
+
+
+def test_throttled_samples_are_not_recorded():
+    tuner = RecordingTuner()
+    probe(TuningSession(tuner, "direct", Tuning(), 1))
+    assert len(tuner.samples) == 1 and tuner.samples[0] == pytest.approx(1000, rel=0.01)
+
+    limiter = get_limiter()
+    limiter.set_rate(500)
+    try:
+        probe(TuningSession(tuner, "direct", Tuning(), 1))
+    finally:
+        limiter.set_rate(0)
+    with limiter.register("capped", rate=500) as limit:
+        probe(TuningSession(tuner, "direct", Tuning(), 1, limit))
+    assert len(tuner.samples) == 1
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from bandwidth import BandwidthLimiter, TokenBucket, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("") == 0
+    assert parse_rate("500K") == 500 * 1024
+    assert parse_rate("1.5MB/s") == int(1.5 * 1024 ** 2)
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+
+def test_token_bucket_burst_then_wait():
+    assert TokenBucket().reserve(10 ** 9) == 0.0
+    bucket = TokenBucket(1000, burst_seconds=0.5)
+    # 初始可以突发 500 字节，之后按速率等待
+    assert bucket.reserve(500) == 0.0
+    assert bucket.reserve(1000) == pytest.approx(1.0, abs=0.05)
+
+
+def active_limiter(rate):
+    limiter = BandwidthLimiter(rate)
+    a = limiter.register("a", weight=1)
+    b = limiter.register("b", weight=3)
+    a.last_active = b.last_active = time.monotonic()
+    limiter.set_rate(rate)
+    return limiter, a, b
+
+
+def test_rebalance_by_weight_and_job_cap():
+    limiter, a, b = active_limiter(4000)
+    assert (a.effective_rate, b.effective_rate) == (1000, 3000)
+
+    limiter.set_job_rate("b", 500)
+    # b 用不完的份额分给 a
+    assert (a.effective_rate, b.effective_rate) == (3500, 500)
+    limiter.set_rate(0)
+    # 不限全局速率时只受任务自己的上限约束
+    assert (a.effective_rate, b.effective_rate) == (0, 500)
+
+
+def test_idle_job_share_is_precomputed():
+    limiter, a, b = active_limiter(4000)
+    idle = limiter.register("c", weight=4)
+    # c 还没有开始下载，不占用份额，但按加入后的份额预先计算
+    assert (a.effective_rate, b.effective_rate) == (1000, 3000)
+    assert idle.effective_rate == 2000
+
+    limiter.unregister("a")
+    assert limiter.get("a") is None
+    assert b.effective_rate == 4000
+
+
+def test_capped_leftover_is_shared_by_weight():
+    limiter, a, b = active_limiter(6000)
+    c = limiter.register("c", weight=2, rate=600)
+    c.last_active = time.monotonic()
+    limiter.set_job_rate("a", 4000)
+    limiter.set_rate(6000)
+    # c 的份额 2000 超过上限 600，剩余 5400 按 1:3 分给 a、b
+    assert (a.effective_rate, b.effective_rate, c.effective_rate) == (1350, 4050, 600)
+    assert sum(job.effective_rate for job in (a, b, c)) == 6000
@@ -0,0 +1,61 @@
+import os
+
+from download_archive import ANY_FORMAT, DownloadArchive
+from download_engine import archive_format
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def make_file(tmp_path, name, data=b"video"):
+    path = os.path.join(str(tmp_path), name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_format_keys():
+    assert archive_format("720p") == archive_format("720") == "720"
+    assert archive_format(None, "137+140") == "id:137+140"
+
+
+def test_find_matches_same_or_unknown_format(tmp_path):
+    archive = DownloadArchive(":memory:")
+    path = make_file(tmp_path, "a.mp4")
+    archive.record(URL, "720", path)
+
+    assert archive.find(URL, "720").path == path
+    assert archive.find("dQw4w9WgXcQ", "720") is not None
+    assert archive.find(URL, "1080") is None
+    assert archive.find(URL) is not None
+
+    # 格式未知的记录（从目录重建）满足任何格式的请求
+    archive.record(URL, ANY_FORMAT, make_file(tmp_path, "b.mp4"))
+    assert archive.find(URL, "1080").format == ANY_FORMAT
+    assert archive.find(URL, "720").format == "720"
+
+
+def test_missing_or_changed_file_is_not_found(tmp_path):
+    archive = DownloadArchive(":memory:")
+    path = make_file(tmp_path, "a.mp4")
+    archive.record(URL, "720", path)
+
+    with open(path, "ab") as f:
+        f.write(b"more")
+    assert archive.find(URL, "720") is None
+
+    os.remove(path)
+    assert archive.find(URL) is None
+    assert archive.prune() == 1
+    assert len(archive) == 0
+
+
+def test_records_survive_reopen(tmp_path):
+    db_path = os.path.join(str(tmp_path), "archive.db")
+    archive = DownloadArchive(db_path)
+    archive.record(URL, "audio", make_file(tmp_path, "a.m4a"), title="title")
+    archive.close()
+
+    archive = DownloadArchive(db_path)
+    entry = archive.find(URL, "audio")
+    assert entry is not None and entry.title == "title"
+    archive.close()
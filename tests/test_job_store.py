@@ -0,0 +1,29 @@
+from job_store import JobStore, STATE_COMPLETED, STATE_DOWNLOADING, STATE_PENDING, STATE_WAITING
+
+
+def _store():
+    return JobStore(":memory:")
+
+
+def test_recover_keeps_priority_order():
+    store = _store()
+    low = store.add_job("https://youtu.be/aaaaaaaaaaa", "a", "x", "720p")
+    high = store.add_job("https://youtu.be/bbbbbbbbbbb", "b", "x", "720p")
+    store.set_state(low, STATE_PENDING, priority=0)
+    store.set_state(high, STATE_DOWNLOADING, priority=1)
+
+    assert store.recover() == [high, low]
+    assert store.get(high)["state"] == STATE_WAITING
+    assert store.get(high)["priority"] == 1
+
+
+def test_clear_completed_removes_only_completed():
+    store = _store()
+    done = store.add_job("https://youtu.be/aaaaaaaaaaa", "a", "x", "720p")
+    waiting = store.add_job("https://youtu.be/bbbbbbbbbbb", "b", "x", "720p")
+    store.set_state(done, STATE_COMPLETED, progress=100)
+
+    assert store.clear_completed() == [done]
+    assert store.get(done) is None
+    assert [job["id"] for job in store.jobs()] == [waiting]
+    assert store.clear_completed() == []
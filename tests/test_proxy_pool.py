@@ -0,0 +1,44 @@
+from proxy_pool import ProxyLease, ProxyPool, endpoint
+from proxy_session import ProxyConfig
+
+
+def test_endpoint_merges_loopback_names_and_protocols():
+    assert endpoint(ProxyConfig("localhost", 7897, "socks5")) == endpoint(ProxyConfig("127.0.0.1", 7897, "http"))
+    assert endpoint(ProxyConfig("127.0.0.1", 7897)) != endpoint(ProxyConfig("127.0.0.1", 7890))
+
+
+def test_mixed_port_is_added_once():
+    pool = ProxyPool()
+    http = pool.add("http://127.0.0.1:7897")
+    assert pool.add("socks5://127.0.0.1:7897") is http
+    assert pool.add("http://localhost:7897") is http
+    assert pool.proxies() == [http]
+
+
+def test_replace_keeps_health_and_leases():
+    pool = ProxyPool()
+    http = pool.add("http://127.0.0.1:7897")
+    leased = pool.acquire()
+    assert leased == http
+    pool.record_failure(http)
+
+    socks = ProxyConfig("127.0.0.1", 7897, "socks5")
+    assert pool.add(socks, replace=True) == socks
+    assert pool.proxies() == [socks]
+    stats = pool.stats()[0]
+    assert stats["failures"] == 1 and stats["active"] == 1
+    # 用旧的协议归还租约同样生效
+    pool.release(leased)
+    assert pool.stats()[0]["active"] == 0
+
+
+def test_failover_skips_failed_proxy():
+    pool = ProxyPool()
+    first = pool.add("http://127.0.0.1:7897")
+    second = pool.add("http://127.0.0.1:7890")
+    with ProxyLease(pool, preferred=first) as lease:
+        assert lease.proxy == first
+        assert lease.failover() is not None
+        assert lease.proxy == second
+        # 所有代理都失败后不再切换
+        assert lease.failover() is None
@@ -0,0 +1,105 @@
+import errno
+import io
+import urllib.error
+
+from resumable import DownloadInterrupted
+from retry import (EXTRACTOR, PERMANENT, THROTTLED, TRANSIENT, MAX_RETRY_AFTER, RetryPolicy, RetryState,
+                   backoff, classify, retry_after)
+
+
+def http_error(code, headers=None):
+    return urllib.error.HTTPError("https://example.com", code, "error", headers or {}, io.BytesIO())
+
+
+def interrupted(cause, downloaded=0):
+    """和下载代码一样，把原始异常包装为 DownloadInterrupted"""
+    try:
+        raise cause
+    except Exception as e:
+        try:
+            raise DownloadInterrupted(f"连接错误: {e}", downloaded) from e
+        except DownloadInterrupted as wrapped:
+            return wrapped
+
+
+class VideoUnavailable(Exception):
+    pass
+
+
+class DownloadError(Exception):
+    """yt-dlp 的 DownloadError：原始异常在 exc_info 中"""
+
+    def __init__(self, message, exc_info=None):
+        super().__init__(message)
+        self.exc_info = exc_info
+
+
+def test_http_status_in_chain_wins_over_connection_error():
+    # DownloadInterrupted 本身是 ConnectionError，原因中的 403 优先
+    assert classify(interrupted(http_error(403))) == EXTRACTOR
+    assert classify(interrupted(http_error(429))) == THROTTLED
+    assert classify(interrupted(http_error(503))) == TRANSIENT
+    assert classify(interrupted(ConnectionResetError())) == TRANSIENT
+
+
+def test_permanent_has_highest_priority():
+    assert classify(VideoUnavailable("gone")) == PERMANENT
+    assert classify(interrupted(OSError(errno.ENOSPC, "No space left on device"))) == PERMANENT
+    # 错误链中同时有限流和永久错误时不再重试
+    try:
+        raise VideoUnavailable("gone") from http_error(429)
+    except VideoUnavailable as e:
+        assert classify(e) == PERMANENT
+
+
+def test_message_patterns_and_wrapped_errors():
+    assert classify(Exception("ERROR: Private video. Sign in")) == PERMANENT
+    assert classify(Exception("HTTP Error 429: Too Many Requests")) == THROTTLED
+    assert classify(Exception("Unable to extract player response")) == EXTRACTOR
+    assert classify(Exception("Remote end closed connection")) == TRANSIENT
+    error = DownloadError("ERROR: unable to download", (None, http_error(503), None))
+    assert classify(error) == TRANSIENT
+    # 无法判断时按提取失败处理
+    assert classify(Exception("something odd")) == EXTRACTOR
+
+
+def test_retry_after_is_capped():
+    assert retry_after(http_error(429, {"Retry-After": "30"})) == 30.0
+    assert retry_after(interrupted(http_error(429, {"Retry-After": "99999"}))) == MAX_RETRY_AFTER
+    assert retry_after(http_error(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert retry_after(http_error(429)) is None
+
+
+def test_backoff_bounds():
+    for attempt in range(20):
+        assert 0 <= backoff(attempt, 1.0, 60.0) <= 60.0
+        assert 30.0 <= backoff(attempt + 6, 1.0, 60.0, full_jitter=False) <= 60.0
+
+
+def test_failures_reset_when_retained_bytes_grow():
+    state = RetryState(RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+    assert state.next_delay(interrupted(ConnectionResetError(), 100)) is not None
+    assert state.next_delay(interrupted(ConnectionResetError(), 100)) is not None
+    # 期间下载了新数据，连续失败次数清零
+    assert state.next_delay(interrupted(ConnectionResetError(), 200)) is not None
+    assert state.failures == 1
+    assert state.next_delay(ConnectionResetError(), downloaded=300) is not None
+    assert state.next_delay(ConnectionResetError()) is not None
+    assert state.next_delay(ConnectionResetError()) is None
+    assert state.attempts == 6
+
+
+def test_budget_and_extractor_limits():
+    state = RetryState(RetryPolicy(max_attempts=10, budget=50))
+    assert state.next_delay(http_error(429, {"Retry-After": "30"})) >= 30
+    assert state.next_delay(http_error(429, {"Retry-After": "30"})) is None
+    assert state.waited <= 50
+
+    state = RetryState(RetryPolicy(max_attempts=10, base_delay=0, max_delay=0, extractor_attempts=2))
+    assert state.next_delay(http_error(403)) == 0
+    assert state.next_delay(http_error(403)) == 0
+    assert state.next_delay(http_error(403)) is None
+
+    state = RetryState()
+    assert state.next_delay(VideoUnavailable("gone")) is None
+    assert state.last_kind == PERMANENT
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from scheduler import DEFAULT_MAX_PER_HOST, DownloadScheduler, host_of
+
+
+def _run_blocking(scheduler, urls, priorities=None):
+    """提交阻塞的任务，返回 (放行事件, 峰值并发, 执行顺序)"""
+    release = threading.Event()
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+    order = []
+
+    def make_job(job_id):
+        def job():
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                order.append(job_id)
+            release.wait(5)
+            with lock:
+                state["active"] -= 1
+        return job
+
+    for job_id, url in enumerate(urls):
+        priority = priorities[job_id] if priorities else 0
+        scheduler.submit(make_job(job_id), job_id, url, priority)
+    return release, state, order
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_host_of_groups_youtube_hosts():
+    assert host_of("https://youtu.be/abc") == "youtube.com"
+    assert host_of("https://m.youtube.com/watch?v=abc") == "youtube.com"
+    assert host_of("https://Example.org/x") == "example.org"
+    assert host_of("not a url") == ""
+
+
+def test_default_per_host_cap_is_below_max_concurrent():
+    scheduler = DownloadScheduler(max_concurrent=6)
+    try:
+        assert scheduler.max_per_host == DEFAULT_MAX_PER_HOST < 6
+
+        urls = ([f"https://www.youtube.com/watch?v={i}" for i in range(6)]
+                + [f"https://example.org/{i}" for i in range(6)])
+        release, state, _ = _run_blocking(scheduler, urls)
+        assert _wait_for(lambda: state["active"] == 2 * DEFAULT_MAX_PER_HOST)
+        time.sleep(0.05)
+        assert state["peak"] == 2 * DEFAULT_MAX_PER_HOST
+        release.set()
+    finally:
+        scheduler.shutdown(wait=True)
+
+
+def test_per_host_cap_opt_out_follows_max_concurrent():
+    scheduler = DownloadScheduler(max_concurrent=3, max_per_host=None)
+    try:
+        assert scheduler.max_per_host == 3
+        scheduler.set_max_concurrent(10)
+        assert scheduler.max_per_host == 10
+
+        urls = [f"https://www.youtube.com/watch?v={i}" for i in range(10)]
+        release, state, _ = _run_blocking(scheduler, urls)
+        assert _wait_for(lambda: state["peak"] == 10)
+        release.set()
+    finally:
+        scheduler.shutdown(wait=True)
+
+
+def test_explicit_per_host_cap_is_kept():
+    scheduler = DownloadScheduler(max_concurrent=2, max_per_host=2)
+    try:
+        scheduler.set_max_concurrent(6)
+        assert scheduler.max_per_host == 2
+
+        urls = ([f"https://youtu.be/{i}" for i in range(4)]
+                + [f"https://example.org/{i}" for i in range(4)])
+        release, state, _ = _run_blocking(scheduler, urls)
+        assert _wait_for(lambda: state["active"] == 4)
+        time.sleep(0.05)
+        # 每个主机最多两个
+        assert state["peak"] == 4
+        release.set()
+
+        scheduler.set_max_per_host(None)
+        assert scheduler.max_per_host == 6
+    finally:
+        scheduler.shutdown(wait=True)
+
+
+def test_priority_order():
+    scheduler = DownloadScheduler(max_concurrent=1)
+    try:
+        gate = threading.Event()
+        scheduler.submit(lambda: gate.wait(5), "first", "https://example.org/0")
+        assert _wait_for(lambda: scheduler.running_count() == 1)
+        release, _, order = _run_blocking(scheduler, ["https://example.org/a"] * 3, priorities=[0, 5, 1])
+        release.set()
+        gate.set()
+        assert _wait_for(lambda: len(order) == 3)
+        assert order == [1, 2, 0]
+    finally:
+        scheduler.shutdown(wait=True)
+
+
+def test_submit_rejects_duplicates_and_cancel():
+    scheduler = DownloadScheduler(max_concurrent=1)
+    try:
+        gate = threading.Event()
+        assert scheduler.submit(lambda: gate.wait(5), 1, "https://example.org/1")
+        assert not scheduler.submit(lambda: None, 1, "https://example.org/1")
+        assert _wait_for(lambda: scheduler.running_count() == 1)
+        assert scheduler.submit(lambda: None, 2, "https://example.org/2")
+        assert scheduler.cancel(2)
+        assert not scheduler.cancel(1)
+        assert scheduler.pending_count() == 0
+        gate.set()
+    finally:
+        scheduler.shutdown(wait=True)
@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import urllib.error
+
+import pytest
+
+from resumable import DownloadInterrupted, part_paths, read_journal
+from segmented import MIN_SPLIT_SIZE, SegmentedDownloader, _Segment, _trim_part, download_file, remaining_ranges
+
+IDENTITY = {"url": "https://example.com/video", "total": 1000}
+
+
+def test_remaining_ranges_from_journal():
+    assert remaining_ranges(None, IDENTITY, 1000) == [(0, 999)]
+    # 日志属于另一个文件时从头下载
+    assert remaining_ranges(dict(IDENTITY, total=2000, downloaded=500), IDENTITY, 1000) == [(0, 999)]
+    assert remaining_ranges(dict(IDENTITY, downloaded=400), IDENTITY, 1000) == [(400, 999)]
+    assert remaining_ranges(dict(IDENTITY, downloaded=1000), IDENTITY, 1000) == []
+    journal = dict(IDENTITY, segments=[[100, 199], [900, 5000], [300, 200]])
+    assert remaining_ranges(journal, IDENTITY, 1000) == [(100, 199), (900, 999)]
+
+
+def test_idle_connection_splits_largest_segment():
+    total = MIN_SPLIT_SIZE * 8
+    downloader = SegmentedDownloader("https://example.com/video", total, "unused.part")
+    slow = _Segment(0, total // 2 - 1)
+    fast = _Segment(total // 2, total - 1)
+    downloader._active = [slow, fast]
+    slow.start = MIN_SPLIT_SIZE
+
+    segment = downloader._next_segment()
+    # 剩余最多的范围分走后一半，两段首尾相接
+    assert (segment.start, segment.end) == (MIN_SPLIT_SIZE * 6, total - 1)
+    assert fast.end == segment.start - 1
+    assert slow.remaining + fast.remaining + segment.remaining == total - MIN_SPLIT_SIZE
+
+
+def test_queued_segments_first_and_small_ones_not_split():
+    downloader = SegmentedDownloader("https://example.com/video", MIN_SPLIT_SIZE * 4, "unused.part")
+    queued = _Segment(0, 99)
+    downloader._queue = [queued]
+    downloader._active = [_Segment(100, MIN_SPLIT_SIZE * 2 + 98)]
+    assert downloader._next_segment() is queued
+    # 剩余不足两倍 MIN_SPLIT_SIZE 的范围不再拆分
+    assert downloader._next_segment() is None
+
+
+class FakeResponse:
+    def __init__(self, data, start, total):
+        self.status = 206
+        self.headers = {"Content-Range": f"bytes {start}-{start + len(data) - 1}/{total}"}
+        self._data = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._data.read(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class HalfBrokenOpener:
+    """前一半的范围正常返回，后一半返回 403"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def open(self, request, timeout=None):
+        start, stop = map(int, request.get_header("Range").split("=")[1].split("-"))
+        if start >= len(self.data) // 2:
+            raise urllib.error.HTTPError(request.full_url, 403, "Forbidden", {}, io.BytesIO())
+        return FakeResponse(self.data[start:stop + 1], start, len(self.data))
+
+
+def test_interrupted_download_keeps_only_contiguous_prefix(tmp_path):
+    data = bytes(range(256)) * (MIN_SPLIT_SIZE * 4 // 256)
+    file_path = os.path.join(str(tmp_path), "video.mp4")
+    with pytest.raises(DownloadInterrupted):
+        download_file("https://example.com/video", len(data), file_path, opener=HalfBrokenOpener(data),
+                      connections=2, failover=lambda error: None, request_size=MIN_SPLIT_SIZE)
+
+    part_path, journal_path = part_paths(file_path)
+    journal = read_journal(journal_path)
+    size = os.path.getsize(part_path)
+    # 没有预先分配留下的空洞，yt-dlp 按文件长度续传也是正确的
+    assert "segments" not in journal and journal["downloaded"] == size
+    assert 0 < size <= len(data) // 2
+    with open(part_path, "rb") as f:
+        assert f.read() == data[:size]
+
+
+def test_trim_part_before_native_fallback(tmp_path):
+    file_path = os.path.join(str(tmp_path), "video.mp4")
+    part_path, journal_path = part_paths(file_path)
+    with open(part_path, "wb") as f:
+        f.write(b"x" * 100)
+    with open(journal_path, "w", encoding="utf-8") as f:
+        json.dump(dict(IDENTITY, filesize=100, segments=[[40, 59], [80, 99]], downloaded=40), f)
+
+    _trim_part(file_path)
+    assert os.path.getsize(part_path) == 40
+    assert read_journal(journal_path) == dict(IDENTITY, filesize=100, downloaded=40)
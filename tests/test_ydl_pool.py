@@ -0,0 +1,40 @@
+from ydl_pool import YoutubeDLPool, _PooledInstance
+
+
+class FakePostProcessor:
+    def __init__(self):
+        self._progress_hooks = []
+
+    def add_progress_hook(self, hook):
+        self._progress_hooks.append(hook)
+
+
+class FakeYoutubeDL:
+    """与 yt-dlp 相同：add_postprocessor_hook() 同时加到已注册的后处理器上"""
+
+    def __init__(self):
+        self.params = {'outtmpl': {'default': '%(title)s.%(ext)s'}, 'format': 'best'}
+        self._progress_hooks = []
+        self._postprocessor_hooks = []
+        self._pps = {'post_process': [FakePostProcessor()], 'after_move': [FakePostProcessor()]}
+
+    def add_progress_hook(self, hook):
+        self._progress_hooks.append(hook)
+
+    def add_postprocessor_hook(self, hook):
+        self._postprocessor_hooks.append(hook)
+        for pps in self._pps.values():
+            for pp in pps:
+                pp.add_progress_hook(hook)
+
+
+def test_reset_removes_job_hooks_from_postprocessors():
+    pool = YoutubeDLPool()
+    pooled = _PooledInstance(FakeYoutubeDL())
+    ydl = pooled.ydl
+    for _ in range(3):
+        pool._apply_job_options(pooled, {'progress_hooks': [print], 'postprocessor_hooks': [print]})
+        assert all(pp._progress_hooks == [print] for pps in ydl._pps.values() for pp in pps)
+        pool._reset(pooled)
+        assert ydl._progress_hooks == [] and ydl._postprocessor_hooks == []
+        assert all(pp._progress_hooks == [] for pps in ydl._pps.values() for pp in pps)
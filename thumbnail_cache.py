@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+缩略图异步加载
+在后台线程下载和解码缩略图，按视频ID缓存到磁盘，
+内存中保留有限数量已缩放好的 QPixmap，界面线程不再等待网络
+"""
+
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap
+
+from urls import cache_key, extract_video_id
+
+# 默认缓存目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~/.downtube"), "thumbnails")
+
+# 磁盘缓存上限（字节），超出后删除最久未使用的文件
+DISK_CACHE_BYTES = 64 * 1024 * 1024
+
+# 内存中保留的缩略图数量
+MEMORY_ENTRIES = 256
+
+# 并发下载缩略图的线程数
+MAX_WORKERS = 4
+
+# 下载超时时间（秒）
+FETCH_TIMEOUT = 10
+
+
+def thumbnail_url_for(video_url):
+    """根据视频链接推算缩略图地址，非 YouTube 链接返回 None"""
+    video_id = extract_video_id(video_url)
+    if not video_id:
+        return None
+    return f"https://i.ytimg.com/vi/{video_id}/mqdefault.jpg"
+
+
+class ThumbnailLoader(QObject):
+    """缩略图加载器（需在界面线程创建和调用）"""
+    _decoded = pyqtSignal(object, object)  # 缓存键, QImage 或 None
+
+    def __init__(self, parent=None, cache_dir=DEFAULT_CACHE_DIR, disk_bytes=DISK_CACHE_BYTES,
+                 memory_entries=MEMORY_ENTRIES, max_workers=MAX_WORKERS):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # (视频键, 宽, 高) -> QPixmap
+        self._waiting = {}            # (视频键, 宽, 高) -> [回调]
+        self._disk_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self._decoded.connect(self._on_decoded)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def request(self, video_url, thumbnail_url, width, height, callback):
+        """请求缩略图，加载完成后在界面线程调用 callback(QPixmap)，失败时传入 None
+
+        内存中已有时立即回调
+        """
+        key = (cache_key(video_url), width, height)
+        pixmap = self._memory.get(key)
+        if pixmap is not None:
+            self._memory.move_to_end(key)
+            callback(pixmap)
+            return
+
+        callbacks = self._waiting.get(key)
+        if callbacks is not None:
+            # 同一缩略图已在加载中
+            callbacks.append(callback)
+            return
+        self._waiting[key] = [callback]
+        self._executor.submit(self._load, key, thumbnail_url or thumbnail_url_for(video_url))
+
+    def shutdown(self):
+        """丢弃未开始的加载任务"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, key, thumbnail_url):
+        """后台线程：读取磁盘缓存或下载，然后解码并缩放"""
+        image = None
+        try:
+            data = self._read_disk(key[0])
+            if data is None and thumbnail_url:
+                data = urllib.request.urlopen(thumbnail_url, timeout=FETCH_TIMEOUT).read()
+                self._write_disk(key[0], data)
+            if data:
+                decoded = QImage.fromData(data)
+                if not decoded.isNull():
+                    image = decoded.scaled(key[1], key[2], Qt.AspectRatioMode.KeepAspectRatio,
+                                           Qt.TransformationMode.SmoothTransformation)
+        except Exception:
+            image = None
+        self._decoded.emit(key, image)
+
+    def _on_decoded(self, key, image):
+        """界面线程：转换为 QPixmap，放入内存缓存并回调"""
+        pixmap = QPixmap.fromImage(image) if image is not None else None
+        if pixmap is not None:
+            self._memory[key] = pixmap
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+        for callback in self._waiting.pop(key, []):
+            try:
+                callback(pixmap)
+            except RuntimeError:
+                # 对应的控件已被销毁
+                pass
+
+    def _path(self, video_key):
+        return os.path.join(self.cache_dir, video_key + ".img")
+
+    def _read_disk(self, video_key):
+        path = self._path(video_key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            # 更新访问时间，用于淘汰最久未使用的文件
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write_disk(self, video_key, data):
+        path = self._path(video_key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """磁盘缓存超过上限时删除最久未使用的文件"""
+        with self._disk_lock:
+            entries = []
+            total = 0
+            try:
+                names = os.listdir(self.cache_dir)
+            except OSError:
+                return
+            for name in names:
+                if not name.endswith(".img"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            if total <= self.disk_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.disk_bytes * 0.8:
+                    break
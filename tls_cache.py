@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TLS 会话缓存与连接预热
+按 (SSL 上下文, 主机, 端口) 缓存握手得到的 TLS 会话，新连接带上缓存的会话恢复握手，
+经代理时省去一次完整握手的往返和计算。同时统计连接最多的主机（保存在磁盘上），
+启动或切换线路时在后台预先建立几个连接放入连接池，第一次请求不必等待握手
+"""
+
+import json
+import os
+import ssl
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+# 最多缓存的会话数
+DEFAULT_MAX_SESSIONS = 256
+
+# 会话保留的时间（秒），服务器的会话票据通常数小时内有效
+SESSION_TTL = 3600
+
+# 主机统计的保存位置
+DEFAULT_HOSTS_FILE = os.path.join(os.path.expanduser("~/.downtube"), "tls_hosts.json")
+
+# 保存的主机数
+MAX_SAVED_HOSTS = 32
+
+# 预热的主机数和每个主机的连接数
+PREWARM_HOSTS = 4
+PREWARM_CONNECTIONS = 2
+
+# 预热请求的超时时间（秒）
+PREWARM_TIMEOUT = 10
+
+# 没有统计数据时预热的主机
+DEFAULT_HOSTS = ("www.youtube.com", "i.ytimg.com")
+
+# 兼容旧服务器的密码套件
+_CIPHERS = 'HIGH:!aNULL:!eNULL:!EXPORT:!DES:!RC4:!MD5:!PSK'
+
+
+def _unverified_context():
+    # 不校验证书，因此不加载系统CA证书，启动时省去读取证书的时间
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+def client_context():
+    """下载使用的 SSL 上下文（不校验证书，TLS 1.2+），进程内共用一个，会话缓存才能生效"""
+    with _contexts_lock:
+        context = _contexts.get("client")
+        if context is None:
+            context = _unverified_context()
+            context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+            try:
+                context.minimum_version = ssl.TLSVersion.TLSv1_2
+                context.set_ciphers(_CIPHERS)
+            except (ssl.SSLError, ValueError, AttributeError):
+                # 旧版本 Python/OpenSSL 不支持时使用默认设置
+                pass
+            _contexts["client"] = context
+        return context
+
+
+def compatible_context():
+    """握手反复失败时改用的宽松上下文（允许所有协议版本和默认密码套件），同样进程内共用"""
+    with _contexts_lock:
+        context = _contexts.get("compatible")
+        if context is None:
+            context = _unverified_context()
+            try:
+                context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+            except (ValueError, AttributeError):
+                pass
+            _contexts["compatible"] = context
+        return context
+
+
+class TLSSessionCache:
+    """TLS 会话缓存（按 SSL 上下文、主机和端口），附带每个主机的连接次数统计"""
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, ttl=SESSION_TTL, hosts_file=DEFAULT_HOSTS_FILE):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.hosts_file = hosts_file
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()   # (上下文, 主机, 端口) -> (保存时间, 会话)
+        self._hosts = self._load_hosts()  # 主机 -> 连接次数
+        self.resumed = 0                  # 恢复会话的握手次数
+        self.full = 0                     # 完整握手次数
+
+    def get(self, context, host, port):
+        key = (context, host, port)
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._sessions[key]
+                return None
+            self._sessions.move_to_end(key)
+            return entry[1]
+
+    def put(self, context, host, port, session):
+        if session is None:
+            return
+        key = (context, host, port)
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None and entry[1] is session:
+                return
+            self._sessions[key] = (time.monotonic(), session)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def discard(self, context, host, port):
+        with self._lock:
+            self._sessions.pop((context, host, port), None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def record_handshake(self, host, resumed):
+        with self._lock:
+            self._hosts[host] = self._hosts.get(host, 0) + 1
+            if resumed:
+                self.resumed += 1
+            else:
+                self.full += 1
+
+    def hot_hosts(self, count=PREWARM_HOSTS):
+        """连接次数最多的主机"""
+        with self._lock:
+            hosts = sorted(self._hosts.items(), key=lambda item: item[1], reverse=True)
+        return [host for host, _ in hosts[:count]] or list(DEFAULT_HOSTS[:count])
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "resumed": self.resumed, "full": self.full}
+
+    def _load_hosts(self):
+        try:
+            with open(self.hosts_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {str(host): int(count) for host, count in data.items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def save_hosts(self):
+        """保存主机统计；计数减半后保存，很久不访问的主机逐渐被替换"""
+        with self._lock:
+            hosts = sorted(self._hosts.items(), key=lambda item: item[1], reverse=True)[:MAX_SAVED_HOSTS]
+        data = {host: max(1, count // 2) for host, count in hosts}
+        tmp_path = f"{self.hosts_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.hosts_file), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.hosts_file)
+        except OSError:
+            # 统计写入失败不影响使用
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_session_cache():
+    """返回进程内共享的 TLS 会话缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TLSSessionCache()
+        return _default_cache
+
+
+def wrap_socket(context, sock, server_hostname, port):
+    """建立 TLS 连接，有缓存的会话时恢复会话；恢复失败的会话被丢弃"""
+    cache = get_session_cache()
+    session = cache.get(context, server_hostname, port)
+    try:
+        ssl_sock = context.wrap_socket(sock, server_hostname=server_hostname, session=session)
+    except (ssl.SSLError, ValueError):
+        if session is not None:
+            cache.discard(context, server_hostname, port)
+        raise
+    cache.record_handshake(server_hostname, ssl_sock.session_reused)
+    remember_session(context, ssl_sock, server_hostname, port)
+    return ssl_sock
+
+
+def remember_session(context, ssl_sock, server_hostname, port):
+    """保存连接当前的会话（只保存带有会话票据、可以恢复的会话）"""
+    session = getattr(ssl_sock, "session", None)
+    if session is not None and session.has_ticket:
+        get_session_cache().put(context, server_hostname, port, session)
+
+
+def prewarm(hosts=None, connections=PREWARM_CONNECTIONS, opener=None):
+    """在后台向 hosts（默认为最常连接的主机）各建立几个连接，放入连接池并缓存会话
+
+    请求走 opener（默认为全局 urlopen 的当前线路），失败时忽略。返回启动的线程列表。
+    """
+    from proxy_session import bind_route
+
+    open_url = opener.open if opener is not None else urllib.request.urlopen
+
+    def warm(host):
+        try:
+            request = urllib.request.Request(f"https://{host}/", method="HEAD")
+            with open_url(request, timeout=PREWARM_TIMEOUT):
+                pass
+        except Exception:
+            pass
+
+    threads = []
+    for host in hosts or get_session_cache().hot_hosts():
+        for _ in range(connections):
+            thread = threading.Thread(target=bind_route(warm), args=(host,), daemon=True,
+                                      name=f"prewarm-{host}")
+            thread.start()
+            threads.append(thread)
+    return threads
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+YouTube 链接工具函数
+"""
+
+import hashlib
+import re
+from urllib.parse import urlparse, parse_qs
+
+# YouTube 视频ID为11位
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_PATH_ID_RE = re.compile(r'/(?:shorts|embed|live|v)/([A-Za-z0-9_-]{11})')
+
+
+def extract_video_id(url):
+    """从YouTube链接中提取视频ID，无法识别时返回 None"""
+    if not url:
+        return None
+    url = url.strip()
+    if _VIDEO_ID_RE.match(url):
+        return url
+
+    try:
+        parsed = urlparse(url if "://" in url else "https://" + url)
+    except ValueError:
+        return None
+    host = (parsed.hostname or "").lower()
+
+    if host == "youtu.be":
+        candidate = parsed.path.lstrip("/").split("/")[0]
+        return candidate if _VIDEO_ID_RE.match(candidate) else None
+
+    if host.endswith("youtube.com") or host.endswith("youtube-nocookie.com"):
+        candidate = parse_qs(parsed.query).get("v", [None])[0]
+        if candidate and _VIDEO_ID_RE.match(candidate):
+            return candidate
+        match = _PATH_ID_RE.search(parsed.path)
+        if match:
+            return match.group(1)
+
+    return None
+
+
+def cache_key(url):
+    """返回链接的规范化键：YouTube视频使用视频ID，其他链接使用URL摘要"""
+    video_id = extract_video_id(url)
+    if video_id:
+        return video_id
+    return "url-" + hashlib.sha1(url.strip().encode("utf-8")).hexdigest()[:20]
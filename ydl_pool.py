@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+yt-dlp 实例池
+按代理和选项配置复用已初始化的 YoutubeDL 实例，避免每个视频重复初始化提取器、
+Cookie 和网络处理器；进度回调、输出模板等按任务单独设置
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+
+from segmented import segmented_youtubedl
+
+# 每个任务单独设置、任务结束后恢复的选项（yt-dlp 在下载时实时读取）
+PER_JOB_KEYS = ('outtmpl', 'progress_hooks', 'postprocessor_hooks', 'logger', 'format',
+                'concurrent_fragment_downloads', 'http_chunk_size', 'buffersize')
+
+# 直接写入 params 的任务级选项（由调优器按任务设置）
+_PARAM_KEYS = ('concurrent_fragment_downloads', 'http_chunk_size', 'buffersize')
+
+# 每种配置最多保留的空闲实例数
+DEFAULT_MAX_IDLE = 4
+
+
+def profile_key(ydl_opts):
+    """根据除任务级选项以外的所有选项生成配置键"""
+    static_opts = {k: v for k, v in ydl_opts.items() if k not in PER_JOB_KEYS}
+    return json.dumps(static_opts, sort_keys=True, default=repr)
+
+
+class _PooledInstance:
+    """实例及其初始状态，用于任务结束后恢复"""
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.outtmpl = ydl.params.get('outtmpl')
+        self.logger = ydl.params.get('logger')
+        self.format = ydl.params.get('format')
+        self.format_selector = getattr(ydl, 'format_selector', None)
+        self.params = {name: ydl.params.get(name) for name in _PARAM_KEYS}
+        self.progress_hook_count = len(ydl._progress_hooks)
+        self.pp_hook_count = len(ydl._postprocessor_hooks)
+        # add_postprocessor_hook() 同时把回调加到已注册的每个后处理器上，需要分别恢复
+        self.pp_progress_hook_counts = [
+            (pp, len(pp._progress_hooks)) for pps in ydl._pps.values() for pp in pps
+        ]
+
+
+class YoutubeDLPool:
+    """线程安全的 YoutubeDL 实例池"""
+
+    def __init__(self, max_idle_per_profile=DEFAULT_MAX_IDLE):
+        self.max_idle_per_profile = max_idle_per_profile
+        self._lock = threading.Lock()
+        self._idle = {}  # 配置键 -> [_PooledInstance]
+        self._closed = False
+
+    @contextmanager
+    def session(self, ydl_opts):
+        """借出一个实例供单个任务使用
+
+        用法与 `with yt_dlp.YoutubeDL(ydl_opts) as ydl:` 相同；
+        任务中途抛出异常时实例会被丢弃，而不是放回池中。
+        """
+        key = profile_key(ydl_opts)
+        pooled = self._checkout(key, ydl_opts)
+        self._apply_job_options(pooled, ydl_opts)
+        healthy = False
+        try:
+            yield pooled.ydl
+            healthy = True
+        finally:
+            self._reset(pooled)
+            self._checkin(key, pooled, healthy)
+
+    def close(self):
+        """关闭所有空闲实例（保存 Cookie 等）"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, {}
+        for instances in idle.values():
+            for pooled in instances:
+                self._close_instance(pooled)
+
+    def _checkout(self, key, ydl_opts):
+        with self._lock:
+            instances = self._idle.get(key)
+            if instances:
+                return instances.pop()
+
+        static_opts = {k: v for k, v in ydl_opts.items() if k not in PER_JOB_KEYS}
+        # 保留配置中的输出模板和格式作为实例默认值
+        for name in ('outtmpl', 'format'):
+            if name in ydl_opts:
+                static_opts[name] = ydl_opts[name]
+        return _PooledInstance(segmented_youtubedl()(static_opts))
+
+    def _checkin(self, key, pooled, healthy):
+        with self._lock:
+            if healthy and not self._closed:
+                instances = self._idle.setdefault(key, [])
+                if len(instances) < self.max_idle_per_profile:
+                    instances.append(pooled)
+                    return
+        self._close_instance(pooled)
+
+    def _apply_job_options(self, pooled, ydl_opts):
+        """设置任务级选项"""
+        ydl = pooled.ydl
+
+        outtmpl = ydl_opts.get('outtmpl')
+        if outtmpl is not None:
+            templates = dict(pooled.outtmpl or {})
+            if isinstance(outtmpl, dict):
+                templates.update(outtmpl)
+            else:
+                templates['default'] = outtmpl
+            ydl.params['outtmpl'] = templates
+
+        if 'format' in ydl_opts and ydl_opts['format'] != pooled.format:
+            ydl.params['format'] = ydl_opts['format']
+            fmt = ydl_opts['format']
+            if fmt in (None, '-') or callable(fmt):
+                ydl.format_selector = fmt
+            else:
+                ydl.format_selector = ydl.build_format_selector(fmt)
+
+        if 'logger' in ydl_opts:
+            ydl.params['logger'] = ydl_opts['logger']
+
+        for name in _PARAM_KEYS:
+            if name in ydl_opts:
+                ydl.params[name] = ydl_opts[name]
+
+        for hook in ydl_opts.get('progress_hooks') or []:
+            ydl.add_progress_hook(hook)
+        for hook in ydl_opts.get('postprocessor_hooks') or []:
+            ydl.add_postprocessor_hook(hook)
+
+    def _reset(self, pooled):
+        """恢复实例的初始状态"""
+        ydl = pooled.ydl
+        ydl.params['outtmpl'] = pooled.outtmpl
+        ydl.params['format'] = pooled.format
+        ydl.format_selector = pooled.format_selector
+        ydl.params['logger'] = pooled.logger
+        ydl.params.update(pooled.params)
+        del ydl._progress_hooks[pooled.progress_hook_count:]
+        del ydl._postprocessor_hooks[pooled.pp_hook_count:]
+        for pp, count in pooled.pp_progress_hook_counts:
+            del pp._progress_hooks[count:]
+
+    def _close_instance(self, pooled):
+        try:
+            pooled.ydl.close()
+        except Exception:
+            pass
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_ydl_pool():
+    """返回进程内共享的实例池"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = YoutubeDLPool()
+        return _default_pool
+
+
+def pooled_ydl(ydl_opts):
+    """从共享实例池借出 YoutubeDL，替代 `yt_dlp.YoutubeDL(ydl_opts)`"""
+    return get_ydl_pool().session(ydl_opts)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+pytubefix YouTube 对象缓存
+YouTube 对象在第一次读取标题、流列表时才请求播放器信息（innertube 握手）并解析流清单，
+之后保存在对象中。按视频和线路缓存对象，列出分辨率、下载和每次重试都复用同一个对象，
+重试时只重新传输失败的数据，不再重复握手。流地址与请求时的出口 IP 绑定，
+不同代理线路使用各自的对象；对象被多个任务共用，进度回调不设置在对象上
+"""
+
+import threading
+import time
+import urllib.error
+from collections import OrderedDict
+
+from proxy_session import current_route
+from urls import cache_key
+
+# 缓存的对象保留的时间（秒），流地址大约 6 小时后失效
+DEFAULT_TTL = 3600
+
+# 最多缓存的对象数
+DEFAULT_MAX_ENTRIES = 64
+
+# 流地址失效时服务器返回的状态码
+_EXPIRED_STATUS = (403, 410)
+
+
+def is_expired_error(error):
+    """下载错误（或其原因）是否表示流地址已失效，需要重新获取播放器信息"""
+    while error is not None:
+        if isinstance(error, urllib.error.HTTPError) and error.code in _EXPIRED_STATUS:
+            return True
+        error = error.__cause__
+    return False
+
+
+class YouTubeCache:
+    """按 (视频, 线路, 构造参数) 缓存 YouTube 对象"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # 键 -> (创建时间, YouTube)
+
+    @staticmethod
+    def _key(url, route, kwargs):
+        return (cache_key(url), route) + tuple(sorted(kwargs.items()))
+
+    def get(self, url, route=None, **kwargs):
+        """返回缓存的 YouTube 对象，没有或已过期时新建
+
+        route 默认为当前线程的线路（见 proxy_session.current_route）；kwargs 为 YouTube 的构造参数
+        （use_oauth、client 等），参数不同的对象分别缓存。下载进度由 download_stream 的 on_progress
+        按每次调用汇报。
+        """
+        from pytubefix import YouTube
+
+        key = self._key(url, route or current_route(), kwargs)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                yt = entry[1]
+            else:
+                # 构造 YouTube 对象不访问网络，握手在第一次读取属性时进行
+                yt = YouTube(url, **kwargs)
+                self._entries[key] = (now, yt)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return yt
+
+    def forget(self, url):
+        """丢弃该视频在所有线路上的缓存对象（例如流地址已失效时）"""
+        video = cache_key(url)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == video]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_youtube_cache():
+    """返回进程内共享的 YouTube 对象缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = YouTubeCache()
+        return _default_cache
+
+
+def get_youtube(url, **kwargs):
+    """从共享缓存取得当前线路的 YouTube 对象，替代 `YouTube(url, ...)`"""
+    return get_youtube_cache().get(url, **kwargs)
+
+
+def forget_youtube(url):
+    get_youtube_cache().forget(url)
@@ -2,12 +2,14 @@
 import os
 import sys
 import argparse
-import yt_dlp
+
+from bandwidth import get_limiter, parse_rate
+from download_engine import DownloadRequest, get_engine
 
 # 默认下载路径
 DEFAULT_DOWNLOAD_PATH = os.path.expanduser("~/Downloads")
 
-def download_video(url, resolution="720", output_path=DEFAULT_DOWNLOAD_PATH, proxy=None):
+def download_video(url, resolution="720", output_path=DEFAULT_DOWNLOAD_PATH, proxy=None, force=False):
     """下载YouTube视频"""
     print(f"正在下载: {url}")
     print(f"目标分辨率: {resolution}p")
@@ -16,31 +18,31 @@ def download_video(url, resolution="720", output_path=DEFAULT_DOWNLOAD_PATH, pro
     if proxy:
         print(f"使用代理: {proxy}")
     
-    # 设置下载选项
-    ydl_opts = {
-        'format': f'bestvideo[height<={resolution}]+bestaudio/best[height<={resolution}]',
-        'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
-        'verbose': True,
-        'ignoreerrors': True,
-        'no_warnings': False,
-        'quiet': False,
-        'progress': True,
-    }
+    request = DownloadRequest(
+        url,
+        resolution=resolution,
+        output_path=output_path,
+        proxy=proxy,
+        skip_archived=not force,
+        extra_opts={
+            'verbose': True,
+            'no_warnings': False,
+            'quiet': False,
+            'progress': True,
+        }
+    )
     
-    # 添加代理设置
-    if proxy:
-        ydl_opts['proxy'] = proxy
+    # 下载存档中已有的视频不再提取信息和下载
+    entry = get_engine().archived(request)
+    if entry is not None:
+        print(f"已下载过，跳过: {entry.path} (使用 --force 重新下载)")
+        return True
     
     # 执行下载
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            if info:
-                print(f"\n下载完成: {info.get('title', '未知标题')}")
-                return True
-            else:
-                print("\n下载失败: 无法获取视频信息")
-                return False
+        file_path = get_engine().run(request)
+        print(f"\n下载完成: {file_path}")
+        return True
     except Exception as e:
         print(f"\n下载错误: {str(e)}")
         return False
@@ -52,20 +54,9 @@ def list_formats(url, proxy=None):
     if proxy:
         print(f"使用代理: {proxy}")
     
-    # 设置选项
-    ydl_opts = {
-        'listformats': True,
-        'quiet': False,
-    }
-    
-    # 添加代理设置
-    if proxy:
-        ydl_opts['proxy'] = proxy
-    
     # 获取视频格式
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(url, download=False)
+        get_engine().list_formats(url, proxy)
         return True
     except Exception as e:
         print(f"获取视频信息错误: {str(e)}")
@@ -79,9 +70,14 @@ def main():
     parser.add_argument('-p', '--proxy', help='代理地址 (格式: http://主机名:端口 或 socks5://主机名:端口)')
     parser.add_argument('-c', '--clash-verge', action='store_true', help='使用 Clash Verge 代理')
     parser.add_argument('-l', '--list', action='store_true', help='仅列出可用格式，不下载')
+    parser.add_argument('--limit-rate', type=parse_rate, default=0, help='总下载限速，例如 500K、2M (默认不限速)')
+    parser.add_argument('--force', action='store_true', help='忽略下载存档，重新下载已下载过的视频')
     
     args = parser.parse_args()
     
+    # 全局限速
+    get_limiter().set_rate(args.limit_rate)
+    
     # 设置代理
     proxy = None
     if args.clash_verge:
@@ -96,7 +92,7 @@ def main():
     if args.list:
         list_formats(args.url, proxy)
     else:
-        download_video(args.url, args.resolution, args.output, proxy)
+        download_video(args.url, args.resolution, args.output, proxy, force=args.force)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file